@@ -0,0 +1,28 @@
+import pytest
+from django.core.cache import cache
+
+from core.testing import Budget, assert_budget, record_queries
+
+pytestmark = [pytest.mark.django_db]
+
+# Лента из 20 постов рендерится за то же число запросов, что и из одного.
+FEED_BUDGETS = {
+    '/': Budget(3),
+    '/group/{slug}/': Budget(4),
+    '/profile/{username}/': Budget(5),
+}
+
+
+class TestQueryBudget:
+
+    @pytest.mark.parametrize('url, budget', FEED_BUDGETS.items())
+    def test_feed_within_budget(self, client, mock_media, few_posts_with_group, url, budget):
+        cache.clear()
+        url = url.format(
+            slug=few_posts_with_group.group.slug,
+            username=few_posts_with_group.author.username,
+        )
+        with record_queries() as log:
+            response = client.get(url)
+        assert response.status_code == 200, f'Страница `{url}` не открывается'
+        assert_budget(log, budget, url)
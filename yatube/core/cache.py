@@ -0,0 +1,273 @@
+"""Общий для всех процессов кэш в файле SQLite.
+
+В отличие от ``LocMemCache`` один файл видят все воркеры gunicorn:
+фрагмент пересчитывается один раз, память не дублируется, а
+инвалидация доходит до каждого процесса. Внешний сервис не нужен.
+
+Записи хранятся в таблице с размером значения и временем последнего
+обращения; при превышении ``OPTIONS['MAX_BYTES']`` вытесняются давно
+не читавшиеся записи (LRU). Изменяющие операции выполняются в
+транзакции ``BEGIN IMMEDIATE``, поэтому ``add``/``incr`` атомарны
+между процессами.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entry ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' size INTEGER NOT NULL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_entry_accessed'
+    ' ON cache_entry (accessed)',
+    'CREATE TABLE IF NOT EXISTS cache_meta ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 1),'
+    ' total_bytes INTEGER NOT NULL'
+    ')',
+    'INSERT OR IGNORE INTO cache_meta (id, total_bytes) VALUES (1, 0)',
+)
+
+# Время обращения обновляется не чаще раза в секунду на ключ, чтобы
+# чтения горячих ключей не превращались в запись на каждый запрос.
+ACCESS_GRANULARITY = 1.0
+# Сколько параметров SQLite принимает в одном запросе.
+MAX_VARIABLES = 500
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_bytes = int(options.get('MAX_BYTES', 64 * 1024 * 1024))
+        self._cull_to = float(options.get('CULL_TO', 0.9))
+        self._local = threading.local()
+
+    def _connection(self):
+        # Соединение SQLite нельзя переносить между потоками и через
+        # fork, поэтому оно своё у каждого потока каждого процесса.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def _write(self):
+        return _Transaction(self._connection())
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _store(self, connection, key, value, expires, now):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        row = connection.execute(
+            'SELECT size FROM cache_entry WHERE key = ?', (key,)
+        ).fetchone()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache_entry'
+            ' (key, value, expires, size, accessed) VALUES (?, ?, ?, ?, ?)',
+            (key, data, expires, len(data), now),
+        )
+        delta = len(data) - (row[0] if row else 0)
+        connection.execute(
+            'UPDATE cache_meta SET total_bytes = total_bytes + ?', (delta,)
+        )
+
+    def _remove(self, connection, keys):
+        removed = 0
+        for start in range(0, len(keys), MAX_VARIABLES):
+            chunk = keys[start:start + MAX_VARIABLES]
+            marks = ', '.join('?' * len(chunk))
+            size, count = connection.execute(
+                'SELECT COALESCE(SUM(size), 0), COUNT(*) FROM cache_entry'
+                f' WHERE key IN ({marks})', chunk
+            ).fetchone()
+            connection.execute(
+                f'DELETE FROM cache_entry WHERE key IN ({marks})', chunk
+            )
+            connection.execute(
+                'UPDATE cache_meta SET total_bytes = total_bytes - ?', (size,)
+            )
+            removed += count
+        return removed
+
+    def _evict(self, connection, now):
+        total = connection.execute(
+            'SELECT total_bytes FROM cache_meta'
+        ).fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        expired = [row[0] for row in connection.execute(
+            'SELECT key FROM cache_entry WHERE expires <= ?', (now,)
+        )]
+        self._remove(connection, expired)
+        target = self._max_bytes * self._cull_to
+        total = connection.execute(
+            'SELECT total_bytes FROM cache_meta'
+        ).fetchone()[0]
+        while total > target:
+            victims = connection.execute(
+                'SELECT key, size FROM cache_entry ORDER BY accessed LIMIT ?',
+                (MAX_VARIABLES,),
+            ).fetchall()
+            if not victims:
+                break
+            keys = []
+            for key, size in victims:
+                keys.append(key)
+                total -= size
+                if total <= target:
+                    break
+            self._remove(connection, keys)
+
+    def _touch_accessed(self, keys, now):
+        connection = self._connection()
+        for start in range(0, len(keys), MAX_VARIABLES):
+            chunk = keys[start:start + MAX_VARIABLES]
+            marks = ', '.join('?' * len(chunk))
+            connection.execute(
+                f'UPDATE cache_entry SET accessed = ? WHERE key IN ({marks})'
+                ' AND accessed < ?',
+                (now, *chunk, now - ACCESS_GRANULARITY),
+            )
+
+    def _fetch(self, keys, now):
+        connection = self._connection()
+        found = {}
+        for start in range(0, len(keys), MAX_VARIABLES):
+            chunk = keys[start:start + MAX_VARIABLES]
+            marks = ', '.join('?' * len(chunk))
+            for key, value, expires, accessed in connection.execute(
+                'SELECT key, value, expires, accessed FROM cache_entry'
+                f' WHERE key IN ({marks})', chunk
+            ):
+                if expires is not None and expires <= now:
+                    continue
+                found[key] = (pickle.loads(value), accessed)
+        stale = [
+            key for key, (_, accessed) in found.items()
+            if accessed < now - ACCESS_GRANULARITY
+        ]
+        if stale:
+            self._touch_accessed(stale, now)
+        return {key: value for key, (value, _) in found.items()}
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._fetch([key], time.time()).get(key, default)
+
+    def get_many(self, keys, version=None):
+        mapping = {self._key(key, version): key for key in keys}
+        found = self._fetch(list(mapping), time.time())
+        return {mapping[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as connection:
+            self._store(connection, key, value, self._expires(timeout), now)
+            self._evict(connection, now)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        expires = self._expires(timeout)
+        with self._write() as connection:
+            for key, value in data.items():
+                self._store(
+                    connection, self._key(key, version), value, expires, now
+                )
+            self._evict(connection, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as connection:
+            row = connection.execute(
+                'SELECT expires FROM cache_entry WHERE key = ?', (key,)
+            ).fetchone()
+            if row and (row[0] is None or row[0] > now):
+                return False
+            self._store(connection, key, value, self._expires(timeout), now)
+            self._evict(connection, now)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache_entry WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            self._store(connection, key, value, row[1], now)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as connection:
+            return connection.execute(
+                'UPDATE cache_entry SET expires = ?, accessed = ?'
+                ' WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self._expires(timeout), now, key, now),
+            ).rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._connection().execute(
+            'SELECT 1 FROM cache_entry WHERE key = ?'
+            ' AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        with self._write() as connection:
+            self._remove(connection, [self._key(key, version)])
+
+    def delete_many(self, keys, version=None):
+        with self._write() as connection:
+            self._remove(connection, [self._key(key, version) for key in keys])
+
+    def clear(self):
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache_entry')
+            connection.execute('UPDATE cache_meta SET total_bytes = 0')
+
+
+class _Transaction:
+    """``BEGIN IMMEDIATE`` … ``COMMIT``/``ROLLBACK`` вокруг блока."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
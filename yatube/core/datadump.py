@@ -0,0 +1,290 @@
+"""Потоковые выгрузка и загрузка данных в JSON Lines.
+
+В отличие от ``dumpdata``/``loaddata`` данные не собираются в памяти
+целиком: выгрузка читает таблицы пачками по первичному ключу, загрузка
+разбирает файл запись за записью и пишет пачками через
+``bulk_create``. Каждая строка файла — запись в формате сериализатора
+Django (``model``, ``pk``, ``fields``), поэтому загрузка читает и
+обычный JSON-массив, как в ``dump.json``. Файлы с расширением ``.gz``
+сжимаются и распаковываются на лету.
+
+Сигналы моделей при загрузке не вызываются. Вместо них после загрузки
+посылается ``imported``: приложения пересобирают по нему то, что
+обычно поддерживают сигналы (ленты, счётчики, версии кэша).
+"""
+import datetime
+import gzip
+import json
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core import serializers
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models.fields.related import ForeignKey
+from django.dispatch import Signal
+
+BATCH_SIZE = 2000
+CHUNK_SIZE = 64 * 1024
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Посылается после загрузки; ``counts`` — число записей по моделям.
+imported = Signal(providing_args=['counts'])
+
+
+class Encoder(DjangoJSONEncoder):
+    def default(self, value):
+        # DjangoJSONEncoder обрезает время до миллисекунд.
+        if isinstance(value, (datetime.datetime, datetime.time)):
+            return value.isoformat()
+        return super().default(value)
+
+
+def open_output(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+
+def open_input(path):
+    with open(path, 'rb') as probe:
+        compressed = probe.read(2) == GZIP_MAGIC
+    if compressed:
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def select_models(labels=(), exclude=()):
+    """Модели по меткам ``app`` и ``app.Model`` в порядке зависимостей."""
+    def resolve(label):
+        if '.' in label:
+            return [apps.get_model(label)]
+        return list(apps.get_app_config(label).get_models())
+
+    if labels:
+        chosen = [model for label in labels for model in resolve(label)]
+    else:
+        chosen = list(apps.get_models())
+    excluded = {model for label in exclude for model in resolve(label)}
+    return sort_models(
+        model for model in chosen
+        if model not in excluded
+        and not model._meta.proxy
+        and model._meta.managed
+    )
+
+
+def sort_models(models):
+    """Топологическая сортировка: модель идёт после тех, на кого ссылается.
+
+    ``serializers.sort_dependencies`` учитывает только натуральные
+    ключи, а здесь порядок нужен по внешним ключам.
+    """
+    models = list(dict.fromkeys(models))
+    selected = set(models)
+    ordered, visiting, done = [], set(), set()
+
+    def visit(model):
+        if model in done:
+            return
+        if model in visiting:
+            # Цикл внешних ключей разрешится отложенной проверкой
+            # ограничений в конце транзакции.
+            return
+        visiting.add(model)
+        for field in model._meta.concrete_fields:
+            target = field.related_model if field.is_relation else None
+            if target is not None and target is not model:
+                target = target._meta.concrete_model
+                if target in selected:
+                    visit(target)
+        visiting.discard(model)
+        done.add(model)
+        ordered.append(model)
+
+    for model in models:
+        visit(model)
+    return ordered
+
+
+def _value(obj, field):
+    if isinstance(field, ForeignKey):
+        return getattr(obj, field.attname)
+    value = field.value_from_object(obj)
+    if isinstance(value, (str, int, float, bool, type(None),
+                          datetime.datetime, datetime.date, datetime.time)):
+        return value
+    return field.value_to_string(obj)
+
+
+def _m2m_values(model, field, pks):
+    """Связи многие-ко-многим пачки объектов одним запросом."""
+    through = field.remote_field.through
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    related = {pk: [] for pk in pks}
+    rows = (
+        through.objects.filter(**{f'{source}__in': pks})
+        .order_by('pk').values_list(f'{source}_id', f'{target}_id')
+    )
+    for source_id, target_id in rows:
+        related[source_id].append(target_id)
+    return related
+
+
+def export_records(model, batch_size=BATCH_SIZE):
+    """Записи модели пачками по возрастанию первичного ключа."""
+    opts = model._meta
+    fields = [
+        field for field in opts.local_fields
+        if field.serialize and not field.primary_key
+    ]
+    m2m_fields = [
+        field for field in opts.local_many_to_many
+        if field.serialize and field.remote_field.through._meta.auto_created
+    ]
+    label = opts.label_lower
+    queryset = model._default_manager.order_by('pk')
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        pks = [obj.pk for obj in batch]
+        m2m = {
+            field.name: _m2m_values(model, field, pks) for field in m2m_fields
+        }
+        for obj in batch:
+            values = {field.name: _value(obj, field) for field in fields}
+            for name, related in m2m.items():
+                values[name] = related[obj.pk]
+            yield {'model': label, 'pk': obj.pk, 'fields': values}
+        last = pks[-1]
+
+
+def write_records(output, records):
+    written = 0
+    for record in records:
+        output.write(json.dumps(record, cls=Encoder, ensure_ascii=False))
+        output.write('\n')
+        written += 1
+    return written
+
+
+def read_records(source):
+    """Записи из JSON Lines или JSON-массива без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    while True:
+        position = 0
+        while True:
+            # Между записями допустимы пробелы, запятые и скобки
+            # массива: так один разбор подходит для обоих форматов.
+            while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+                position += 1
+            if position == len(buffer):
+                break
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                break
+            yield record
+            position = end
+        buffer = buffer[position:]
+        if eof:
+            return
+        chunk = source.read(CHUNK_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+
+@contextmanager
+def stored_dates(model):
+    """Отключает ``auto_now``/``auto_now_add``: даты берутся из файла."""
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Importer:
+    """Пишет записи пачками; существующие строки обновляет, как loaddata."""
+
+    def __init__(self, batch_size=BATCH_SIZE, exclude=()):
+        self.batch_size = batch_size
+        self.excluded = {
+            model._meta.label_lower for model in select_models(exclude)
+        } if exclude else set()
+        self.counts = {}
+
+    def load(self, records):
+        pending, model = [], None
+        for record in records:
+            label = record.get('model', '').lower()
+            if label in self.excluded:
+                continue
+            if label != model or len(pending) >= self.batch_size:
+                self.flush(pending)
+                pending, model = [], label
+            pending.append(record)
+        self.flush(pending)
+        self.reset_sequences()
+        imported.send(sender=type(self), counts=self.counts)
+        return self.counts
+
+    def flush(self, records):
+        if not records:
+            return
+        objects = list(serializers.deserialize('python', records))
+        model = type(objects[0].object)
+        existing = set(
+            model._default_manager.filter(
+                pk__in=[item.object.pk for item in objects]
+            ).values_list('pk', flat=True)
+        )
+        created = [item for item in objects if item.object.pk not in existing]
+        with stored_dates(model):
+            model._default_manager.bulk_create(
+                [item.object for item in created]
+            )
+            for item in objects:
+                if item.object.pk in existing:
+                    item.save()
+        for item in created:
+            for name, values in item.m2m_data.items():
+                self.add_m2m(model, name, item.object.pk, values)
+        label = model._meta.label
+        self.counts[label] = self.counts.get(label, 0) + len(objects)
+
+    def add_m2m(self, model, name, pk, values):
+        field = model._meta.get_field(name)
+        through = field.remote_field.through
+        source = f'{field.m2m_field_name()}_id'
+        target = f'{field.m2m_reverse_field_name()}_id'
+        through.objects.bulk_create(
+            [through(**{source: pk, target: value}) for value in values]
+        )
+
+    def reset_sequences(self):
+        """Счётчики id после вставки явных ключей, как в loaddata."""
+        models = [apps.get_model(label) for label in self.counts]
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), models
+        ) if models else []
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -0,0 +1,188 @@
+"""Работа сайта при недоступной базе данных.
+
+Когда запрос падает из-за потери соединения с БД (``connection_lost``)
+или пока разомкнут автомат ``breaker``, вместо страницы 500:
+
+* GET и HEAD получают последнюю удачную копию страницы, сохранённую
+  через ``remember()`` и живущую дольше обычного кэша
+  (``STALE_PAGE_TIMEOUT``), с заголовками ``Age`` и ``Warning: 110``;
+* остальные запросы и страницы без копии сразу получают 503 с
+  ``Retry-After``.
+
+Прочие ошибки базы (нет такой колонки, таймаут запроса, занятая база
+SQLite) означают, что база отвечает: они доходят до страницы 500 и
+журнала, а не прячутся за прежней копией.
+
+Автомат ``breaker`` размыкается после ``DB_BREAKER_THRESHOLD`` потерь
+соединения (``connection_lost``) за ``DB_BREAKER_WINDOW`` секунд;
+таймауты запросов, взаимоблокировки и занятая база SQLite его не
+размыкают. Пока он разомкнут, запросы не доходят до представлений и не
+ждут таймаутов соединения. Через ``DB_BREAKER_COOLDOWN`` секунд один
+запрос проверяет базу через ``SELECT 1`` и замыкает автомат, если она
+ответила. Состояние автомата своё у каждого процесса.
+
+Копии страниц общие для всех: вошедший пользователь в это время видит
+страницу такой, какой её видит аноним.
+"""
+import collections
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (DEFAULT_DB_ALIAS, InterfaceError, OperationalError,
+                       connections)
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+
+# Ошибки соединения, а не данных: IntegrityError и подобные означают,
+# что база работает.
+DATABASE_ERRORS = (OperationalError, InterfaceError)
+# Классы SQLSTATE PostgreSQL: 08 — ошибки соединения, 57P — сервер
+# останавливается или ещё не принимает соединения.
+CONNECTION_PGCODES = ('08', '57P')
+SAFE_METHODS = ('GET', 'HEAD')
+STALE_KEY = 'stale_page:{}'
+
+
+def _probe():
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def connection_lost(exception):
+    """Ошибка означает недоступную базу, а не отказ одного запроса.
+
+    Код SQLSTATE решает сразу; без него (SQLite, обрыв при подключении)
+    базу проверяет ``SELECT 1``.
+    """
+    if not isinstance(exception, DATABASE_ERRORS):
+        return False
+    code = getattr(exception.__cause__, 'pgcode', None)
+    if code is not None:
+        return code.startswith(CONNECTION_PGCODES)
+    if connections[DEFAULT_DB_ALIAS].connection is None:
+        # Соединение так и не открылось.
+        return True
+    try:
+        _probe()
+    except DATABASE_ERRORS:
+        return True
+    return False
+
+
+class CircuitBreaker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.failures = collections.deque()
+        self.opened = None
+        self.probing = False
+
+    @property
+    def open(self):
+        return self.opened is not None
+
+    def failure(self):
+        now = time.monotonic()
+        with self.lock:
+            self.failures.append(now)
+            while self.failures[0] <= now - settings.DB_BREAKER_WINDOW:
+                self.failures.popleft()
+            if (
+                self.open
+                or len(self.failures) >= settings.DB_BREAKER_THRESHOLD
+            ):
+                self.opened = now
+                self.failures.clear()
+
+    def allow(self):
+        """Можно ли идти в базу; после паузы её проверяет один запрос."""
+        with self.lock:
+            if not self.open:
+                return True
+            waited = time.monotonic() - self.opened
+            if self.probing or waited < settings.DB_BREAKER_COOLDOWN:
+                return False
+            self.probing = True
+        try:
+            _probe()
+        except DATABASE_ERRORS:
+            with self.lock:
+                self.probing = False
+                self.opened = time.monotonic()
+            return False
+        with self.lock:
+            self.probing = False
+            self.opened = None
+        return True
+
+
+breaker = CircuitBreaker()
+
+
+def _key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return STALE_KEY.format(path)
+
+
+def remember(request, content, content_type):
+    """Сохраняет удачную страницу на случай недоступности базы."""
+    cache.set(
+        _key(request),
+        (content, content_type, time.time()),
+        settings.STALE_PAGE_TIMEOUT,
+    )
+
+
+def unavailable(request):
+    """Прежняя копия страницы или 503."""
+    stale = None
+    if request.method in SAFE_METHODS:
+        stale = cache.get(_key(request))
+    if stale is not None:
+        content, content_type, stored = stale
+        response = HttpResponse(content, content_type=content_type)
+        response['Age'] = int(time.time() - stored)
+        response['Warning'] = '110 - "Response is Stale"'
+        patch_cache_control(response, max_age=0)
+        return response
+    retry_after = settings.DB_BREAKER_COOLDOWN
+    # Без запроса: контекст-процессоры и метки не обращаются к базе.
+    response = HttpResponse(
+        render_to_string('core/503.html', {'retry_after': retry_after}),
+        status=503,
+    )
+    response['Retry-After'] = retry_after
+    return response
+
+
+def handle(request, exception):
+    """Ответ на недоступность базы или None для прочих исключений."""
+    if not isinstance(exception, DATABASE_ERRORS):
+        return None
+    if connection_lost(exception):
+        breaker.failure()
+    elif not breaker.open:
+        return None
+    return unavailable(request)
+
+
+class DegradedModeMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not breaker.allow():
+            return unavailable(request)
+        return None
+
+    def process_exception(self, request, exception):
+        return handle(request, exception)
@@ -0,0 +1,60 @@
+"""Персональные фрагменты в общих страницах (в духе Edge Side Includes).
+
+Тег ``{% hole 'шаблон' имя=значение %}`` оставляет в странице метку
+вместо содержимого. Такую страницу можно кэшировать одну на всех
+пользователей: метки заполняет ``fill()`` уже для конкретного запроса,
+рендеря маленький шаблон с контекстом запроса (пользователь,
+CSRF-токен) и аргументами метки. Аргументы должны сериализоваться в
+JSON: обычно это id и имена, а не объекты моделей.
+
+``HoleMiddleware`` заполняет метки в любом HTML-ответе, который не
+заполнил их сам, — например, в некэшируемых страницах.
+"""
+import base64
+import json
+import re
+
+from django.template.loader import get_template
+
+MARKER = '<!--hole:'
+PATTERN = re.compile(r'<!--hole:([A-Za-z0-9_-]+)-->')
+
+
+def placeholder(template_name, args):
+    raw = json.dumps([template_name, args], separators=(',', ':'))
+    token = base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+    return f'{MARKER}{token}-->'
+
+
+def _decode(token):
+    raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    return json.loads(raw)
+
+
+def fill(request, content):
+    """Заполняет метки в ``content`` для ``request``."""
+    if MARKER not in content:
+        return content
+
+    def render(match):
+        template_name, args = _decode(match.group(1))
+        return get_template(template_name).render(args, request)
+
+    return PATTERN.sub(render, content)
+
+
+class HoleMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            not response.streaming
+            and response.get('Content-Type', '').startswith('text/html')
+            and MARKER.encode() in response.content
+        ):
+            response.content = fill(
+                request, response.content.decode(response.charset)
+            )
+        return response
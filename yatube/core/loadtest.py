@@ -0,0 +1,159 @@
+"""Нагрузочный прогон WSGI-приложения без HTTP-сервера.
+
+Запросы подаются прямо в ``application`` из ``yatube/wsgi.py`` из
+нескольких потоков. Так измеряется весь стек Django — middleware,
+представления, шаблоны, кэш и БД — без шума сети и сервера. Для
+каждой страницы считаются пропускная способность, перцентили
+задержки и число SQL-запросов. Результат сохраняется в JSON, и два
+прогона можно сравнить.
+"""
+import io
+import itertools
+import json
+import math
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.db import connection
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, rank):
+    """Перцентиль методом ближайшего ранга по отсортированному списку."""
+    if not values:
+        return None
+    index = max(0, math.ceil(rank / 100 * len(values)) - 1)
+    return values[index]
+
+
+def make_environ(url, host, cookie=None):
+    parts = urlsplit(url)
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': host,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if cookie:
+        environ['HTTP_COOKIE'] = cookie
+    return environ
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def call(application, url, host, cookie=None):
+    """Выполняет запрос и возвращает (статус, секунды, число запросов)."""
+    status = []
+
+    def start_response(value, headers, exc_info=None):
+        status.append(int(value.split()[0]))
+
+    counter = QueryCounter()
+    started = time.perf_counter()
+    # Соединение с БД своё у каждого потока, поэтому счётчик
+    # ставится на соединение текущего потока перед каждым запросом.
+    with connection.execute_wrapper(counter):
+        environ = make_environ(url, host, cookie)
+        response = application(environ, start_response)
+        try:
+            for _ in response:
+                pass
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+    return status[0], time.perf_counter() - started, counter.count
+
+
+def run_endpoint(application, requests, host, concurrency, total, warmup=0):
+    """Прогоняет ``total`` запросов к одной странице в ``concurrency`` потоков.
+
+    ``requests`` — бесконечный итератор пар ``(url, cookie)``.
+    """
+    lock = threading.Lock()
+    for _ in range(warmup):
+        url, cookie = next(requests)
+        call(application, url, host, cookie)
+    samples = []
+    remaining = itertools.count()
+
+    def worker():
+        while next(remaining) < total:
+            with lock:
+                url, cookie = next(requests)
+            samples.append(call(application, url, host, cookie))
+        connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, time.perf_counter() - started)
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(duration * 1000 for _, duration, _ in samples)
+    queries = [count for _, _, count in samples]
+    summary = {
+        'requests': len(samples),
+        'errors': sum(status >= 400 for status, _, _ in samples),
+        'rps': round(len(samples) / elapsed, 1) if elapsed else None,
+    }
+    for rank in PERCENTILES:
+        summary[f'p{rank}_ms'] = _round(percentile(latencies, rank))
+    summary['max_ms'] = _round(latencies[-1] if latencies else None)
+    summary['queries_avg'] = _round(
+        sum(queries) / len(queries) if queries else None
+    )
+    summary['queries_max'] = max(queries, default=None)
+    return summary
+
+
+def save(path, result):
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(result, output, ensure_ascii=False, indent=2, sort_keys=True)
+        output.write('\n')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as source:
+        return json.load(source)
+
+
+def compare(baseline, current):
+    """Строки ``(страница, метрика, было, стало, изменение в %)``."""
+    rows = []
+    for name, metrics in current['endpoints'].items():
+        before = baseline['endpoints'].get(name, {})
+        for metric, value in metrics.items():
+            old = before.get(metric)
+            change = None
+            if isinstance(old, (int, float)) and old and value is not None:
+                change = round((value - old) / old * 100, 1)
+            rows.append((name, metric, old, value, change))
+    return rows
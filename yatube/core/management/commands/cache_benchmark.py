@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+
+def make_backend(name, directory):
+    if name == 'locmem':
+        return LocMemCache('benchmark', {})
+    if name == 'file':
+        return FileBasedCache(os.path.join(directory, 'files'), {})
+    return SQLiteCache(os.path.join(directory, 'cache.sqlite3'), {})
+
+
+def run_workload(name, directory, operations, value_size, worker):
+    """Выполняет смешанную нагрузку и возвращает время каждой операции."""
+    cache = make_backend(name, directory)
+    value = 'x' * value_size
+    keys = [f'w{worker}:k{number}' for number in range(operations)]
+    timings = {}
+
+    started = time.perf_counter()
+    for key in keys:
+        cache.set(key, value)
+    timings['set'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    timings['get'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for start in range(0, operations, 10):
+        cache.get_many(keys[start:start + 10])
+    timings['get_many'] = time.perf_counter() - started
+
+    cache.set(f'w{worker}:counter', 0)
+    started = time.perf_counter()
+    for _ in range(operations):
+        cache.incr(f'w{worker}:counter')
+    timings['incr'] = time.perf_counter() - started
+    return timings
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает производительность кэшей locmem, file и sqlite '
+        'на смешанной нагрузке set/get/get_many/incr.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=5000)
+        parser.add_argument('--value-size', type=int, default=2048)
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Число процессов, одновременно работающих с кэшем.'
+        )
+        parser.add_argument(
+            '--backends', nargs='+', default=['locmem', 'file', 'sqlite'],
+            choices=['locmem', 'file', 'sqlite'],
+        )
+
+    def handle(self, *args, **options):
+        operations = options['operations']
+        processes = options['processes']
+        self.stdout.write(
+            f'{"backend":<8} {"operation":<9} {"ops/sec":>12} {"us/op":>9}'
+        )
+        for name in options['backends']:
+            directory = tempfile.mkdtemp(prefix=f'cache-bench-{name}-')
+            try:
+                with ProcessPoolExecutor(processes) as pool:
+                    results = list(pool.map(
+                        run_workload,
+                        [name] * processes,
+                        [directory] * processes,
+                        [operations] * processes,
+                        [options['value_size']] * processes,
+                        range(processes),
+                    ))
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            for operation in results[0]:
+                elapsed = max(result[operation] for result in results)
+                total = operations * processes
+                self.stdout.write(
+                    f'{name:<8} {operation:<9} {total / elapsed:>12.0f} '
+                    f'{elapsed / operations * 1e6:>9.1f}'
+                )
@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.datadump import (BATCH_SIZE, export_records, open_output,
+                           select_models, write_records)
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая выгрузка данных в JSON Lines (.gz — со сжатием): '
+        'модели в порядке внешних ключей, таблицы читаются пачками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'labels', nargs='*', metavar='app_label[.ModelName]'
+        )
+        parser.add_argument(
+            '-e', '--exclude', action='append', default=[],
+            help='Пропустить приложение или модель; можно повторять.'
+        )
+        parser.add_argument(
+            '-o', '--output', help='Файл; без него — стандартный вывод.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            models = select_models(options['labels'], options['exclude'])
+        except LookupError as error:
+            raise CommandError(error)
+        path = options['output']
+        output = open_output(path) if path else sys.stdout
+        try:
+            for model in models:
+                written = write_records(
+                    output, export_records(model, options['batch_size'])
+                )
+                if path:
+                    self.stdout.write(f'{model._meta.label}: {written}')
+        finally:
+            if path:
+                output.close()
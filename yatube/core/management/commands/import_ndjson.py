@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.datadump import BATCH_SIZE, Importer, open_input, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая загрузка JSON Lines или JSON-массива (как у dumpdata, '
+        'в том числе .gz) пачками через bulk_create. Сигналы моделей не '
+        'вызываются: после загрузки в той же транзакции пересобираются '
+        'ленты подписок, счётчики и версии кэша.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '-e', '--exclude', action='append', default=[],
+            help='Пропустить приложение или модель; можно повторять.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            importer = Importer(options['batch_size'], options['exclude'])
+        except LookupError as error:
+            raise CommandError(error)
+        with open_input(options['path']) as source, transaction.atomic():
+            counts = importer.load(read_records(source))
+        for label, count in counts.items():
+            self.stdout.write(f'{label}: {count}')
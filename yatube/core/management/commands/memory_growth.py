@@ -0,0 +1,84 @@
+import itertools
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import loadtest, memory
+
+HOST = 'localhost'
+
+
+class Command(BaseCommand):
+    help = (
+        'Рост памяти по модулям: сравнение снимков, сохранённых '
+        'POST /debug/memory action=save, или прогон запросов в этом '
+        'процессе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'snapshots', nargs='*', metavar='SNAPSHOT',
+            help='Снимки одного воркера: первый сравнивается с последним.'
+        )
+        parser.add_argument(
+            '--url', action='append', dest='urls',
+            help='Страница для прогона, можно несколько; по умолчанию /.'
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument(
+            '--rounds', type=int, default=3,
+            help='Снимков за прогон: рост от круга к кругу отличает утечку '
+                 'от прогрева кэшей.'
+        )
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        if len(options['snapshots']) == 1:
+            raise CommandError('Нужно хотя бы два снимка.')
+        if options['snapshots']:
+            first, *_, last = options['snapshots']
+            try:
+                old, new = map(tracemalloc.Snapshot.load, (first, last))
+            except OSError as error:
+                raise CommandError(error)
+            groups = memory.compare(old, new)
+        else:
+            groups = self.replay(options)
+        for line in memory.report(groups, options['limit']):
+            self.stdout.write(line)
+
+    def replay(self, options):
+        if options['rounds'] < 1:
+            raise CommandError('--rounds должно быть не меньше 1.')
+        from yatube.wsgi import application
+        urls = itertools.cycle(options['urls'] or ['/'])
+        started = not tracemalloc.is_tracing()
+        memory.start()
+        try:
+            for _ in range(options['warmup']):
+                loadtest.call(application, next(urls), HOST)
+            baseline = previous = memory.take()
+            per_round = max(1, options['requests'] // options['rounds'])
+            for number in range(1, options['rounds'] + 1):
+                errors = 0
+                for _ in range(per_round):
+                    status, _, _ = loadtest.call(
+                        application, next(urls), HOST
+                    )
+                    errors += status >= 400
+                snapshot = memory.take()
+                growth = sum(
+                    stat.size_diff
+                    for stat in snapshot.compare_to(previous, 'filename')
+                )
+                growth = memory.format_size(growth, True)
+                self.stdout.write(
+                    f'Круг {number}: {per_round} запросов, ошибок {errors}, '
+                    f'рост {growth}; {memory.summary()}'
+                )
+                previous = snapshot
+            return memory.compare(baseline, snapshot)
+        finally:
+            if started:
+                tracemalloc.stop()
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import make_token
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Токен для заголовка X-Profile: профилирование запросов '
+        'сотрудника на рабочем сайте.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError('Пользователь не найден.')
+        if not user.is_staff:
+            raise CommandError('Профилировать могут только сотрудники.')
+        self.stdout.write(make_token(user))
+        self.stderr.write(
+            f'Действует {settings.PROFILE_TOKEN_MAX_AGE} с, '
+            'передавайте вместе с cookie сессии этого пользователя.'
+        )
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.slowlog import aggregate, log_files, read
+
+SQL_WIDTH = 200
+
+
+def top(counts, limit=3):
+    ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+    return ', '.join(f'{name} ×{count}' for name, count in ranked[:limit])
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка журнала медленных запросов: отпечатки SQL по убыванию '
+        'суммарного времени с представлениями и местами в шаблонах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log', default=settings.SLOW_QUERY_LOG,
+            help='Файл лога; ротированные копии читаются тоже.'
+        )
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--view', help='Только запросы представления, например '
+                           'posts:index.'
+        )
+
+    def handle(self, *args, **options):
+        if not log_files(options['log']):
+            raise CommandError(f'Лог {options["log"]} не найден.')
+        groups = aggregate(read(options['log']), view=options['view'])
+        if not groups:
+            self.stdout.write('Медленных запросов нет.')
+            return
+        for number, group in enumerate(groups[:options['limit']], 1):
+            sql = group['normalized']
+            if len(sql) > SQL_WIDTH:
+                sql = sql[:SQL_WIDTH] + '…'
+            self.stdout.write(
+                f'{number:>2}. {group["total_ms"]:.1f} мс всего, '
+                f'{group["count"]} раз, до {group["max_ms"]:.1f} мс '
+                f'[{group["fingerprint"]}]'
+            )
+            self.stdout.write(f'    {sql}')
+            self.stdout.write(f'    представления: {top(group["views"])}')
+            self.stdout.write(f'    источники: {top(group["sources"])}')
+        self.stdout.write(
+            f'Отпечатков: {len(groups)}, запросов: '
+            f'{sum(group["count"] for group in groups)}.'
+        )
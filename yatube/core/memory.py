@@ -0,0 +1,313 @@
+"""Диагностика роста памяти долгоживущих воркеров gunicorn.
+
+Снимки ``tracemalloc`` делаются внутри воркера и сравниваются между
+собой. Размещения группируются по модулю: берётся самый внутренний кадр
+стека, попавший в ``GROUPS`` (``posts``, ``sorl``, ``PIL``,
+``django.template``, ``django.core.cache`` — записи ``LocMemCache``),
+иначе — пакет самого внутреннего кадра. Внутри группы показываются
+строки, на которых выросло больше всего.
+
+Трассировка включается переменной ``MEMORY_TRACING=1`` при старте или
+на ходу сотрудником: POST на ``/debug/memory`` с ``action=start`` и
+CSRF-токеном (cookie ставит GET той же страницы). GET
+``/debug/memory`` только читает: показывает рост с начала трассировки и
+с прошлого запроса к этому воркеру. POST с ``action=save`` вдобавок
+сохраняет снимок в ``MEMORY_DIR``, ``action=stop`` выключает
+трассировку. ``manage.py memory_growth`` сравнивает сохранённые снимки
+или воспроизводит рост, прогнав запросы в своём процессе.
+
+tracemalloc видит только память, выделенную через Python. Буферы
+изображений Pillow выделяются в C мимо него, поэтому рост RSS без роста
+отслеживаемой памяти указывает на них.
+
+При ``MEMORY_RECYCLE_MB`` воркер, RSS которого вырос больше чем на
+столько мегабайт с первого запроса, дописывает ответ и завершается
+по SIGTERM, а мастер gunicorn запускает новый.
+"""
+import functools
+import logging
+import os
+import signal
+import sys
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_http_methods
+
+logger = logging.getLogger(__name__)
+
+GROUPS = ('posts', 'sorl', 'PIL', 'django.template', 'django.core.cache')
+SITES = 5
+ACTIONS = ('start', 'stop', 'save')
+FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+state = {
+    'pid': None, 'baseline': None, 'previous': None, 'rss': None,
+    'recycling': False,
+}
+
+
+def _state():
+    if state['pid'] != os.getpid():
+        # Воркер после fork не наследует снимки мастера.
+        state.update(
+            pid=os.getpid(), baseline=None, previous=None, rss=None,
+            recycling=False,
+        )
+    return state
+
+
+def rss():
+    """Резидентная память процесса в байтах."""
+    try:
+        with open('/proc/self/statm') as source:
+            pages = int(source.read().split()[1])
+    except OSError:
+        # Не Linux: только пиковое значение.
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+@functools.lru_cache(maxsize=4096)
+def module_name(filename):
+    """Имя модуля по пути файла: ``.../django/template/base.py`` —
+    ``django.template.base``."""
+    if filename.startswith('<'):
+        return filename
+    roots = sorted(
+        {os.path.abspath(path) for path in sys.path if path}
+        | {str(settings.BASE_DIR)},
+        key=len, reverse=True,
+    )
+    filename = os.path.abspath(filename)
+    for root in roots:
+        if filename.startswith(root + os.sep):
+            parts = os.path.splitext(os.path.relpath(filename, root))[0]
+            parts = parts.split(os.sep)
+            if parts[-1] == '__init__':
+                parts.pop()
+            return '.'.join(parts)
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def group(module):
+    """Группа из ``GROUPS`` или None."""
+    for name in GROUPS:
+        if module == name or module.startswith(name + '.'):
+            return name
+    return None
+
+
+def classify(traceback):
+    """(группа, строка) для стека размещения."""
+    frames = [
+        (module_name(frame.filename), frame.lineno)
+        for frame in reversed(traceback)
+    ]
+    for module, lineno in frames:
+        name = group(module)
+        if name is not None:
+            return name, f'{module}:{lineno}'
+    module, lineno = frames[0]
+    parts = module.split('.')
+    name = '.'.join(parts[:2]) if parts[0] == 'django' else parts[0]
+    return name, f'{module}:{lineno}'
+
+
+def start(frames=None):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames or settings.MEMORY_TRACE_FRAMES)
+
+
+def take():
+    return tracemalloc.take_snapshot().filter_traces(FILTERS)
+
+
+def compare(old, new, sites=SITES):
+    """Рост по группам, от наибольшего: размер и число блоков, текущий
+    размер группы и строки с наибольшим ростом."""
+    groups = {}
+    for stat in new.compare_to(old, 'traceback'):
+        name, site = classify(stat.traceback)
+        entry = groups.setdefault(name, {
+            'group': name, 'size_diff': 0, 'count_diff': 0, 'size': 0,
+            'sites': {},
+        })
+        entry['size_diff'] += stat.size_diff
+        entry['count_diff'] += stat.count_diff
+        entry['size'] += stat.size
+        if stat.size_diff or stat.count_diff:
+            size_diff, count_diff = entry['sites'].get(site, (0, 0))
+            entry['sites'][site] = (
+                size_diff + stat.size_diff, count_diff + stat.count_diff
+            )
+    for entry in groups.values():
+        entry['sites'] = sorted(
+            entry['sites'].items(), key=lambda item: item[1][0],
+            reverse=True,
+        )[:sites]
+    return sorted(
+        groups.values(), key=lambda entry: entry['size_diff'], reverse=True
+    )
+
+
+def format_size(value, sign=False):
+    """Размер в байтах в виде «1.5 МиБ»; ``sign`` добавляет плюс к росту."""
+    for unit in ('Б', 'КиБ', 'МиБ'):
+        if abs(value) < 1024 or unit == 'МиБ':
+            break
+        value /= 1024
+    text = f'{value:.1f} {unit}' if unit != 'Б' else f'{value} {unit}'
+    return f'+{text}' if sign and value > 0 else text
+
+
+def _group_lines(entry):
+    growth = format_size(entry['size_diff'], True)
+    total = format_size(entry['size'])
+    lines = [
+        f'{entry["group"]:<20} {growth:>12} '
+        f'{entry["count_diff"]:>+8} блоков  (всего {total})'
+    ]
+    for site, (size_diff, count_diff) in entry['sites']:
+        growth = format_size(size_diff, True)
+        lines.append(f'    {site:<40} {growth:>12} {count_diff:>+8}')
+    return lines
+
+
+def report(groups, limit=10):
+    """Строки отчёта по результату ``compare``: сначала все группы из
+    ``GROUPS``, даже без роста, затем ``limit`` остальных."""
+    found = {entry['group']: entry for entry in groups}
+    lines = []
+    for name in GROUPS:
+        lines += _group_lines(found.get(name) or {
+            'group': name, 'size_diff': 0, 'count_diff': 0, 'size': 0,
+            'sites': [],
+        })
+    others = [
+        entry for entry in groups if entry['group'] not in GROUPS
+    ][:limit]
+    if others:
+        lines.append('Остальные:')
+    for entry in others:
+        lines += _group_lines(entry)
+    return lines
+
+
+def summary():
+    """Строка о памяти процесса: RSS и память под трассировкой."""
+    line = f'pid {os.getpid()}, RSS {format_size(rss())}'
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        line += (
+            f', отслеживается {format_size(current)} '
+            f'(пик {format_size(peak)}), '
+            f'кадров {tracemalloc.get_traceback_limit()}'
+        )
+    return line
+
+
+def save(snapshot):
+    os.makedirs(settings.MEMORY_DIR, exist_ok=True)
+    path = os.path.join(
+        settings.MEMORY_DIR,
+        '{}-{}-{}.snapshot'.format(
+            os.getpid(), time.strftime('%Y%m%d-%H%M%S'), uuid.uuid4().hex[:8]
+        ),
+    )
+    snapshot.dump(path)
+    return path
+
+
+def _report_response(lines):
+    return HttpResponse(
+        '\n'.join(lines) + '\n', content_type='text/plain; charset=utf-8'
+    )
+
+
+@staff_member_required
+@require_http_methods(['GET', 'HEAD', 'POST'])
+@ensure_csrf_cookie
+def view(request):
+    """GET — отчёт, POST с ``action`` меняет состояние трассировки."""
+    current = _state()
+    action = None
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action not in ACTIONS:
+            return HttpResponseBadRequest(
+                'action: {}.'.format(', '.join(ACTIONS))
+            )
+    if action == 'stop':
+        tracemalloc.stop()
+        current.update(baseline=None, previous=None)
+        return _report_response([summary(), 'Трассировка выключена.'])
+    if action == 'start':
+        start()
+        current['baseline'] = current['previous'] = take()
+        return _report_response([summary(), 'Трассировка включена.'])
+    if not tracemalloc.is_tracing():
+        return _report_response([
+            summary(),
+            'Трассировка выключена: POST /debug/memory action=start.',
+        ])
+    snapshot = take()
+    lines = [summary()]
+    if action == 'save':
+        lines.append(f'Снимок: {save(snapshot)}')
+    if current['baseline'] is None:
+        current['baseline'] = current['previous'] = snapshot
+    lines += ['', 'С начала трассировки:']
+    lines += report(compare(current['baseline'], snapshot))
+    lines += ['', 'С прошлого запроса к этому воркеру:']
+    lines += report(compare(current['previous'], snapshot))
+    current['previous'] = snapshot
+    return _report_response(lines)
+
+
+def recycle():
+    """Мягко останавливает воркер gunicorn: он дописывает ответ и
+    выходит, мастер запускает новый."""
+    if 'gunicorn' not in sys.modules:
+        # runserver и тесты SIGTERM завершил бы целиком.
+        return False
+    os.kill(os.getpid(), signal.SIGTERM)
+    return True
+
+
+class MemoryRecycleMiddleware:
+    def __init__(self, get_response):
+        if settings.MEMORY_RECYCLE_MB is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        current = _state()
+        if current['recycling']:
+            return response
+        used = rss()
+        if current['rss'] is None:
+            current['rss'] = used
+        elif used - current['rss'] > settings.MEMORY_RECYCLE_MB * 2 ** 20:
+            logger.warning(
+                'Воркер %s вырос с %s до %s, перезапускаю.',
+                os.getpid(), format_size(current['rss']), format_size(used),
+            )
+            # Второй сигнал не нужен, пока воркер дописывает ответ.
+            current['recycling'] = True
+            recycle()
+        return response
@@ -0,0 +1,405 @@
+"""Метрики в формате Prometheus, общие для всех процессов.
+
+Каждый процесс копит значения в памяти. Если задан ``METRICS_DIR``,
+процесс в фоне не чаще раза в ``METRICS_FLUSH_INTERVAL`` секунд и при
+выходе сбрасывает их в свой файл ``<pid>-<метка>.json`` (запись атомарна:
+временный файл и ``os.replace``). Метка случайна для каждого процесса:
+воркер, получивший pid завершившегося, не перезапишет его файл, и
+счётчики не уменьшатся. ``/metrics`` суммирует файлы всех процессов,
+взяв для своего процесса значения из памяти, поэтому любой воркер
+gunicorn отдаёт общую картину с отставанием не больше интервала
+сброса.
+Файлы процессов, которых уже нет, складываются в ``dead.json``, как
+``mark_process_dead`` в prometheus_client, чтобы каталог не рос с
+каждым перезапуском воркера; очищают его при развёртывании.
+
+``/metrics`` отдаётся по заголовку ``Authorization: Bearer`` с
+``METRICS_TOKEN`` или сотруднику сайта; без токена в настройках —
+только сотрудникам.
+
+Метрики запросов пишет ``MetricsMiddleware``, беря число SQL-запросов
+и попадания в кэш из ``core.timing``. Представление — метка ``view``
+из разрешённого URL (``posts:profile``).
+"""
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from core import timing
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000)
+
+DEAD_FILE = 'dead.json'
+LOCK_FILE = '.lock'
+
+registry = {}
+lock = threading.Lock()
+values = {}
+
+
+def _process_id():
+    return f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+
+process = {
+    'pid': os.getpid(), 'id': _process_id(), 'flushed': time.monotonic(),
+    'timer': None,
+}
+
+
+def _after_fork():
+    """Воркер после fork не наследует значения, метку и таймер мастера.
+
+    Вызывается под ``lock``.
+    """
+    if process['pid'] != os.getpid():
+        values.clear()
+        process.update(pid=os.getpid(), id=_process_id(), timer=None)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        registry[name] = self
+
+    def _key(self, labels):
+        return self.name, tuple(str(labels[label]) for label in self.labels)
+
+    def initial(self):
+        return [0]
+
+    def update(self, current, value):
+        current[0] += value
+
+    def _record(self, value, labels):
+        key = self._key(labels)
+        with lock:
+            _after_fork()
+            current = values.get(key)
+            if current is None:
+                current = values[key] = self.initial()
+            self.update(current, value)
+
+    def samples(self, labels, current):
+        yield self.name, labels, current[0]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self._record(amount, labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def initial(self):
+        # Счётчики по корзинам (последняя — +Inf) и сумма.
+        return [0] * (len(self.buckets) + 1) + [0]
+
+    def update(self, current, value):
+        current[bisect.bisect_left(self.buckets, value)] += 1
+        current[-1] += value
+
+    def observe(self, value, **labels):
+        self._record(value, labels)
+
+    def samples(self, labels, current):
+        cumulative = 0
+        bounds = [_number(bound) for bound in self.buckets] + ['+Inf']
+        for bound, count in zip(bounds, current):
+            cumulative += count
+            yield f'{self.name}_bucket', labels + (('le', bound),), cumulative
+        yield f'{self.name}_sum', labels, current[-1]
+        yield f'{self.name}_count', labels, cumulative
+
+
+REQUEST_DURATION = Histogram(
+    'yatube_request_duration_seconds', 'Время обработки запроса.',
+    LATENCY_BUCKETS, labels=('view',),
+)
+REQUEST_QUERIES = Histogram(
+    'yatube_request_db_queries', 'Число SQL-запросов за запрос.',
+    QUERY_BUCKETS, labels=('view',),
+)
+RESPONSE_SIZE = Histogram(
+    'yatube_response_size_bytes', 'Размер тела ответа.',
+    SIZE_BUCKETS, labels=('view',),
+)
+RESPONSES = Counter(
+    'yatube_responses_total', 'Ответы по кодам.',
+    labels=('view', 'status'),
+)
+CACHE_LOOKUPS = Counter(
+    'yatube_cache_lookups_total',
+    'Обращения к кэшу страниц и фрагментов.',
+    labels=('result',),
+)
+THUMBNAIL_GENERATION = Histogram(
+    'yatube_thumbnail_generation_seconds',
+    'Время генерации миниатюры воркером.',
+    LATENCY_BUCKETS,
+)
+
+
+def _path(name):
+    return os.path.join(settings.METRICS_DIR, name)
+
+
+def _snapshot():
+    with lock:
+        _after_fork()
+        return [
+            [name, labels, list(current)]
+            for (name, labels), current in values.items()
+        ]
+
+
+def _write(path, data):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as output:
+        json.dump(data, output)
+    os.replace(temporary, path)
+
+
+def _load(path):
+    try:
+        with open(path) as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        # Файл удалили при очистке каталога.
+        return None
+
+
+def flush():
+    """Сохраняет значения процесса в его файл."""
+    with lock:
+        process['flushed'] = time.monotonic()
+        process['timer'] = None
+    snapshot = _snapshot()
+    if not settings.METRICS_DIR or not snapshot:
+        return
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    _write(_path(f'{process["id"]}.json'), snapshot)
+
+
+def schedule_flush():
+    """Сбрасывает значения в фоне не позже чем через интервал: простаивающий
+    воркер тоже отдаёт последние запросы, а запрос не ждёт записи."""
+    if not settings.METRICS_DIR:
+        return
+    with lock:
+        if process['timer'] is not None:
+            return
+        elapsed = time.monotonic() - process['flushed']
+        timer = threading.Timer(
+            max(0.0, settings.METRICS_FLUSH_INTERVAL - elapsed), flush
+        )
+        timer.daemon = True
+        process['timer'] = timer
+    timer.start()
+
+
+atexit.register(flush)
+
+
+@contextmanager
+def _locked(exclusive):
+    """Блокировка каталога: свёртку не видят читатели посередине."""
+    import fcntl
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    with open(_path(LOCK_FILE), 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _alive(name):
+    try:
+        pid = int(name.split('-')[0].split('.')[0])
+        os.kill(pid, 0)
+    except ValueError:
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю.
+        pass
+    return True
+
+
+def _read_dir():
+    """Свёртка завершившихся процессов и {имя файла: значения} прочих."""
+    dead = _load(_path(DEAD_FILE)) or {'files': [], 'values': []}
+    folded = set(dead['files'])
+    files = {}
+    for path in glob.glob(_path('*.json')):
+        name = os.path.basename(path)
+        if name == DEAD_FILE or name in folded:
+            continue
+        snapshot = _load(path)
+        if snapshot is not None:
+            files[name] = snapshot
+    return dead, files
+
+
+def _sum(snapshots):
+    total = {}
+    for snapshot in snapshots:
+        for name, labels, current in snapshot:
+            key = name, tuple(labels)
+            if key not in total:
+                total[key] = current
+            else:
+                total[key] = [a + b for a, b in zip(total[key], current)]
+    return total
+
+
+def compact():
+    """Складывает файлы завершившихся процессов в ``dead.json``.
+
+    Свёртка помнит имена сложенных файлов: если процесс упадёт, не
+    успев их удалить, они не будут посчитаны дважды.
+    """
+    with _locked(exclusive=True):
+        dead, files = _read_dir()
+        gone = [name for name in files if not _alive(name)]
+        if not gone:
+            return
+        total = _sum([dead['values']] + [files[name] for name in gone])
+        _write(_path(DEAD_FILE), {
+            'files': [
+                name for name in dead['files']
+                if os.path.exists(_path(name))
+            ] + gone,
+            'values': [
+                [name, list(labels), current]
+                for (name, labels), current in total.items()
+            ],
+        })
+        for name in gone:
+            os.remove(_path(name))
+
+
+def collect():
+    """Сумма значений всех процессов: {(имя, метки): значения}."""
+    snapshots = [_snapshot()]
+    if settings.METRICS_DIR:
+        compact()
+        with _locked(exclusive=False):
+            dead, files = _read_dir()
+        own = f'{process["id"]}.json'
+        snapshots.append(dead['values'])
+        snapshots += [
+            snapshot for name, snapshot in files.items() if name != own
+        ]
+    return _sum(snapshots)
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return (
+        value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+    )
+
+
+def exposition():
+    """Все метрики в текстовом формате Prometheus."""
+    by_metric = {}
+    for (name, label_values), current in sorted(collect().items()):
+        by_metric.setdefault(name, []).append((label_values, current))
+    lines = []
+    for name, metric in registry.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for label_values, current in by_metric.get(name, ()):
+            labels = tuple(zip(metric.labels, label_values))
+            for sample, sample_labels, value in metric.samples(
+                labels, current
+            ):
+                rendered = ','.join(
+                    f'{label}="{_escape(str(text))}"'
+                    for label, text in sample_labels
+                )
+                if rendered:
+                    sample = f'{sample}{{{rendered}}}'
+                lines.append(f'{sample} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def allowed(request):
+    """Токен из METRICS_TOKEN или сессия сотрудника; без токена в
+    настройках /metrics открыт только сотрудникам."""
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+    ):
+        return True
+    return request.user.is_staff
+
+
+def view(request):
+    if not allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unresolved'
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with timing.collect() as timings:
+            response = self.get_response(request)
+        name = view_name(request)
+        REQUEST_DURATION.observe(time.perf_counter() - started, view=name)
+        REQUEST_QUERIES.observe(timings.queries, view=name)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(len(response.content), view=name)
+        RESPONSES.inc(view=name, status=response.status_code)
+        if timings.hits:
+            CACHE_LOOKUPS.inc(timings.hits, result='hit')
+        if timings.misses:
+            CACHE_LOOKUPS.inc(timings.misses, result='miss')
+        schedule_flush()
+        return response
@@ -0,0 +1,182 @@
+import base64
+import binascii
+import datetime
+import json
+from functools import partial
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    """Страница keyset-пагинации.
+
+    Повторяет ту часть интерфейса ``django.core.paginator.Page``,
+    которой пользуются шаблоны, но вместо номеров страниц отдаёт
+    непрозрачные курсоры ``next_cursor``/``previous_cursor``.
+    """
+
+    is_cursor = True
+
+    def __init__(self, fetch, paginator):
+        # Запрос выполняется при первом обращении к странице, поэтому
+        # закэшированный фрагмент шаблона обходится без обращения к БД.
+        self._fetch = fetch
+        self._result = None
+        self.paginator = paginator
+
+    def _evaluate(self):
+        if self._result is None:
+            self._result = self._fetch()
+        return self._result
+
+    @property
+    def object_list(self):
+        return self._evaluate()[0]
+
+    # Пустой странице (курсор на краю ленты) продолжать не от чего:
+    # ссылки без курсора получили бы ``?after=None``.
+    @property
+    def _has_next(self):
+        return self._evaluate()[1] and bool(self.object_list)
+
+    @property
+    def _has_previous(self):
+        return self._evaluate()[2] and bool(self.object_list)
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0])
+
+
+class CursorPaginator:
+    """Keyset-пагинация по упорядоченной паре полей.
+
+    Вместо ``COUNT(*)`` и ``OFFSET`` каждая страница выбирается
+    условием вида ``(pub_date, id) < (:pub_date, :id)`` с ``LIMIT``,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    Последнее поле ``ordering`` должно быть уникальным.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(name.lstrip('-') for name in self.ordering)
+        self.descending = self.ordering[0].startswith('-')
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, name) for name in self.fields]
+        raw = json.dumps(values, default=self._encode_value).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def _encode_value(value):
+        # DjangoJSONEncoder обрезает микросекунды, а курсору нужна
+        # точная позиция, иначе соседние посты выпадут из выборки.
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        raise TypeError(f'{type(value).__name__} is not cursor-serializable')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (binascii.Error, UnicodeError, ValueError):
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        return [self._to_python(name, value)
+                for name, value in zip(self.fields, values)]
+
+    def _to_python(self, name, value):
+        try:
+            field = self.object_list.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Аннотации (например, ранг поиска) хранятся в JSON как есть.
+            return value
+        try:
+            return field.to_python(value)
+        except ValidationError:
+            raise InvalidCursor(value)
+
+    def _seek(self, values, forward):
+        """Условие «строго после курсора» в направлении обхода."""
+        lookup = 'lt' if forward == self.descending else 'gt'
+        condition = Q()
+        for position, name in enumerate(self.fields):
+            step = Q(**{f'{name}__{lookup}': values[position]})
+            for prev_name, prev_value in zip(self.fields, values[:position]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return tuple(
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        )
+
+    def _fetch_after(self, values):
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward=True))
+        rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return rows[:self.per_page], has_next, values is not None
+
+    def _fetch_before(self, values):
+        rows = list(
+            self.object_list.filter(self._seek(values, forward=False))
+            .order_by(*self._reversed_ordering())[:self.per_page + 1]
+        )
+        has_previous = len(rows) > self.per_page
+        return rows[:self.per_page][::-1], True, has_previous
+
+    def page(self, after=None, before=None):
+        if before:
+            fetch = partial(self._fetch_before, self.decode_cursor(before))
+        else:
+            values = self.decode_cursor(after) if after else None
+            fetch = partial(self._fetch_after, values)
+        return CursorPage(fetch, self)
+
+    def get_page(self, after=None, before=None):
+        """Как ``page()``, но битый курсор открывает первую страницу."""
+        try:
+            return self.page(after=after, before=before)
+        except InvalidCursor:
+            return self.page()
@@ -0,0 +1,202 @@
+"""Профилирование отдельных запросов к ``posts.views`` на рабочем сайте.
+
+Запрос профилируется, только если пользователь — сотрудник (``is_staff``)
+и запрос помечен:
+
+* параметром ``?profile`` — удобно из браузера;
+* заголовком ``X-Profile`` с токеном из ``manage.py profile_token``:
+  токен подписан ``SECRET_KEY``, выписан на конкретного сотрудника и
+  действует ``PROFILE_TOKEN_MAX_AGE`` секунд.
+
+Весь запрос, вместе с middleware ниже этого, выполняется под cProfile,
+а поток-сэмплер раз в ``PROFILE_SAMPLE_INTERVAL`` секунд снимает стек
+запроса. В ``PROFILE_DIR`` сохраняются три файла с общим именем:
+``.pstats`` для ``pstats``/snakeviz, ``.collapsed`` — стеки для
+flamegraph.pl и speedscope, ``.json`` — представление, пользователь,
+время и SQL-запросы с местом в шаблоне и коде (``core.testing``).
+Имя файлов возвращается в заголовке ``X-Profile-Id``.
+"""
+import cProfile
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from core.testing import QueryLog
+
+TOKEN_SALT = 'core.profiling'
+HEADER = 'HTTP_X_PROFILE'
+QUERY_FLAG = 'profile'
+PROFILED_MODULES = ('posts.views',)
+
+# Интервал переключения потоков общий для процесса: его меняет первый
+# из одновременных профилируемых запросов, а возвращает последний.
+switching = {'lock': threading.Lock(), 'users': 0, 'saved': None}
+
+
+def make_token(user):
+    return signing.dumps(user.get_username(), salt=TOKEN_SALT)
+
+
+def _token_valid(token, user):
+    try:
+        username = signing.loads(
+            token, salt=TOKEN_SALT, max_age=settings.PROFILE_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return username == user.get_username()
+
+
+def requested(request):
+    """Запрошено ли профилирование и разрешено ли оно."""
+    token = request.META.get(HEADER)
+    if token is None and QUERY_FLAG not in request.GET:
+        return False
+    # Сессия и пользователь загружаются только для помеченных запросов.
+    user = request.user
+    if not user.is_staff:
+        return False
+    return token is None or _token_valid(token, user)
+
+
+def _frame_name(code):
+    filename = code.co_filename
+    if filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, str(settings.BASE_DIR))
+    else:
+        filename = os.path.join(*filename.split(os.sep)[-2:])
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class Sampler(threading.Thread):
+    """Снимает стеки потока ``thread_id`` для flame graph."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+        self.names = {}
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                name = self.names.get(code)
+                if name is None:
+                    name = self.names[code] = _frame_name(code)
+                names.append(name)
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.items()
+        )
+
+
+@contextmanager
+def fast_switching(interval):
+    """Сэмплер получает GIL не чаще интервала переключения потоков."""
+    with switching['lock']:
+        if not switching['users']:
+            switching['saved'] = sys.getswitchinterval()
+            sys.setswitchinterval(interval)
+        switching['users'] += 1
+    try:
+        yield
+    finally:
+        with switching['lock']:
+            switching['users'] -= 1
+            if not switching['users']:
+                sys.setswitchinterval(switching['saved'])
+
+
+def save(name, profiler, sampler, meta):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    base = os.path.join(settings.PROFILE_DIR, name)
+    profiler.dump_stats(f'{base}.pstats')
+    with open(f'{base}.collapsed', 'w') as output:
+        output.write(sampler.collapsed())
+    with open(f'{base}.json', 'w') as output:
+        json.dump(meta, output, ensure_ascii=False, indent=2)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not requested(request):
+            return self.get_response(request)
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return self.get_response(request)
+        if match.func.__module__ not in PROFILED_MODULES:
+            return self.get_response(request)
+        return self.profile(request, match.view_name)
+
+    def profile(self, request, view_name):
+        log = QueryLog()
+        profiler = cProfile.Profile()
+        sampler = Sampler(
+            threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL
+        )
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            stack.enter_context(
+                fast_switching(settings.PROFILE_SAMPLE_INTERVAL)
+            )
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(log))
+            sampler.start()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+                sampler.stop()
+        duration = time.perf_counter() - started
+        name = '{}-{}-{}'.format(
+            time.strftime('%Y%m%d-%H%M%S'),
+            view_name.replace(':', '-'),
+            uuid.uuid4().hex[:8],
+        )
+        save(name, profiler, sampler, {
+            'view': view_name,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': request.user.get_username(),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'queries': [
+                {
+                    'sql': query.sql,
+                    'duration_ms': round(query.duration * 1000, 3),
+                    'template': query.template,
+                    'code': query.code,
+                }
+                for query in log
+            ],
+        })
+        response['X-Profile-Id'] = name
+        return response
@@ -0,0 +1,106 @@
+"""Чтение с реплик БД с read-your-writes.
+
+``ReplicaMiddleware`` разрешает читать с реплик только в безопасных
+запросах (GET, HEAD, OPTIONS). Всё остальное идёт на основную базу:
+запись, чтение вне запросов (команды, фоновые задачи) и чтение после
+записи в том же запросе. Кто сам что-то записал, получает cookie и
+следующие ``READ_YOUR_WRITES_SECONDS`` секунд читает с основной базы —
+так отставание реплики не прячет от него собственный пост или
+комментарий.
+
+Общий кэш реплику не читает: ``primary()`` отправляет на основную базу
+всё, что сохраняется в кэш (``core.singleflight``). Иначе отставшая
+реплика, прочитанная сразу после смены версии, легла бы в кэш свежей
+копией для всех пользователей.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Сессии читаются сразу после записи при входе, их отставание
+# разлогинивает пользователя.
+PRIMARY_ONLY_APPS = {'sessions'}
+
+state = threading.local()
+
+
+def replica_reads_allowed():
+    return getattr(state, 'replica_reads', False)
+
+
+@contextmanager
+def primary():
+    """Чтения внутри блока идут на основную базу."""
+    allowed = replica_reads_allowed()
+    state.replica_reads = False
+    try:
+        yield
+    finally:
+        # Запись внутри блока оставляет запрос на основной базе.
+        state.replica_reads = allowed and not getattr(state, 'wrote', False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.REPLICA_DATABASES
+        if (
+            not replicas
+            or not replica_reads_allowed()
+            or model._meta.app_label in PRIMARY_ONLY_APPS
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # После записи запрос дочитывает с основной базы.
+        state.wrote = True
+        state.replica_reads = False
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема приходит на реплики репликацией.
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+def pinned_to_primary(request):
+    try:
+        until = float(request.COOKIES[settings.READ_YOUR_WRITES_COOKIE])
+    except (KeyError, ValueError):
+        return False
+    return until > time.time()
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state.wrote = False
+        state.replica_reads = (
+            request.method in SAFE_METHODS and not pinned_to_primary(request)
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = state.wrote
+            state.replica_reads = state.wrote = False
+        if wrote or request.method not in SAFE_METHODS:
+            window = settings.READ_YOUR_WRITES_SECONDS
+            response.set_cookie(
+                settings.READ_YOUR_WRITES_COOKIE,
+                str(int(time.time() + window)),
+                max_age=window,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
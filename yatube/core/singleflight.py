@@ -0,0 +1,102 @@
+"""Защита кэша от лавины пересчётов (cache stampede).
+
+``fetch()`` хранит значение под стабильным ключом вместе с версией,
+мягким сроком годности и временем последнего пересчёта:
+
+* пересчитывает один запрос — тот, кто взял блокировку через
+  ``cache.add``; остальные в это время получают прежнее значение
+  (stale-while-revalidate), даже если версия уже сменилась;
+* незадолго до истечения срока запрос может пересчитать значение
+  заранее с вероятностью, растущей к концу срока и со временем
+  пересчёта (XFetch), так что дорогие значения обновляются до того,
+  как истекут у всех разом;
+* если прежнего значения нет совсем, остальные запросы недолго ждут
+  результата того, кто пересчитывает, и только потом считают сами.
+
+Пересчёт читает основную базу (``core.replicas.primary``): значение
+видят все пользователи, и отставание реплики в нём не сохраняется.
+"""
+import math
+import random
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import replicas, timing
+
+Entry = namedtuple('Entry', ('version', 'value', 'expires', 'delta'))
+Result = namedtuple('Result', ('value', 'fresh'))
+
+LOCK_KEY = '{}:lock'
+POLL_INTERVAL = 0.05
+
+
+def _early(entry, now, beta):
+    """Пора ли обновить ещё свежее значение (XFetch)."""
+    # 1 - random() лежит в (0, 1]: логарифм определён.
+    gap = -entry.delta * beta * math.log(1 - random.random())
+    return now + gap >= entry.expires
+
+
+def _store(key, version, value, delta, timeout):
+    entry = Entry(version, value, time.time() + timeout, delta)
+    cache.set(key, entry, timeout + settings.CACHE_STALE_SECONDS)
+
+
+def _compute(key, version, compute, timeout):
+    started = time.perf_counter()
+    with replicas.primary():
+        value = compute()
+    if value is not None:
+        _store(key, version, value, time.perf_counter() - started, timeout)
+    return value
+
+
+def fetch(key, compute, timeout, version=None):
+    """Значение ``key`` версии ``version``; ``compute()`` его пересчитывает.
+
+    ``compute`` может вернуть None — тогда результат не кэшируется.
+    Возвращает ``Result``: ``fresh`` ложно, если отдано прежнее
+    значение, пока его пересчитывает другой запрос.
+    """
+    entry = cache.get(key)
+    now = time.time()
+    current = entry is not None and entry.version == version
+    if not settings.CACHE_STAMPEDE_PROTECTION:
+        # Обычный кэш: каждый промах пересчитывает сам.
+        hit = current and now < entry.expires
+        timing.cache_lookup(hit)
+        if hit:
+            return Result(entry.value, True)
+        return Result(_compute(key, version, compute, timeout), True)
+    if current and now < entry.expires and not _early(
+        entry, now, settings.CACHE_EARLY_REFRESH_BETA
+    ):
+        timing.cache_lookup(True)
+        return Result(entry.value, True)
+
+    lock = LOCK_KEY.format(key)
+    if cache.add(lock, 1, settings.CACHE_LOCK_TIMEOUT):
+        timing.cache_lookup(False)
+        try:
+            return Result(_compute(key, version, compute, timeout), True)
+        finally:
+            cache.delete(lock)
+    if entry is not None:
+        # Пересчитывает другой запрос: отдаём что есть.
+        timing.cache_lookup(True)
+        return Result(entry.value, current and now < entry.expires)
+
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry.version == version:
+            timing.cache_lookup(True)
+            return Result(entry.value, True)
+        if not cache.has_key(lock):
+            break
+    timing.cache_lookup(False)
+    return Result(_compute(key, version, compute, timeout), True)
@@ -0,0 +1,182 @@
+"""Журнал медленных SQL-запросов с источником.
+
+``SlowQueryMiddleware`` засекает каждый запрос к БД внутри HTTP-запроса.
+Запросы дольше ``SLOW_QUERY_THRESHOLD_MS`` пишутся строкой JSON в лог
+``core.slowlog`` (по умолчанию — файл ``SLOW_QUERY_LOG``):
+представление, строка шаблона, вызвавшая ленивое вычисление, и строка
+кода проекта (``core.testing.attribute``), отпечаток SQL, сам запрос и
+параметры. Источник ищется только для медленных запросов, так что
+остальные обходятся в два вызова ``perf_counter``.
+
+Файл пишут все воркеры gunicorn, поэтому сами они его не ротируют:
+``RotatingFileHandler`` в каждом процессе переименовывал бы файл
+независимо от других. Ротацию делает logrotate (переименованием, без
+``copytruncate``), а ``WatchedFileHandler`` замечает это и открывает
+файл заново.
+
+``manage.py slow_queries`` сводит лог и его копии, в том числе сжатые,
+по отпечаткам и сортирует их по суммарному времени.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import re
+import sys
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core.testing import attribute
+
+logger = logging.getLogger(__name__)
+
+NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\s+'), ' '),
+    # Списки IN и строки VALUES разной длины дают один отпечаток.
+    (re.compile(r'\(\?(?:, \?)*\)'), '(...)'),
+    (re.compile(r'\(\.\.\.\)(?:, \(\.\.\.\))+'), '(...)'),
+)
+
+
+def normalize(sql):
+    """SQL без значений: одинаковые запросы с разными параметрами
+    совпадают."""
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(normalized):
+    return hashlib.md5(normalized.encode()).hexdigest()[:12]
+
+
+class WatchedFileHandler(logging.handlers.WatchedFileHandler):
+    """Создаёт каталог лога при первой записи."""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def _params(params, many):
+    if many:
+        # У executemany — наборы параметров, пишем первый.
+        params = next(iter(params or ()), ())
+    if isinstance(params, dict):
+        return params
+    return list(params or ())
+
+
+class SlowQueryLog:
+    def __init__(self, request, alias):
+        self.request = request
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            if duration >= settings.SLOW_QUERY_THRESHOLD_MS:
+                self.record(sql, params, many, duration, sys._getframe(1))
+
+    def record(self, sql, params, many, duration, frame):
+        template, code = attribute(frame)
+        match = getattr(self.request, 'resolver_match', None)
+        normalized = normalize(sql)
+        logger.info(json.dumps({
+            'time': time.time(),
+            'view': match.view_name if match is not None else None,
+            'path': self.request.path,
+            'alias': self.alias,
+            'duration_ms': round(duration, 3),
+            'fingerprint': fingerprint(normalized),
+            'normalized': normalized,
+            'sql': sql,
+            'params': _params(params, many),
+            'template': template,
+            'code': code,
+        }, ensure_ascii=False, default=str))
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(
+                    SlowQueryLog(request, connection.alias)
+                ))
+            return self.get_response(request)
+
+
+def log_files(path):
+    """Лог и его ротированные копии (``.N`` и ``.N.gz``), от старых к
+    новым."""
+    directory, name = os.path.split(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        return []
+    pattern = re.compile(re.escape(name) + r'(?:\.(\d+))?(?:\.gz)?')
+    found = []
+    for candidate in os.listdir(directory):
+        match = pattern.fullmatch(candidate)
+        if match:
+            found.append((int(match.group(1) or 0), candidate))
+    return [
+        os.path.join(directory, candidate)
+        for _, candidate in sorted(found, reverse=True)
+    ]
+
+
+def read(path):
+    for filename in log_files(path):
+        opener = gzip.open if filename.endswith('.gz') else open
+        with opener(filename, 'rt', encoding='utf-8') as source:
+            for line in source:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Строка, оборванная при ротации.
+                    continue
+
+
+def aggregate(records, view=None):
+    """Отпечатки с числом, суммарным и наибольшим временем, по убыванию
+    суммарного времени."""
+    groups = {}
+    for record in records:
+        if view is not None and record.get('view') != view:
+            continue
+        group = groups.setdefault(record['fingerprint'], {
+            'fingerprint': record['fingerprint'],
+            'normalized': record['normalized'],
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'views': {},
+            'sources': {},
+        })
+        duration = record['duration_ms']
+        group['count'] += 1
+        group['total_ms'] += duration
+        group['max_ms'] = max(group['max_ms'], duration)
+        name = record.get('view') or '-'
+        group['views'][name] = group['views'].get(name, 0) + 1
+        source = ', '.join(
+            filter(None, (record.get('template'), record.get('code')))
+        ) or '?'
+        group['sources'][source] = group['sources'].get(source, 0) + 1
+    return sorted(
+        groups.values(), key=lambda group: group['total_ms'], reverse=True
+    )
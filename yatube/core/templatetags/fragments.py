@@ -0,0 +1,53 @@
+"""``{% cachefragment %}`` — ``{% cache %}`` с защитой от лавины пересчётов.
+
+    {% cachefragment timeout name version [vary_on ...] %}
+        ...
+    {% endcachefragment %}
+
+Версия не входит в ключ, а хранится рядом со значением: после её смены
+фрагмент пересчитывает один запрос, остальные пока получают прежний.
+"""
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core import singleflight
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, timeout, name, version, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.version = version
+        self.vary_on = vary_on
+
+    def render(self, context):
+        key = make_template_fragment_key(
+            self.name, [var.resolve(context) for var in self.vary_on]
+        )
+        return singleflight.fetch(
+            key,
+            lambda: self.nodelist.render(context),
+            int(self.timeout.resolve(context)),
+            version=self.version.resolve(context),
+        ).value
+
+
+@register.tag
+def cachefragment(parser, token):
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 4:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]!r} требует timeout, имя фрагмента и версию.'
+        )
+    return FragmentNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        parser.compile_filter(bits[3]),
+        [parser.compile_filter(bit) for bit in bits[4:]],
+    )
@@ -0,0 +1,11 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.holes import placeholder
+
+register = template.Library()
+
+
+@register.simple_tag
+def hole(template_name, **args):
+    return mark_safe(placeholder(template_name, args))
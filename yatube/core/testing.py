@@ -0,0 +1,149 @@
+"""Бюджеты запросов к БД для тестов представлений.
+
+Запросы, выполненные при рендеринге страницы, записываются вместе с
+местом, откуда они пришли: строкой шаблона и строкой кода проекта.
+Если страница превысила заявленное число запросов или суммарное
+время в БД, тест падает со списком запросов и их источников — так
+N+1 в шаблоне виден сразу, без ручного поиска.
+
+Модуль не зависит от тестового раннера и подходит как для
+``django.test.TestCase``, так и для pytest.
+"""
+import os
+import sys
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.urls import URLPattern, URLResolver, get_resolver
+
+Budget = namedtuple('Budget', ('queries', 'time_ms'), defaults=(100,))
+
+RecordedQuery = namedtuple(
+    'RecordedQuery', ('sql', 'duration', 'template', 'code')
+)
+
+# Модули с обёртками execute_wrapper: их кадры стоят между запросом и
+# кодом, который его выполнил.
+WRAPPER_MODULES = {'core.testing', 'core.timing', 'core.slowlog'}
+
+
+def _is_project_file(filename):
+    if filename.startswith('<'):
+        # <frozen ...>, <string>: abspath приклеил бы их к текущему
+        # каталогу.
+        return False
+    filename = os.path.abspath(filename)
+    return (
+        filename.startswith(str(settings.BASE_DIR))
+        and 'site-packages' not in filename
+    )
+
+
+def attribute(frame):
+    """Строка шаблона и строка кода проекта, откуда пришёл запрос."""
+    template = code = None
+    while frame is not None and not (template and code):
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                name = getattr(origin, 'template_name', None) or origin.name
+                template = f'{name}:{token.lineno}'
+        if (
+            code is None
+            and frame.f_globals.get('__name__') not in WRAPPER_MODULES
+            and _is_project_file(frame.f_code.co_filename)
+        ):
+            path = os.path.relpath(
+                frame.f_code.co_filename, str(settings.BASE_DIR)
+            )
+            code = f'{path}:{frame.f_lineno}'
+        frame = frame.f_back
+    return template, code
+
+
+class QueryLog:
+    """Запросы, выполненные внутри ``record_queries()``."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __len__(self):
+        return len(self.queries)
+
+    def __iter__(self):
+        return iter(self.queries)
+
+    @property
+    def total_ms(self):
+        return sum(query.duration for query in self.queries) * 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        template, code = attribute(sys._getframe(1))
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(RecordedQuery(
+                sql, time.perf_counter() - started, template, code
+            ))
+
+    def report(self):
+        lines = []
+        for number, query in enumerate(self.queries, 1):
+            source = ', '.join(filter(None, (query.template, query.code)))
+            lines.append(
+                f'{number}. {query.duration * 1000:.2f} мс'
+                f' [{source or "?"}]\n   {query.sql}'
+            )
+        return '\n'.join(lines)
+
+
+@contextmanager
+def record_queries(using='default'):
+    log = QueryLog()
+    with connections[using].execute_wrapper(log):
+        yield log
+
+
+def check_budget(log, budget, label):
+    """Текст ошибки, если ``log`` не уложился в ``budget``, иначе None."""
+    problems = []
+    if len(log) > budget.queries:
+        problems.append(
+            f'{len(log)} запросов при бюджете {budget.queries}'
+        )
+    if log.total_ms > budget.time_ms:
+        problems.append(
+            f'{log.total_ms:.1f} мс в БД при бюджете {budget.time_ms} мс'
+        )
+    if not problems:
+        return None
+    return f'{label}: {"; ".join(problems)}\n{log.report()}'
+
+
+def assert_budget(log, budget, label):
+    error = check_budget(log, budget, label)
+    if error:
+        raise AssertionError(error)
+
+
+def url_names(*namespaces):
+    """Полные имена всех маршрутов из заданных пространств имён."""
+    names = set()
+    for namespace in namespaces:
+        _, resolver = get_resolver().namespace_dict[namespace]
+        names.update(_collect(resolver.url_patterns, namespace))
+    return names
+
+
+def _collect(patterns, namespace):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _collect(pattern.url_patterns, namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f'{namespace}:{pattern.name}'
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+from multiprocessing import get_context
+
+from django.test import SimpleTestCase
+
+from core.cache import SQLiteCache
+
+
+def increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_basic_operations(self):
+        """get/set/add/delete/get_many работают как у штатных кэшей."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 'value'))
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'missing']), {'a': 1, 'b': 2}
+        )
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.incr('b', 5), 7)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expired_entries_are_missing(self):
+        """Просроченная запись не возвращается и её можно add."""
+        self.cache.set('key', 'value', timeout=-1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertFalse(self.cache.has_key('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+
+    def test_lru_eviction_by_bytes(self):
+        """При превышении MAX_BYTES вытесняются давно не читавшиеся."""
+        cache = SQLiteCache(
+            os.path.join(self.directory, 'small.sqlite3'),
+            {'OPTIONS': {'MAX_BYTES': 4096}},
+        )
+        cache.set('hot', 'x' * 1000)
+        for number in range(10):
+            cache.get('hot')
+            cache._connection().execute(
+                'UPDATE cache_entry SET accessed = accessed + 10'
+                ' WHERE key LIKE ?', ('%hot',)
+            )
+            cache.set(f'cold{number}', 'x' * 1000)
+        self.assertIsNotNone(cache.get('hot'))
+        self.assertIsNone(cache.get('cold0'))
+        total = cache._connection().execute(
+            'SELECT total_bytes FROM cache_meta'
+        ).fetchone()[0]
+        self.assertLessEqual(total, 4096)
+
+    def test_incr_is_atomic_across_processes(self):
+        """incr из нескольких процессов не теряет обновлений."""
+        self.cache.set('counter', 0)
+        context = get_context('spawn')
+        workers = [
+            context.Process(target=increment, args=(self.location, 50))
+            for _ in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 150)
@@ -0,0 +1,135 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group as AuthGroup
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+
+from core.datadump import read_records, select_models
+from posts import cache as fragments
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class ReadRecordsTests(TestCase):
+    def test_formats(self):
+        """JSON Lines и JSON-массив разбираются одинаково."""
+        records = [{'model': 'a.b', 'pk': i, 'fields': {}} for i in range(3)]
+        lines = '\n'.join(
+            '{"model": "a.b", "pk": %d, "fields": {}}' % i for i in range(3)
+        )
+        array = '[\n  ' + lines.replace('\n', ',\n  ') + '\n]'
+        self.assertEqual(list(read_records(io.StringIO(lines))), records)
+        self.assertEqual(list(read_records(io.StringIO(array))), records)
+
+    def test_dependency_order(self):
+        """Модели идут после моделей, на которые ссылаются."""
+        order = select_models(['posts', 'auth'])
+        for model in (Post, Comment, Follow):
+            self.assertLess(order.index(User), order.index(model))
+        self.assertLess(order.index(Group), order.index(Post))
+        self.assertLess(order.index(Post), order.index(Comment))
+
+
+class DataDumpCommandTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def snapshot(self):
+        return {
+            'users': list(User.objects.order_by('pk').values_list(
+                'pk', 'username', 'password', 'date_joined'
+            )),
+            'user_groups': list(User.groups.through.objects.order_by('pk')
+                                .values_list('user_id', 'group_id')),
+            'posts': list(Post.objects.order_by('pk').values_list(
+                'pk', 'text', 'author_id', 'group_id', 'pub_date'
+            )),
+            'comments': list(Comment.objects.order_by('pk').values_list(
+                'pk', 'post_id', 'author_id', 'text', 'created'
+            )),
+            'follows': list(Follow.objects.order_by('pk').values_list(
+                'user_id', 'author_id'
+            )),
+        }
+
+    def test_round_trip(self):
+        """Выгрузка в .gz и загрузка возвращают те же данные."""
+        staff = AuthGroup.objects.create(name='staff')
+        author = User.objects.create_user('author', password='secret')
+        reader = User.objects.create_user('reader')
+        reader.groups.add(staff)
+        group = Group.objects.create(title='Группа', slug='group')
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=author, group=group)
+            for i in range(5)
+        ]
+        Comment.objects.create(post=posts[0], author=reader, text='Ответ')
+        Follow.objects.create(user=reader, author=author)
+        before = self.snapshot()
+
+        path = os.path.join(self.directory, 'dump.ndjson.gz')
+        call_command(
+            'export_ndjson', 'auth.user', 'auth.group', 'posts',
+            output=path, batch_size=2, stdout=io.StringIO(),
+        )
+        call_command('flush', interactive=False, verbosity=0)
+        self.assertFalse(Post.objects.exists())
+        call_command(
+            'import_ndjson', path, batch_size=2, stdout=io.StringIO()
+        )
+        self.assertEqual(self.snapshot(), before)
+        # Счётчики id сдвинуты за загруженные ключи.
+        self.assertGreater(
+            Post.objects.create(text='Новый', author=author).pk, posts[-1].pk
+        )
+
+    def test_import_legacy_dump(self):
+        """Читается старый dump.json в формате dumpdata."""
+        call_command(
+            'import_ndjson', os.path.join(settings.BASE_DIR, 'dump.json'),
+            exclude=['contenttypes', 'auth.permission', 'admin.logentry'],
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 64)
+        self.assertEqual(User.objects.count(), 4)
+        self.assertEqual(Comment.objects.count(), 6)
+        self.assertEqual(Follow.objects.count(), 3)
+        self.assertEqual(Group.objects.count(), 2)
+
+    def test_import_rebuilds_derived_data(self):
+        """После загрузки в обход сигналов ленты, счётчики и версии
+        фрагментов соответствуют данным."""
+        cache.clear()
+        scopes = ('posts', 'author:1', 'follow:1', 'group:1')
+        before = [fragments.versions(scope) for scope in scopes]
+        call_command(
+            'import_ndjson', os.path.join(settings.BASE_DIR, 'dump.json'),
+            exclude=['contenttypes', 'auth.permission', 'admin.logentry'],
+            stdout=io.StringIO(),
+        )
+        for scope, version in zip(scopes, before):
+            self.assertNotEqual(fragments.versions(scope), version)
+        for follow in Follow.objects.all():
+            self.assertEqual(
+                TimelineEntry.objects.filter(
+                    user=follow.user, post__author=follow.author
+                ).count(),
+                min(follow.author.posts.count(), settings.TIMELINE_SIZE),
+            )
+        for user in User.objects.select_related('stats'):
+            self.assertEqual(
+                user.stats.posts_count, user.posts.count()
+            )
+            self.assertEqual(
+                user.stats.followers_count, user.following.count()
+            )
@@ -0,0 +1,183 @@
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core import degraded
+from core.views import server_error
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+def postgres_error(pgcode):
+    """OperationalError, как его оборачивает Django из psycopg2."""
+    cause = Exception()
+    cause.pgcode = pgcode
+    error = OperationalError()
+    error.__cause__ = cause
+    return error
+
+
+@override_settings(
+    DB_BREAKER_THRESHOLD=2, DB_BREAKER_WINDOW=60, DB_BREAKER_COOLDOWN=60
+)
+class DegradedModeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост на главной', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        degraded.breaker.reset()
+        self.addCleanup(degraded.breaker.reset)
+        self.queries = 0
+
+    @contextmanager
+    def database_down(self):
+        """Каждый запрос к базе падает, как при упавшем сервере."""
+        def fail(execute, sql, params, many, context):
+            self.queries += 1
+            raise OperationalError('could not connect to server')
+
+        with connection.execute_wrapper(fail):
+            yield
+
+    @contextmanager
+    def statement_fails(self, message):
+        """Падает запрос представления, а сама база отвечает."""
+        def fail(execute, sql, params, many, context):
+            if sql != 'SELECT 1':
+                raise OperationalError(message)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(fail):
+            yield
+
+    def test_stale_page_served(self):
+        """Без базы GET получает прежнюю копию страницы с пометкой."""
+        url = reverse('posts:index')
+        fresh = self.client.get(url)
+        # Новая версия лент: страницу надо рендерить заново.
+        Post.objects.create(author=self.user, text='Новый пост')
+        with self.database_down():
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, fresh.content)
+        self.assertEqual(response['Warning'], '110 - "Response is Stale"')
+        self.assertIn('Age', response)
+
+    def test_page_without_copy_unavailable(self):
+        """Страница без сохранённой копии сразу получает 503."""
+        with self.database_down():
+            response = self.client.get(
+                reverse('posts:group_list', args=[self.group.slug])
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertTemplateUsed(response, 'core/503.html')
+
+    def test_write_unavailable(self):
+        """Запись без базы получает 503, комментарий не создаётся."""
+        self.client.force_login(self.user)
+        url = reverse('posts:add_comment', args=[self.post.pk])
+        with self.database_down():
+            response = self.client.post(url, {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_breaker_stops_database_calls(self):
+        """Разомкнутый автомат не пускает запросы к базе."""
+        url = reverse('posts:group_list', args=[self.group.slug])
+        with self.database_down():
+            for _ in range(2):
+                self.client.get(url)
+            self.assertTrue(degraded.breaker.open)
+            calls = self.queries
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.queries, calls)
+
+    def test_breaker_probes_after_cooldown(self):
+        """После паузы автомат проверяет базу и замыкается, если она
+        отвечает."""
+        url = reverse('posts:group_list', args=[self.group.slug])
+        with self.database_down():
+            for _ in range(2):
+                self.client.get(url)
+            with override_settings(DB_BREAKER_COOLDOWN=0):
+                calls = self.queries
+                self.assertEqual(self.client.get(url).status_code, 503)
+                # Проверка одна — запрос SELECT 1, представление не
+                # вызывалось.
+                self.assertEqual(self.queries, calls + 1)
+                self.assertTrue(degraded.breaker.open)
+        with override_settings(DB_BREAKER_COOLDOWN=0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(degraded.breaker.open)
+
+    def test_other_errors_not_counted(self):
+        """server_error отвечает 503 только на потерю соединения с базой,
+        прочие ошибки не размыкают автомат."""
+        request = RequestFactory().get('/')
+        for _ in range(2):
+            try:
+                raise ValueError
+            except ValueError:
+                response = server_error(request)
+            self.assertNotEqual(response.status_code, 503)
+        self.assertFalse(degraded.breaker.open)
+        with self.database_down():
+            try:
+                raise OperationalError
+            except OperationalError:
+                response = server_error(request)
+        self.assertEqual(response.status_code, 503)
+
+    def test_statement_errors_not_counted(self):
+        """Занятая база, таймаут запроса и взаимоблокировка не размыкают
+        автомат и не прячутся за 503: соединение живо."""
+        url = reverse('posts:group_list', args=[self.group.slug])
+        with self.statement_fails('database is locked'):
+            for _ in range(3):
+                with self.assertRaises(OperationalError):
+                    self.client.get(url)
+        self.assertFalse(degraded.breaker.open)
+        for code in ('57014', '40P01'):
+            self.assertFalse(degraded.connection_lost(postgres_error(code)))
+        self.assertTrue(degraded.connection_lost(postgres_error('08006')))
+
+    def test_query_bugs_raised(self):
+        """Ошибка в самом запросе доходит до страницы 500, а не
+        подменяется прежней копией страницы."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.create(author=self.user, text='Новый пост')
+        with self.statement_fails('no such column: posts_post.missing'):
+            with self.assertRaisesMessage(OperationalError, 'no such column'):
+                self.client.get(url)
+        request = RequestFactory().get(url)
+        with self.statement_fails('no such column: posts_post.missing'):
+            try:
+                raise OperationalError('no such column: posts_post.missing')
+            except OperationalError:
+                response = server_error(request)
+        self.assertNotEqual(response.status_code, 503)
+
+    def test_open_breaker_serves_stale(self):
+        """Пока автомат разомкнут, любая ошибка базы отдаёт 503."""
+        for _ in range(2):
+            degraded.breaker.failure()
+        request = RequestFactory().get('/')
+        response = degraded.handle(request, OperationalError('locked'))
+        self.assertEqual(response.status_code, 503)
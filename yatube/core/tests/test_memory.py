@@ -0,0 +1,189 @@
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import tracemalloc
+from io import StringIO
+from unittest import mock
+
+import django.template.base
+import PIL.Image
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+import posts.views
+from core import memory
+
+User = get_user_model()
+
+
+def fill_cache(count=200):
+    cache = caches['default']
+    for number in range(count):
+        cache.set(f'memory-test-{number}', 'x' * 10_000)
+
+
+class TracingMixin:
+    def setUp(self):
+        super().setUp()
+        if not tracemalloc.is_tracing():
+            memory.start(5)
+            self.addCleanup(tracemalloc.stop)
+        self.addCleanup(caches['default'].clear)
+        self.addCleanup(memory.state.update, pid=None)
+
+
+class GroupingTests(TracingMixin, SimpleTestCase):
+    def test_module_groups(self):
+        """Файлы сводятся к модулям и группам отчёта."""
+        for module, expected in (
+            (posts.views, 'posts'),
+            (django.template.base, 'django.template'),
+            (PIL.Image, 'PIL'),
+        ):
+            name = memory.module_name(module.__file__)
+            self.assertEqual(name, module.__name__)
+            self.assertEqual(memory.group(name), expected)
+        self.assertIsNone(memory.group('postsx'))
+
+    def test_cache_growth(self):
+        """Записи LocMemCache попадают в группу django.core.cache."""
+        old = memory.take()
+        fill_cache()
+        groups = memory.compare(old, memory.take())
+        entry = next(
+            entry for entry in groups if entry['group'] == 'django.core.cache'
+        )
+        self.assertGreater(entry['size_diff'], 200 * 10_000)
+        self.assertTrue(entry['sites'][0][0].startswith(
+            'django.core.cache.backends.locmem:'
+        ))
+        lines = memory.report(groups, limit=0)
+        self.assertEqual(
+            [line.split()[0] for line in lines if not line.startswith(' ')],
+            list(memory.GROUPS),
+        )
+
+
+class MemoryViewTests(TracingMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_staff_only(self):
+        """Отчёт доступен только сотрудникам."""
+        url = reverse('memory')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_actions_require_post_with_csrf(self):
+        """GET только показывает отчёт, действия — POST с CSRF-токеном."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.staff)
+        url = reverse('memory')
+        tracemalloc.stop()
+        self.addCleanup(tracemalloc.stop)
+        response = client.get(url + '?start')
+        self.assertIn('Трассировка выключена', response.content.decode())
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(
+            client.post(url, {'action': 'start'}).status_code, 403
+        )
+        self.assertFalse(tracemalloc.is_tracing())
+        token = response.cookies['csrftoken'].value
+        response = client.post(
+            url, {'action': 'start'}, HTTP_X_CSRFTOKEN=token
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(tracemalloc.is_tracing())
+        response = client.post(
+            url, {'action': 'drop'}, HTTP_X_CSRFTOKEN=token
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_growth_between_snapshots(self):
+        """Отчёт показывает рост с прошлого запроса, снимки сравнивает
+        команда memory_growth."""
+        self.client.force_login(self.staff)
+        url = reverse('memory')
+        with override_settings(MEMORY_DIR=self.directory):
+            self.client.post(url, {'action': 'start'})
+            first = self.client.post(url, {'action': 'save'})
+            first = first.content.decode()
+            fill_cache()
+            second = self.client.post(url, {'action': 'save'})
+            second = second.content.decode()
+        self.assertIn(f'pid {os.getpid()}', first)
+        since_previous = second.split('С прошлого запроса')[1]
+        cache_line = next(
+            line for line in since_previous.splitlines()
+            if line.startswith('django.core.cache')
+        )
+        self.assertIn('МиБ', cache_line)
+        snapshots = sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+        )
+        self.assertEqual(len(snapshots), 2)
+        output = StringIO()
+        call_command(
+            'memory_growth', *snapshots, '--limit', '0', stdout=output
+        )
+        self.assertIn('django.core.cache', output.getvalue())
+
+    def test_replay_needs_rounds(self):
+        """Прогон без кругов — ошибка команды, а не деление на ноль."""
+        with self.assertRaisesMessage(CommandError, '--rounds'):
+            call_command('memory_growth', '--rounds', '0', stdout=StringIO())
+
+
+class RecycleTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(memory.state.update, pid=None)
+
+    def test_disabled_by_default(self):
+        """Без MEMORY_RECYCLE_MB middleware не подключается."""
+        with override_settings(MEMORY_RECYCLE_MB=None):
+            with self.assertRaises(MiddlewareNotUsed):
+                memory.MemoryRecycleMiddleware(HttpResponse)
+
+    @override_settings(MEMORY_RECYCLE_MB=100)
+    def test_recycle_after_growth(self):
+        """Воркер перезапускается один раз, когда RSS вырос больше
+        порога с первого запроса."""
+        middleware = memory.MemoryRecycleMiddleware(
+            lambda request: HttpResponse()
+        )
+        sizes = [500, 550, 601, 700]
+        with mock.patch.object(
+            memory, 'rss', side_effect=[size * 2 ** 20 for size in sizes]
+        ), mock.patch.object(memory, 'recycle') as recycle:
+            with self.assertLogs('core.memory', 'WARNING') as logs:
+                for _ in sizes:
+                    middleware(None)
+        recycle.assert_called_once_with()
+        self.assertIn('500.0 МиБ до 601.0 МиБ', logs.output[0])
+
+    def test_recycle_signal(self):
+        """Воркеру gunicorn посылается SIGTERM, вне gunicorn процесс не
+        завершается."""
+        with mock.patch.dict(sys.modules), mock.patch('os.kill') as kill:
+            sys.modules.pop('gunicorn', None)
+            self.assertFalse(memory.recycle())
+            kill.assert_not_called()
+            sys.modules['gunicorn'] = mock.Mock()
+            self.assertTrue(memory.recycle())
+            kill.assert_called_once_with(os.getpid(), signal.SIGTERM)
@@ -0,0 +1,180 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+from multiprocessing import get_context
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+
+User = get_user_model()
+
+
+def sample(text, name, **labels):
+    """Значение строки ``name{labels}`` из текста /metrics или 0."""
+    rendered = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    if rendered:
+        name = f'{name}{{{rendered}}}'
+    match = re.search(rf'^{re.escape(name)} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else 0
+
+
+def record(times, view='test:worker'):
+    """Воркер gunicorn после fork: пишет метрики и сбрасывает их."""
+    for _ in range(times):
+        metrics.RESPONSES.inc(view=view, status=200)
+        metrics.REQUEST_DURATION.observe(0.02, view=view)
+    metrics.flush()
+
+
+class MetricsEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    @override_settings(METRICS_TOKEN='secret')
+    def scrape(self):
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_request_metrics_by_view(self):
+        """Запросы учитываются по имени представления."""
+        before = self.scrape()
+        url = reverse('posts:profile', args=[self.user.username])
+        for _ in range(3):
+            self.client.get(url)
+        after = self.scrape()
+        for name in (
+            'yatube_request_duration_seconds_count',
+            'yatube_request_db_queries_count',
+            'yatube_response_size_bytes_count',
+        ):
+            self.assertEqual(
+                sample(after, name, view='posts:profile')
+                - sample(before, name, view='posts:profile'),
+                3,
+                name,
+            )
+        self.assertEqual(
+            sample(after, 'yatube_responses_total',
+                   view='posts:profile', status=200)
+            - sample(before, 'yatube_responses_total',
+                     view='posts:profile', status=200),
+            3,
+        )
+        self.assertGreater(
+            sample(after, 'yatube_cache_lookups_total', result='miss'), 0
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        """С METRICS_TOKEN метрики отдаются только с токеном."""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_closed_without_token(self):
+        """Без METRICS_TOKEN метрики видят только сотрудники."""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class MultiprocessTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_processes_aggregated(self):
+        """/metrics суммирует значения всех процессов."""
+        with override_settings(METRICS_DIR=self.directory):
+            context = get_context('fork')
+            workers = [
+                context.Process(target=record, args=(times,))
+                for times in (2, 3)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            metrics.RESPONSES.inc(view='test:worker', status=200)
+            text = metrics.exposition()
+        # Два воркера и значение из памяти этого процесса.
+        self.assertEqual(
+            sample(text, 'yatube_responses_total',
+                   view='test:worker', status=200),
+            6,
+        )
+        bucket = sample(
+            text, 'yatube_request_duration_seconds_bucket',
+            view='test:worker', le='0.025',
+        )
+        self.assertEqual(bucket, 5)
+        self.assertEqual(
+            sample(text, 'yatube_request_duration_seconds_bucket',
+                   view='test:worker', le='0.01'),
+            0,
+        )
+        self.assertEqual(
+            sample(text, 'yatube_request_duration_seconds_count',
+                   view='test:worker'),
+            5,
+        )
+
+    def run_worker(self, times, view):
+        worker = get_context('fork').Process(target=record, args=(times, view))
+        worker.start()
+        worker.join()
+
+    def responses(self, view):
+        return sample(
+            metrics.exposition(), 'yatube_responses_total',
+            view=view, status=200,
+        )
+
+    def test_dead_workers_folded(self):
+        """Файлы завершившихся воркеров складываются в dead.json, а
+        значения не убывают."""
+        view = 'test:recycled'
+        with override_settings(METRICS_DIR=self.directory):
+            self.run_worker(2, view)
+            self.assertEqual(self.responses(view), 2)
+            self.assertEqual(
+                sorted(os.listdir(self.directory)),
+                [metrics.LOCK_FILE, metrics.DEAD_FILE],
+            )
+            # Процесс с тем же pid, что у живого, пишет в свой файл.
+            with open(os.path.join(
+                self.directory, f'{os.getpid()}-reused.json'
+            ), 'w') as output:
+                json.dump([['yatube_responses_total', [view, '200'], [4]]],
+                          output)
+            self.run_worker(3, view)
+            self.assertEqual(self.responses(view), 9)
+            # Свёртка прервалась до удаления файла: он не считается.
+            dead = os.path.join(self.directory, metrics.DEAD_FILE)
+            with open(dead) as source:
+                folded = json.load(source)['files']
+            with open(
+                os.path.join(self.directory, folded[0]), 'w'
+            ) as output:
+                json.dump(
+                    [['yatube_responses_total', [view, '200'], [100]]],
+                    output,
+                )
+            self.assertEqual(self.responses(view), 9)
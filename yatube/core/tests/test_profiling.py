@@ -0,0 +1,129 @@
+import json
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import profiling
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.author, text='Пост')
+        Follow.objects.create(user=cls.staff, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings = override_settings(
+            PROFILE_DIR=self.directory, PROFILE_SAMPLE_INTERVAL=0.0005
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def files(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_staff_query_flag(self):
+        """Сотрудник с ?profile получает профиль, стеки и журнал
+        запросов."""
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse('posts:follow_index') + '?profile'
+        )
+        self.assertEqual(response.status_code, 200)
+        name = response['X-Profile-Id']
+        self.assertIn('posts-follow_index', name)
+        self.assertEqual(
+            self.files(),
+            [f'{name}.collapsed', f'{name}.json', f'{name}.pstats'],
+        )
+        base = os.path.join(self.directory, name)
+        stats = pstats.Stats(f'{base}.pstats', stream=StringIO())
+        self.assertTrue(any(
+            function == 'follow_index' for _, _, function in stats.stats
+        ))
+        with open(f'{base}.collapsed') as source:
+            for line in source:
+                stack, count = line.rsplit(' ', 1)
+                self.assertGreater(int(count), 0)
+        with open(f'{base}.json') as source:
+            meta = json.load(source)
+        self.assertEqual(meta['view'], 'posts:follow_index')
+        self.assertEqual(meta['user'], 'staff')
+        self.assertTrue(meta['queries'])
+        self.assertTrue(any(
+            query['code'] and query['code'].startswith('posts')
+            for query in meta['queries']
+        ))
+
+    def test_signed_header(self):
+        """Заголовок с токеном из profile_token включает профилирование
+        только для сотрудника, на которого выписан токен."""
+        output = StringIO()
+        call_command(
+            'profile_token', 'staff', stdout=output, stderr=StringIO()
+        )
+        token = output.getvalue().strip()
+        url = reverse('posts:index')
+        self.client.force_login(self.staff)
+        response = self.client.get(url, HTTP_X_PROFILE=token)
+        self.assertIn('X-Profile-Id', response)
+        response = self.client.get(url, HTTP_X_PROFILE=token + 'x')
+        self.assertNotIn('X-Profile-Id', response)
+        other = User.objects.create_user(username='other', is_staff=True)
+        self.client.force_login(other)
+        response = self.client.get(url, HTTP_X_PROFILE=token)
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_not_allowed(self):
+        """Аноним, обычный пользователь и представления вне posts.views
+        не профилируются."""
+        url = reverse('posts:index') + '?profile'
+        self.assertNotIn('X-Profile-Id', self.client.get(url))
+        self.client.force_login(self.user)
+        self.assertNotIn('X-Profile-Id', self.client.get(url))
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('about:tech') + '?profile')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.files(), [])
+
+    def test_token_command_requires_staff(self):
+        """Токен выписывается только сотрудникам."""
+        with self.assertRaises(CommandError):
+            call_command('profile_token', 'user', stdout=StringIO())
+        self.assertTrue(
+            profiling._token_valid(profiling.make_token(self.staff),
+                                   self.staff)
+        )
+
+
+class SwitchIntervalTests(TestCase):
+    def test_restored_after_last_request(self):
+        """Одновременные запросы не возвращают чужой интервал: исходный
+        восстанавливается после последнего."""
+        original = sys.getswitchinterval()
+        first = profiling.fast_switching(0.0005)
+        second = profiling.fast_switching(0.0005)
+        first.__enter__()
+        second.__enter__()
+        first.__exit__(None, None, None)
+        self.assertEqual(sys.getswitchinterval(), 0.0005)
+        second.__exit__(None, None, None)
+        self.assertEqual(sys.getswitchinterval(), original)
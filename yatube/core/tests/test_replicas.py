@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+REPLICA = 'replica'
+
+
+@override_settings(REPLICA_DATABASES=[REPLICA], READ_YOUR_WRITES_SECONDS=60)
+class ReplicaRoutingTests(TestCase):
+    """Основная база и реплика — два разных файла SQLite.
+
+    Реплика получает схему, пользователя и пост, но не комментарий:
+    так выглядит реплика, отставшая от основной базы.
+    """
+
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        connections.ensure_defaults(REPLICA)
+        with connections[REPLICA].schema_editor() as editor:
+            for model in apps.get_models():
+                if model._meta.managed and not model._meta.proxy:
+                    editor.create_model(model)
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Пост на основной базе',
+                                       author=cls.user)
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий на основной базе'
+        )
+        User.objects.using(REPLICA).create(
+            pk=cls.user.pk, username='auth', password=cls.user.password
+        )
+        Post.objects.using(REPLICA).bulk_create([Post(
+            pk=cls.post.pk, text='Пост на реплике', author_id=cls.user.pk,
+            pub_date=cls.post.pub_date,
+        )])
+        cls.comments_url = reverse(
+            'posts:post_comments', kwargs={'post_id': cls.post.pk}
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections.databases[REPLICA]
+        delattr(connections._connections, REPLICA)
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_get_reads_replica(self):
+        """Некэшируемые страницы читаются с реплики."""
+        response = self.client.get(self.comments_url)
+        self.assertNotContains(response, self.comment.text)
+        self.assertNotIn(settings.READ_YOUR_WRITES_COOKIE, response.cookies)
+
+    def test_cached_pages_render_on_primary(self):
+        """Страница и фрагмент, попадающие в общий кэш, читают основную
+        базу: отставшая реплика не сохраняется в кэш для всех."""
+        for client in (self.client, Client()):
+            with self.subTest(anonymous=client is not self.client):
+                cache.clear()
+                response = client.get(reverse('posts:index'))
+                self.assertContains(response, self.post.text)
+                response = client.get(reverse(
+                    'posts:post_detail', kwargs={'post_id': self.post.pk}
+                ))
+                self.assertContains(response, self.comment.text)
+
+    def test_reads_outside_requests_use_primary(self):
+        """Вне запросов чтение идёт с основной базы."""
+        self.assertTrue(Post.objects.filter(pk=self.post.pk).exists())
+
+    def test_reads_stick_to_primary_after_write(self):
+        """После записи пользователь видит свои данные."""
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Свежий комментарий'},
+        )
+        self.assertIn(settings.READ_YOUR_WRITES_COOKIE, response.cookies)
+        response = self.client.get(self.comments_url)
+        self.assertContains(response, 'Свежий комментарий')
+
+        other = Client()
+        other.force_login(self.user)
+        response = other.get(self.comments_url)
+        self.assertNotContains(response, 'Свежий комментарий')
+
+    def test_expired_pin_reads_replica(self):
+        """Просроченная cookie снова отправляет чтение на реплику."""
+        self.client.cookies[settings.READ_YOUR_WRITES_COOKIE] = '0'
+        response = self.client.get(self.comments_url)
+        self.assertNotContains(response, self.comment.text)
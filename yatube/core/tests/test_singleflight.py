@@ -0,0 +1,126 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from core import singleflight
+
+KEY = 'singleflight:test'
+
+
+@override_settings(
+    CACHE_STAMPEDE_PROTECTION=True,
+    CACHE_LOCK_TIMEOUT=5,
+    CACHE_STALE_SECONDS=60,
+    CACHE_EARLY_REFRESH_BETA=0,
+)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def concurrently(self, version, workers=8):
+        """Запускает ``fetch`` из нескольких потоков одновременно."""
+        calls = []
+        results = []
+        barrier = threading.Barrier(workers)
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return f'value-{version}'
+
+        def worker():
+            barrier.wait()
+            results.append(
+                singleflight.fetch(KEY, compute, 60, version=version)
+            )
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return calls, results
+
+    def test_cold_key_computed_once(self):
+        """Без прежнего значения пересчитывает один, остальные ждут."""
+        calls, results = self.concurrently(1)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual({result.value for result in results}, {'value-1'})
+
+    def test_stale_value_served_while_recomputing(self):
+        """После смены версии остальные получают прежнее значение."""
+        singleflight.fetch(KEY, lambda: 'value-1', 60, version=1)
+        calls, results = self.concurrently(2)
+        self.assertEqual(len(calls), 1)
+        values = sorted(result.value for result in results)
+        self.assertEqual(values, ['value-1'] * 7 + ['value-2'])
+        self.assertFalse(
+            any(result.fresh for result in results
+                if result.value == 'value-1')
+        )
+        self.assertEqual(
+            singleflight.fetch(KEY, lambda: 'other', 60, version=2),
+            singleflight.Result('value-2', True),
+        )
+
+    def test_expired_value_recomputed(self):
+        """Истёкший мягкий срок приводит к пересчёту."""
+        singleflight.fetch(KEY, lambda: 'old', 60)
+        with mock.patch('time.time', return_value=time.time() + 61):
+            result = singleflight.fetch(KEY, lambda: 'new', 60)
+        self.assertEqual(result, singleflight.Result('new', True))
+
+    def test_early_refresh(self):
+        """С большим beta значение обновляется до истечения срока."""
+        singleflight.fetch(KEY, lambda: 'old', 60)
+        self.assertEqual(
+            singleflight.fetch(KEY, lambda: 'new', 60).value, 'old'
+        )
+        # Разрыв XFetch случаен; random() = 0.5 делает его предсказуемым,
+        # а beta перекрывает даже доли микросекунды на compute().
+        with override_settings(CACHE_EARLY_REFRESH_BETA=10 ** 12), \
+                mock.patch.object(singleflight.random, 'random',
+                                  return_value=0.5):
+            result = singleflight.fetch(KEY, lambda: 'new', 60)
+        self.assertEqual(result.value, 'new')
+
+    def test_none_not_cached(self):
+        """None не кэшируется: следующий запрос считает снова."""
+        self.assertIsNone(singleflight.fetch(KEY, lambda: None, 60).value)
+        self.assertEqual(singleflight.fetch(KEY, lambda: 1, 60).value, 1)
+
+    def test_without_protection_every_miss_computes(self):
+        """С выключенной защитой каждый промах пересчитывает сам."""
+        singleflight.fetch(KEY, lambda: 'value-1', 60, version=1)
+        with override_settings(CACHE_STAMPEDE_PROTECTION=False):
+            calls, results = self.concurrently(2)
+        self.assertEqual(len(calls), 8)
+        self.assertEqual({result.value for result in results}, {'value-2'})
+
+    def test_template_tag(self):
+        """``{% cachefragment %}`` отдаёт фрагмент прежней версии, пока
+        его пересчитывает другой запрос."""
+        template = Template(
+            '{% load fragments %}'
+            '{% cachefragment 60 test version page %}{{ text }}'
+            '{% endcachefragment %}'
+        )
+
+        def render(**context):
+            return template.render(Context(context))
+
+        self.assertEqual(render(version=1, page=1, text='a'), 'a')
+        self.assertEqual(render(version=1, page=1, text='b'), 'a')
+        self.assertEqual(render(version=1, page=2, text='b'), 'b')
+        key = singleflight.LOCK_KEY.format(
+            make_template_fragment_key('test', [1])
+        )
+        cache.add(key, 1)
+        self.assertEqual(render(version=2, page=1, text='c'), 'a')
+        cache.delete(key)
+        self.assertEqual(render(version=2, page=1, text='c'), 'c')
@@ -0,0 +1,147 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import slowlog
+from posts.models import Post
+
+User = get_user_model()
+
+
+def entry(fingerprint, duration, view='posts:index', template=None):
+    return {
+        'fingerprint': fingerprint,
+        'normalized': f'SELECT {fingerprint}',
+        'duration_ms': duration,
+        'view': view,
+        'template': template,
+        'code': 'posts/views.py:1',
+    }
+
+
+class NormalizeTests(SimpleTestCase):
+    def test_same_fingerprint_for_different_values(self):
+        """Запросы, отличающиеся значениями, дают один отпечаток."""
+        queries = (
+            'SELECT * FROM "posts_post" WHERE "id" IN (%s, %s, %s) '
+            'AND "text" = %s LIMIT 10',
+            'SELECT *  FROM "posts_post"\nWHERE "id" IN (%s) '
+            "AND \"text\" = 'it''s' LIMIT 20",
+        )
+        normalized = {slowlog.normalize(sql) for sql in queries}
+        self.assertEqual(normalized, {
+            'SELECT * FROM "posts_post" WHERE "id" IN (...) '
+            'AND "text" = ? LIMIT ?'
+        })
+
+    def test_multirow_values(self):
+        """Вставка разного числа строк — один отпечаток."""
+        self.assertEqual(
+            slowlog.normalize(
+                'INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)'
+            ),
+            slowlog.normalize('INSERT INTO t (a, b) VALUES (%s, %s)'),
+        )
+
+    def test_identifiers_kept(self):
+        """Цифры в именах таблиц и столбцов не заменяются."""
+        self.assertEqual(
+            slowlog.normalize('SELECT "t1"."col2" FROM t1'),
+            'SELECT "t1"."col2" FROM t1',
+        )
+
+
+class SlowQueryMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='auth')
+        Post.objects.create(author=user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_queries_logged_with_source(self):
+        """Медленный запрос записан с представлением, шаблоном и кодом."""
+        with self.assertLogs('core.slowlog', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        records = [json.loads(line.getMessage()) for line in logs.records]
+        self.assertTrue(records)
+        for record in records:
+            self.assertEqual(record['view'], 'posts:index')
+            self.assertEqual(
+                record['fingerprint'],
+                slowlog.fingerprint(slowlog.normalize(record['sql'])),
+            )
+            self.assertTrue(record['code'].startswith('posts/'))
+        # Страница постов вычисляется лениво, в цикле шаблона.
+        self.assertIn(
+            'posts/index.html',
+            {(record['template'] or '').split(':')[0] for record in records},
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=10 ** 6)
+    def test_fast_queries_not_logged(self):
+        """Быстрые запросы не пишутся."""
+        logger = logging.getLogger('core.slowlog')
+        handler = logging.Handler()
+        handler.emit = lambda record: self.fail(record.getMessage())
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        self.client.get(reverse('posts:index'))
+
+
+class SlowQueriesCommandTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'logs', 'slow.log')
+
+    def write(self, handler, records):
+        for record in records:
+            handler.emit(logging.makeLogRecord({'msg': json.dumps(record)}))
+
+    def rotate(self):
+        """Как logrotate с compress и delaycompress."""
+        if os.path.exists(f'{self.path}.1'):
+            with open(f'{self.path}.1', 'rb') as source:
+                with gzip.open(f'{self.path}.2.gz', 'wb') as target:
+                    target.write(source.read())
+            os.remove(f'{self.path}.1')
+        os.rename(self.path, f'{self.path}.1')
+
+    def test_ranked_by_total_time(self):
+        """Отпечатки идут по суммарному времени; копии, ротированные
+        logrotate, в том числе сжатые, учитываются."""
+        handler = slowlog.WatchedFileHandler(self.path, delay=True)
+        self.addCleanup(handler.close)
+        self.write(handler, [entry('a', 300, view='posts:profile',
+                                   template='posts/profile.html:18')])
+        self.rotate()
+        self.write(handler, [entry('a', 150)])
+        self.rotate()
+        self.write(handler, [entry('b', 400)])
+        self.assertEqual(len(slowlog.log_files(self.path)), 3)
+        output = StringIO()
+        call_command('slow_queries', log=self.path, stdout=output)
+        text = output.getvalue()
+        self.assertLess(text.index('[a]'), text.index('[b]'))
+        self.assertIn('450.0 мс всего, 2 раз', text)
+        self.assertIn('posts/profile.html:18, posts/views.py:1 ×1', text)
+
+        output = StringIO()
+        call_command(
+            'slow_queries', log=self.path, view='posts:index', stdout=output
+        )
+        text = output.getvalue()
+        self.assertLess(text.index('[b]'), text.index('[a]'))
@@ -0,0 +1,94 @@
+import json
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import timing
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+def parse(header):
+    """Метрики Server-Timing: имя -> {'dur': ..., 'desc': ...}."""
+    metrics = {}
+    for entry in header.split(', '):
+        name, *params = entry.split(';')
+        metrics[name] = dict(
+            re.match(r'(\w+)="?([^"]*)"?', param).groups()
+            for param in params
+        )
+    return metrics
+
+
+@override_settings(SERVER_TIMING=True)
+class TimingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Post.objects.create(author=cls.user, text='Пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url):
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = self.client.get(url)
+        self.log = [json.loads(line.getMessage()) for line in logs.records]
+        return response
+
+    def test_header(self):
+        """Заголовок содержит время БД, шаблонов и всего запроса."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(reverse('posts:index'))
+        metrics = parse(response['Server-Timing'])
+        self.assertEqual(
+            set(metrics), {'db', 'tpl', 'cache', 'thumb', 'app'}
+        )
+        self.assertEqual(
+            metrics['db']['desc'], f'{len(queries)} queries'
+        )
+        self.assertGreater(float(metrics['tpl']['dur']), 0)
+        self.assertGreaterEqual(
+            float(metrics['app']['dur']), float(metrics['tpl']['dur'])
+        )
+
+    def test_cache_hits(self):
+        """Повторный запрос анонима попадает в кэш страниц без запросов
+        к БД."""
+        url = reverse('posts:group_list', args=[self.group.slug])
+        first = parse(self.get(url)['Server-Timing'])
+        self.assertIn('hit=0', first['cache']['desc'])
+        second = parse(self.get(url)['Server-Timing'])
+        self.assertEqual(second['cache']['desc'], 'hit=1 miss=0')
+        self.assertEqual(second['db']['desc'], '0 queries')
+
+    def test_log_line(self):
+        """На каждый запрос пишется строка JSON."""
+        self.get(reverse('posts:index'))
+        [record] = self.log
+        self.assertEqual(record['path'], reverse('posts:index'))
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db_queries'], 0)
+
+    def test_measure_outside_request(self):
+        """Вне запроса замеры ничего не делают."""
+        with timing.measure('thumb'):
+            timing.cache_lookup(True)
+        self.assertIsNone(timing.current())
+
+
+@override_settings(SERVER_TIMING=False)
+class TimingDisabledTests(TestCase):
+    def test_no_header(self):
+        """Выключенный middleware не добавляет заголовок."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
@@ -0,0 +1,148 @@
+"""Куда ушло время запроса: заголовок ``Server-Timing`` и строка лога.
+
+``TimingMiddleware`` собирает за запрос:
+
+* ``db`` — время и число SQL-запросов ко всем базам;
+* ``tpl`` — рендеринг шаблонов (вместе с запросами из них);
+* ``cache`` — попадания и промахи кэша страниц и фрагментов;
+* ``thumb`` — поиск миниатюр;
+* ``app`` — всё время обработки.
+
+Шаблоны засекает бэкенд ``DjangoTemplates`` из этого модуля, кэш и
+миниатюры — вызовы ``cache_lookup()`` и ``measure()`` в их коде. Вне
+запроса и при ``SERVER_TIMING = False`` эти вызовы ничего не делают, а
+middleware отключается при старте.
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends import django as backend
+
+logger = logging.getLogger(__name__)
+
+state = threading.local()
+
+
+class Timings:
+    def __init__(self):
+        self.durations = {'db': 0.0, 'tpl': 0.0, 'thumb': 0.0}
+        self.queries = 0
+        self.hits = 0
+        self.misses = 0
+        self.active = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['db'] += time.perf_counter() - started
+            self.queries += 1
+
+
+def current():
+    return getattr(state, 'timings', None)
+
+
+@contextmanager
+def collect():
+    """Замеры текущего запроса; вложенный вызов получает те же."""
+    timings = current()
+    if timings is not None:
+        yield timings
+        return
+    timings = state.timings = Timings()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings))
+            yield timings
+    finally:
+        state.timings = None
+
+
+@contextmanager
+def measure(name):
+    """Добавляет время блока к метрике ``name``; вложенные блоки той же
+    метрики не считаются дважды."""
+    timings = current()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[name] += time.perf_counter() - started
+        timings.active.discard(name)
+
+
+def cache_lookup(hit):
+    timings = current()
+    if timings is None:
+        return
+    if hit:
+        timings.hits += 1
+    else:
+        timings.misses += 1
+
+
+class Template(backend.Template):
+    def render(self, context=None, request=None):
+        with measure('tpl'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(backend.DjangoTemplates):
+    """Штатный бэкенд шаблонов, засекающий время рендеринга."""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
+
+
+def header(timings, total):
+    ms = {name: value * 1000 for name, value in timings.durations.items()}
+    return ', '.join((
+        f'db;dur={ms["db"]:.1f};desc="{timings.queries} queries"',
+        f'tpl;dur={ms["tpl"]:.1f}',
+        f'cache;desc="hit={timings.hits} miss={timings.misses}"',
+        f'thumb;dur={ms["thumb"]:.1f}',
+        f'app;dur={total * 1000:.1f}',
+    ))
+
+
+class TimingMiddleware:
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with collect() as timings:
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        response['Server-Timing'] = header(timings, total)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(timings.durations['db'] * 1000, 2),
+            'db_queries': timings.queries,
+            'template_ms': round(timings.durations['tpl'] * 1000, 2),
+            'cache_hits': timings.hits,
+            'cache_misses': timings.misses,
+            'thumbnail_ms': round(timings.durations['thumb'] * 1000, 2),
+        }))
+        return response
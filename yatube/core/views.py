@@ -1,13 +1,22 @@
+import sys
+
 from django.shortcuts import render
 
+from core import degraded
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
 
 
 def csrf_failure(request, reason=''):
-    return render(request, 'core/403csrf.html')
+    return render(request, 'core/403.html', status=403)
 
 
 def server_error(request):
+    # Ошибки базы вне представлений (в middleware, при заполнении меток)
+    # сюда доходят необработанными.
+    response = degraded.handle(request, sys.exc_info()[1])
+    if response is not None:
+        return response
     return render(request, 'core/500.html')
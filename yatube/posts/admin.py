@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from posts.models import Group, Post, Follow, Comment
+from posts.search import match
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -16,6 +17,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо ILIKE по всей таблице — полнотекстовый индекс.
+        if not search_term:
+            return queryset, False
+        return match(search_term, queryset), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
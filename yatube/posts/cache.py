@@ -0,0 +1,172 @@
+"""Версии кэшированных фрагментов лент и кэш страниц.
+
+Ключ фрагмента включает номер версии его области (``posts``,
+``group:<pk>``, ``author:<pk>``, ``follow:<user_pk>``). Сигналы моделей
+увеличивают версию при любом изменении, поэтому фрагменты можно хранить
+часами: старые ключи просто перестают запрашиваться и вытесняются.
+Начальная версия берётся из текущего времени в микросекундах, чтобы
+после вытеснения счётчика не вернулись фрагменты со старым номером.
+Во все ключи входит и версия поколения (``GENERATION``): её смена
+сбрасывает все фрагменты и страницы разом, например после загрузки
+данных в обход сигналов.
+
+Страницы лент кэшируются целиком по тем же версиям (``PAGE_SCOPES``),
+одна копия на всех пользователей: личные части вынесены в метки
+``core.holes`` и дорисовываются для каждого запроса.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from core import degraded, holes, replicas, singleflight, timing
+
+VERSION_KEY = 'fragment_version:{}'
+PAGE_KEY = 'page:{}:{}'
+GENERATION = 'generation'
+SKELETON_KEY = 'page_skeleton:{}'
+# Страницы зависят от постов, комментариев и групп (``posts``) и от
+# числа подписчиков в профилях (``follows``).
+PAGE_SCOPES = ('posts', 'follows')
+
+
+def _initial():
+    return time.time_ns() // 1000
+
+
+def versions(*scopes):
+    """Строка с текущими версиями областей для ключа фрагмента."""
+    keys = [VERSION_KEY.format(scope) for scope in (GENERATION, *scopes)]
+    current = cache.get_many(keys)
+    for key in keys:
+        if key not in current:
+            initial = _initial()
+            cache.add(key, initial, timeout=None)
+            current[key] = cache.get(key, initial)
+    return '.'.join(str(current[key]) for key in keys)
+
+
+def bump(*scopes):
+    """Инвалидирует все фрагменты, зависящие от ``scopes``."""
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        if not cache.add(key, _initial(), timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Ключ вытеснили между add и incr.
+                cache.add(key, _initial(), timeout=None)
+
+
+def fragment_context(*scopes):
+    return {
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'cache_version': versions(*scopes),
+    }
+
+
+def _page_keys(request, version):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return PAGE_KEY.format(version, path), SKELETON_KEY.format(path)
+
+
+def _shareable(request, response):
+    # Cookie или CSRF-токен вне меток делают страницу личной.
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+    )
+
+
+def _cached_page(key):
+    cached = cache.get(key)
+    timing.cache_lookup(cached is not None)
+    return cached
+
+
+def cache_shared_page(view):
+    """Кэширует страницу, общую для всех пользователей.
+
+    В кэше лежит страница с метками ``{% hole %}`` на месте личных
+    фрагментов; для каждого запроса заполняются только метки. Скелет
+    пересчитывается через ``core.singleflight``: после инвалидации
+    представление вызывает один запрос, остальные получают прежний.
+    Анонимом считается запрос без cookie сессии — проверка не загружает
+    сессию.
+    Для анонимов кэшируется и заполненная страница: повторный запрос не
+    трогает ни сессию, ни БД, а условный GET получает 304. Она же
+    остаётся копией на случай недоступности БД (``core.degraded``).
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        anonymous = settings.SESSION_COOKIE_NAME not in request.COOKIES
+        version = versions(*PAGE_SCOPES)
+        page_key, skeleton_key = _page_keys(request, version)
+        cached = _cached_page(page_key) if anonymous else None
+        if cached is not None:
+            response = HttpResponse(cached[0], content_type=cached[1])
+            return _conditional(request, response, cached)
+
+        rendered = []
+
+        def render():
+            response = view(request, *args, **kwargs)
+            rendered.append(response)
+            if not _shareable(request, response):
+                return None
+            return (
+                response.content.decode(response.charset),
+                response['Content-Type'],
+            )
+
+        skeleton, fresh = singleflight.fetch(
+            skeleton_key, render, settings.PAGE_CACHE_TIMEOUT, version
+        )
+        if skeleton is None:
+            return rendered[0]
+        if rendered:
+            response = rendered[0]
+        else:
+            response = HttpResponse(content_type=skeleton[1])
+        if not anonymous:
+            response.content = holes.fill(request, skeleton[0])
+            patch_cache_control(response, private=True, max_age=0)
+            return response
+        # Заполненная страница анонима тоже ложится в кэш.
+        with replicas.primary():
+            response.content = holes.fill(request, skeleton[0])
+        content = response.content
+        cached = (
+            content,
+            skeleton[1],
+            quote_etag(hashlib.md5(content).hexdigest()),
+            int(time.time()),
+        )
+        # Прежний скелет, отданный во время пересчёта, под ключом новой
+        # версии не сохраняется.
+        if fresh and _shareable(request, response):
+            cache.set(page_key, cached, settings.PAGE_CACHE_TIMEOUT)
+            degraded.remember(request, content, skeleton[1])
+        return _conditional(request, response, cached)
+    return wrapper
+
+
+def _conditional(request, response, cached):
+    _, _, etag, last_modified = cached
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Cookie',))
+    patch_cache_control(response, max_age=0)
+    return get_conditional_response(
+        request, etag=etag, last_modified=last_modified, response=response,
+    )
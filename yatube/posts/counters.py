@@ -0,0 +1,101 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарными ``UPDATE ... SET n = n + 1`` из сигналов
+моделей, а расхождения, накопленные при массовых операциях в обход
+``save()``, исправляет команда ``reconcile_counters``.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+def _add(queryset, **deltas):
+    # Счётчик, уже ушедший в ноль из-за расхождения, не уменьшаем:
+    # до запуска reconcile_counters он не должен ронять запрос.
+    queryset = queryset.filter(**{
+        f'{field}__gte': -delta for field, delta in deltas.items() if delta < 0
+    })
+    return queryset.update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+
+
+def add_user(user_id, **deltas):
+    if _add(UserStats.objects.filter(user_id=user_id), **deltas):
+        return
+    # Строки ещё нет: создаём её только при увеличении, чтобы каскадное
+    # удаление пользователя не воскрешало его счётчики.
+    if all(delta > 0 for delta in deltas.values()):
+        _, created = UserStats.objects.get_or_create(
+            user_id=user_id, defaults=deltas
+        )
+        if not created:
+            _add(UserStats.objects.filter(user_id=user_id), **deltas)
+
+
+def add_group(group_id, delta):
+    if group_id is not None:
+        _add(Group.objects.filter(pk=group_id), posts_count=delta)
+
+
+def add_post(post_id, delta):
+    _add(Post.objects.filter(pk=post_id), comments_count=delta)
+
+
+def _count(model, field):
+    """Подзапрос с числом строк ``model``, ссылающихся на OuterRef('pk')."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        Value(0),
+    )
+
+
+def _repair(queryset, **expressions):
+    repaired = 0
+    for field, expression in expressions.items():
+        repaired += queryset.exclude(**{field: expression}).update(
+            **{field: expression}
+        )
+    return repaired
+
+
+def reconcile():
+    """Пересчитывает все счётчики и возвращает число исправленных строк.
+
+    Каждый счётчик чинится одним ``UPDATE``, который затрагивает только
+    разошедшиеся строки.
+    """
+    UserStats.objects.bulk_create(
+        [
+            UserStats(user_id=user_id)
+            for user_id in User.objects.filter(stats=None)
+            .values_list('pk', flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+    return sum((
+        _repair(
+            Post.objects.all(),
+            comments_count=_count(Comment, 'post'),
+        ),
+        _repair(
+            Group.objects.all(),
+            posts_count=_count(Post, 'group'),
+        ),
+        _repair(
+            UserStats.objects.all(),
+            posts_count=_count(Post, 'author'),
+            followers_count=_count(Follow, 'author'),
+            following_count=_count(Follow, 'user'),
+        ),
+    ))
@@ -0,0 +1,86 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+
+from core.loadtest import QueryCounter
+from posts import threads
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+def recursive_thread(root):
+    """Прежний способ: отдельный запрос за ответами каждого узла."""
+    thread = []
+
+    def walk(node):
+        for child in node.replies.select_related('author').order_by('id'):
+            thread.append(child)
+            walk(child)
+
+    walk(root)
+    return thread
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает загрузку ветки комментариев одним запросом по path '
+        'с рекурсивными запросами по узлам. Данные создаются во '
+        'временной транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            root = self.build(options['comments'], options['seed'])
+            self.stdout.write(
+                f'{"способ":<10} {"ответов":>8} {"запросов":>9} '
+                f'{"медиана, мс":>12}'
+            )
+            for name, load in (
+                ('path', lambda: threads.attach_replies([root])[0].thread),
+                ('recursive', lambda: recursive_thread(root)),
+            ):
+                self.measure(name, load, options['repeat'])
+            transaction.set_rollback(True)
+
+    def build(self, count, seed):
+        """Ветка из ``count`` ответов; отвечают чаще на свежие."""
+        rng = random.Random(seed)
+        author = User.objects.create_user('comment-benchmark')
+        post = Post.objects.create(text='Обсуждение', author=author)
+        root = Comment.objects.create(post=post, author=author, text='Корень')
+        next_pk = Comment.objects.aggregate(last=Max('pk'))['last'] + 1
+        nodes = [root]
+        for pk in range(next_pk, next_pk + count):
+            parent = nodes[-1 - min(len(nodes) - 1,
+                                    int(rng.expovariate(0.05)))]
+            path, parent_id = threads.reply_path(parent)
+            nodes.append(Comment(
+                pk=pk, post=post, author=author, parent_id=parent_id,
+                path=path, text=f'Ответ {pk}',
+            ))
+        Comment.objects.bulk_create(nodes[1:], batch_size=500)
+        return root
+
+    def measure(self, name, load, repeat):
+        timings = []
+        for _ in range(repeat):
+            counter = QueryCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                replies = load()
+            timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f'{name:<10} {len(replies):>8} {counter.count:>9} '
+            f'{statistics.median(timings) * 1000:>12.1f}'
+        )
@@ -0,0 +1,234 @@
+import datetime
+import itertools
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core import loadtest
+from posts import cache as fragments
+from posts.models import Follow, Group, Post, TimelineEntry
+from posts.seeding import DATASETS, Generator, dataset_size
+
+User = get_user_model()
+
+ENDPOINTS = (
+    'index', 'group_posts', 'profile', 'post_detail', 'follow_index'
+)
+HOST = 'localhost'
+SAMPLE_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест страниц ленты: запросы в секунду, перцентили '
+        'задержки и число SQL-запросов, результат в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--build', type=dataset_size, metavar='SIZE',
+            help=f'Сначала заполнить пустую базу: {", ".join(DATASETS)} '
+                 'или число постов.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument(
+            '--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS
+        )
+        parser.add_argument(
+            '--logged-in', action='store_true',
+            help='Все страницы запрашивать от имени вошедших читателей.'
+        )
+        parser.add_argument(
+            '--invalidate-every', type=float, metavar='SECONDS',
+            help='Сбрасывать кэш лент с таким интервалом, как это делает '
+                 'поток новых постов.'
+        )
+        parser.add_argument(
+            '--no-stampede-protection', action='store_true',
+            help='Пересчитывать фрагменты при каждом промахе, без '
+                 'блокировки и отдачи прежнего значения.'
+        )
+        parser.add_argument('--output', help='Сохранить результат в JSON.')
+        parser.add_argument(
+            '--baseline', help='Сравнить результат с прошлым прогоном.'
+        )
+        parser.add_argument(
+            '--diff', nargs=2, metavar=('BASELINE', 'CURRENT'),
+            help='Только сравнить два сохранённых прогона.'
+        )
+
+    def handle(self, *args, **options):
+        if options['diff']:
+            baseline, current = map(loadtest.load, options['diff'])
+            self.print_diff(baseline, current)
+            return
+        if options['build']:
+            if Post.objects.exists():
+                raise CommandError('--build заполняет только пустую базу.')
+            Generator(
+                options['build'], seed=options['seed'], log=self.stdout.write
+            ).run()
+        if not Post.objects.exists():
+            raise CommandError('В базе нет постов: запустите с --build.')
+
+        from yatube.wsgi import application
+        rng = random.Random(options['seed'])
+        sources = self.sources(rng, options['logged_in'])
+        result = {
+            'meta': self.meta(options),
+            'endpoints': {},
+        }
+        for name in options['endpoints']:
+            requests = sources[name]
+            if not requests:
+                self.stderr.write(f'{name}: нет данных, пропускаю.')
+                continue
+            with override_settings(
+                CACHE_STAMPEDE_PROTECTION=not options['no_stampede_protection']
+            ), self.invalidating(options['invalidate_every']):
+                summary = loadtest.run_endpoint(
+                    application, requests, HOST,
+                    concurrency=options['concurrency'],
+                    total=options['requests'],
+                    warmup=options['warmup'],
+                )
+            result['endpoints'][name] = summary
+            self.stdout.write(
+                f'{name:<13} {summary["rps"]:>8} rps  '
+                f'p50 {summary["p50_ms"]} мс  p99 {summary["p99_ms"]} мс  '
+                f'запросов {summary["queries_avg"]}  '
+                f'ошибок {summary["errors"]}'
+            )
+        if options['output']:
+            loadtest.save(options['output'], result)
+        if options['baseline']:
+            self.print_diff(loadtest.load(options['baseline']), result)
+
+    @contextmanager
+    def invalidating(self, every):
+        """Периодически инвалидирует все ленты, пока идёт прогон."""
+        if not every:
+            yield
+            return
+        stop = threading.Event()
+
+        def bump():
+            while not stop.wait(every):
+                fragments.bump('posts')
+
+        thread = threading.Thread(target=bump, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def meta(self, options):
+        return {
+            'started': datetime.datetime.utcnow().isoformat(),
+            'seed': options['seed'],
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'warmup': options['warmup'],
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'cursor_pagination': settings.CURSOR_PAGINATION,
+            'logged_in': options['logged_in'],
+            'invalidate_every': options['invalidate_every'],
+            'stampede_protection': not options['no_stampede_protection'],
+            'posts': Post.objects.count(),
+            'users': User.objects.count(),
+            'follows': Follow.objects.count(),
+        }
+
+    def sources(self, rng, logged_in=False):
+        """Бесконечные потоки (url, cookie) для каждой страницы."""
+        posts = self.sample_posts(rng)
+        slugs = list(
+            Group.objects.order_by('pk').values_list('slug', flat=True)
+            [:SAMPLE_SIZE]
+        )
+        readers = list(
+            TimelineEntry.objects.order_by('user_id')
+            .values_list('user_id', flat=True).distinct()[:50]
+        ) or list(
+            Follow.objects.order_by('user_id')
+            .values_list('user_id', flat=True).distinct()[:50]
+        )
+        cookies = [self.session_cookie(user_id) for user_id in readers]
+
+        def stream(make):
+            return (make() for _ in itertools.count())
+
+        def cookie():
+            return rng.choice(cookies) if logged_in else None
+
+        def page():
+            # Первые страницы открывают чаще, чем глубокие.
+            return min(20, int(rng.paretovariate(1.5)))
+
+        return {
+            'index': stream(lambda: (
+                f'{reverse("posts:index")}?page={page()}', cookie()
+            )),
+            'group_posts': slugs and stream(lambda: (
+                reverse('posts:group_list', args=[rng.choice(slugs)]),
+                cookie(),
+            )),
+            'profile': posts and stream(lambda: (
+                reverse('posts:profile', args=[rng.choice(posts)[1]]),
+                cookie(),
+            )),
+            'post_detail': posts and stream(lambda: (
+                reverse('posts:post_detail', args=[rng.choice(posts)[0]]),
+                cookie(),
+            )),
+            'follow_index': cookies and stream(lambda: (
+                reverse('posts:follow_index'), rng.choice(cookies)
+            )),
+        }
+
+    def sample_posts(self, rng):
+        """Случайные посты: их авторы выбираются пропорционально числу
+        постов, как популярные профили в реальном трафике."""
+        bounds = Post.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        sample = []
+        for _ in range(SAMPLE_SIZE):
+            pk = rng.randint(bounds['first'], bounds['last'])
+            sample.extend(
+                Post.objects.filter(pk__gte=pk).order_by('pk')
+                .values_list('pk', 'author__username')[:1]
+            )
+        return sample
+
+    def session_cookie(self, user_id):
+        client = Client()
+        client.force_login(User.objects.get(pk=user_id))
+        cookie = client.cookies[settings.SESSION_COOKIE_NAME]
+        return f'{settings.SESSION_COOKIE_NAME}={cookie.value}'
+
+    def print_diff(self, baseline, current):
+        self.stdout.write(
+            f'{"страница":<13} {"метрика":<12} {"было":>10} {"стало":>10} '
+            f'{"изм.":>8}'
+        )
+        for name, metric, old, new, change in loadtest.compare(
+            baseline, current
+        ):
+            change = '' if change is None else f'{change:+.1f}%'
+            self.stdout.write(
+                f'{name:<13} {metric:<12} {str(old):>10} {str(new):>10} '
+                f'{change:>8}'
+            )
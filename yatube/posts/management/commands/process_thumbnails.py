@@ -0,0 +1,66 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django import db
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post, ThumbnailJob
+
+
+def process_job(job_pk):
+    # Дочерний процесс не должен пользоваться соединением родителя.
+    db.connections.close_all()
+    return thumbnails.process(job_pk)
+
+
+class Command(BaseCommand):
+    help = 'Генерирует миниатюры картинок постов из очереди ThumbnailJob.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, опрашивая очередь.'
+        )
+        parser.add_argument('--interval', type=float, default=1.0)
+        parser.add_argument('--batch', type=int, default=20)
+        parser.add_argument(
+            '--processes', type=int, default=0,
+            help='Число процессов Pillow; 0 — обрабатывать в этом процессе.'
+        )
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Поставить в очередь картинки постов без задачи.'
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            posts = Post.objects.exclude(image='').filter(thumbnail_job=None)
+            ThumbnailJob.objects.bulk_create(
+                (ThumbnailJob(post=post) for post in posts.only('pk')),
+                batch_size=500,
+            )
+        pool = None
+        if options['processes']:
+            pool = ProcessPoolExecutor(options['processes'])
+        try:
+            while True:
+                thumbnails.requeue_stale()
+                claimed = thumbnails.claim(options['batch'])
+                if pool:
+                    db.connections.close_all()
+                    statuses = list(pool.map(process_job, claimed))
+                else:
+                    statuses = [thumbnails.process(pk) for pk in claimed]
+                if statuses:
+                    self.stdout.write(
+                        f'Обработано задач: {len(statuses)}, готово: '
+                        f'{statuses.count(ThumbnailJob.READY)}'
+                    )
+                if not options['loop'] and not claimed:
+                    break
+                if not claimed:
+                    time.sleep(options['interval'])
+        finally:
+            if pool:
+                pool.shutdown()
@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.models import Group
+from posts.seeding import (DATASETS, GROUP_PREFIX, USERNAME_PREFIX, WRITERS,
+                           Generator, dataset_size, default_writer)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Быстро заполняет базу синтетическими пользователями, группами, '
+        'постами, комментариями и подписками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'posts', type=dataset_size,
+            help=f'Число постов или готовый размер: {", ".join(DATASETS)}.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int)
+        parser.add_argument('--groups', type=int)
+        parser.add_argument('--comments', type=int)
+        parser.add_argument(
+            '--follows', type=int,
+            help='Примерное общее число подписок.'
+        )
+        parser.add_argument(
+            '--method', choices=WRITERS,
+            help='bulk — bulk_create, insert — executemany, copy — COPY '
+                 '(только PostgreSQL). По умолчанию copy на PostgreSQL, '
+                 'иначе insert.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--readers', type=int, default=50,
+            help='Для скольких пользователей построить ленты подписок.'
+        )
+
+    def handle(self, *args, **options):
+        method = options['method'] or default_writer()
+        if method == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError('COPY доступен только на PostgreSQL.')
+        if (
+            User.objects.filter(username__startswith=USERNAME_PREFIX).exists()
+            or Group.objects.filter(slug__startswith=GROUP_PREFIX).exists()
+        ):
+            raise CommandError('Сгенерированные данные уже есть в базе.')
+        Generator(
+            options['posts'],
+            seed=options['seed'],
+            log=self.stdout.write,
+            writer=WRITERS[method](options['batch_size']),
+            users=options['users'],
+            groups=options['groups'],
+            comments=options['comments'],
+            follows=options['follows'],
+        ).run(readers=options['readers'])
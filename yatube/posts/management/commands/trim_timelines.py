@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Обрезает ленты подписок до TIMELINE_SIZE последних записей; '
+        'запускается периодически.'
+    )
+
+    def handle(self, *args, **options):
+        removed = timeline.trim()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей лент: {removed} '
+            f'(оставлено по {settings.TIMELINE_SIZE}).'
+        ))
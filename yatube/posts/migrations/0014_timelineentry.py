@@ -0,0 +1,64 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+FILL_SQL = (
+    'INSERT INTO {timeline} (user_id, post_id, pub_date)'
+    ' SELECT follow.user_id, recent.id, recent.pub_date'
+    ' FROM {follow} follow JOIN ('
+    '  SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+    '   PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+    '  ) AS position FROM {post}'
+    ' ) recent ON recent.author_id = follow.author_id'
+    ' WHERE recent.position <= %s'
+)
+
+
+def fill_timelines(apps, schema_editor):
+    # Одна вставка INSERT ... SELECT вместо запросов на каждую подписку.
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    schema_editor.execute(
+        FILL_SQL.format(
+            timeline=TimelineEntry._meta.db_table,
+            follow=Follow._meta.db_table,
+            post=Post._meta.db_table,
+        ),
+        [settings.TIMELINE_SIZE],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0013_auto_20221122_1250'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(help_text='Копия даты публикации поста для сортировки ленты', verbose_name='Дата Публикации')),
+                ('post', models.ForeignKey(help_text='Пост в ленте', on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(help_text='Владелец ленты', on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'ordering': ('-pub_date',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:09
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    # Исторические модели: posts.counters работает с текущими.
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model('posts', 'Post')
+    Group = apps.get_model('posts', 'Group')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+
+    def count(model, field):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(**{field: OuterRef('pk')})
+                .order_by()
+                .values(field)
+                .annotate(total=Count('pk'))
+                .values('total')
+            ),
+            Value(0),
+        )
+
+    UserStats.objects.bulk_create(
+        UserStats(user_id=pk) for pk in User.objects.values_list('pk', flat=True)
+    )
+    Post.objects.update(comments_count=count(Comment, 'post'))
+    Group.objects.update(posts_count=count(Post, 'group'))
+    UserStats.objects.update(
+        posts_count=count(Post, 'author'),
+        followers_count=count(Follow, 'author'),
+        following_count=count(Follow, 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0014_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(help_text='Владелец счётчиков', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, help_text='Сколько постов написал пользователь', verbose_name='Количество постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, help_text='Сколько пользователей подписано на автора', verbose_name='Количество подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, help_text='На скольких авторов подписан пользователь', verbose_name='Количество подписок')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Счётчик постов группы', verbose_name='Количество постов'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Счётчик комментариев к посту', verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThumbnailJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('processing', 'Обрабатывается'), ('ready', 'Готова'), ('failed', 'Ошибка')], default='pending', help_text='Состояние задачи', max_length=16, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, help_text='Сколько раз задачу пытались выполнить', verbose_name='Попытки')),
+                ('error', models.TextField(blank=True, help_text='Текст последней ошибки', verbose_name='Ошибка')),
+                ('updated', models.DateTimeField(auto_now=True, help_text='Время последнего изменения задачи', verbose_name='Обновлена')),
+                ('post', models.OneToOneField(help_text='Пост, для картинки которого нужна миниатюра', on_delete=django.db.models.deletion.CASCADE, related_name='thumbnail_job', to='posts.Post', verbose_name='Пост')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='thumbnailjob',
+            index=models.Index(fields=['status', 'updated'], name='thumbnail_job_status_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    'ALTER TABLE posts_post ADD COLUMN search_vector tsvector',
+    "UPDATE posts_post SET search_vector = to_tsvector('russian', text)",
+    'CREATE INDEX posts_post_search_idx ON posts_post'
+    ' USING GIN (search_vector)',
+    'CREATE TRIGGER posts_post_search_update'
+    ' BEFORE INSERT OR UPDATE OF text ON posts_post FOR EACH ROW'
+    ' EXECUTE PROCEDURE tsvector_update_trigger('
+    "search_vector, 'pg_catalog.russian', text)",
+)
+POSTGRES_BACKWARD = (
+    'DROP TRIGGER IF EXISTS posts_post_search_update ON posts_post',
+    'ALTER TABLE posts_post DROP COLUMN IF EXISTS search_vector',
+)
+
+SQLITE_FORWARD = (
+    'CREATE VIRTUAL TABLE posts_post_fts USING fts5('
+    "text, content='posts_post', content_rowid='id',"
+    " tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN'
+    ' INSERT INTO posts_post_fts (rowid, text) VALUES (new.id, new.text);'
+    ' END',
+    'CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN'
+    ' INSERT INTO posts_post_fts (posts_post_fts, rowid, text)'
+    " VALUES ('delete', old.id, old.text);"
+    ' END',
+    'CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF text ON posts_post'
+    ' BEGIN'
+    ' INSERT INTO posts_post_fts (posts_post_fts, rowid, text)'
+    " VALUES ('delete', old.id, old.text);"
+    ' INSERT INTO posts_post_fts (rowid, text) VALUES (new.id, new.text);'
+    ' END',
+    "INSERT INTO posts_post_fts (posts_post_fts) VALUES ('rebuild')",
+)
+SQLITE_BACKWARD = (
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TABLE IF EXISTS posts_post_fts',
+)
+
+
+def run(statements_by_vendor):
+    def operation(apps, schema_editor):
+        statements = statements_by_vendor.get(schema_editor.connection.vendor)
+        for statement in statements or ():
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+    """Полнотекстовый индекс постов вне ORM.
+
+    На PostgreSQL — колонка tsvector с GIN-индексом, которую обновляет
+    триггер, на SQLite — внешняя таблица FTS5. Другие СУБД остаются без
+    индекса, и поиск работает через LIKE.
+    """
+
+    dependencies = [
+        ('posts', '0016_thumbnailjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
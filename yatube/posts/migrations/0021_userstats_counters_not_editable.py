@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_timeline_feed_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userstats',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Сколько пользователей подписано на автора', verbose_name='Количество подписчиков'),
+        ),
+        migrations.AlterField(
+            model_name='userstats',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='На скольких авторов подписан пользователь', verbose_name='Количество подписок'),
+        ),
+        migrations.AlterField(
+            model_name='userstats',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Сколько постов написал пользователь', verbose_name='Количество постов'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from posts import threads
+
 User = get_user_model()
 
 
@@ -19,6 +21,12 @@ class Group(models.Model):
         verbose_name='Описание',
         help_text='Введите описание группы'
     )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество постов',
+        help_text='Счётчик постов группы'
+    )
 
     def __str__(self) -> str:
         return self.title
@@ -29,6 +37,10 @@ class Post(models.Model):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # Группа на момент загрузки: при смене группы счётчики
+        # переносятся со старой группы на новую.
+        self.initial_group_id = self.__dict__.get('group_id')
+        self.initial_image = str(self.__dict__.get('image') or '')
 
     text = models.TextField(
         verbose_name='Текст Поста',
@@ -60,12 +72,37 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+        help_text='Счётчик комментариев к посту'
+    )
 
     def __str__(self):
         return self.text[self.SYMBOLS_IN_STR]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.initial_group_id = self.group_id
+        self.initial_image = self.image.name or ''
+
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -92,9 +129,43 @@ class Comment(models.Model):
         verbose_name='Дата комментария',
         help_text='Показывает дату комментария'
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='replies',
+        verbose_name='Ответ на',
+        help_text='Комментарий, на который отвечают'
+    )
+    path = models.CharField(
+        max_length=threads.MAX_PATH_LENGTH,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Путь в ветке',
+        help_text='Идентификаторы предков от корня ветки'
+    )
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            # Корни поста (path = '') по дате и ветки диапазоном path.
+            models.Index(
+                fields=['post', 'path', '-created', '-id'],
+                name='comment_post_path_idx'
+            ),
+        ]
+
+    @property
+    def depth(self):
+        return threads.depth(self.path)
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.parent_id is not None:
+            self.path, self.parent_id = threads.reply_path(self.parent)
+            self.post_id = self.parent.post_id
+        super().save(*args, **kwargs)
 
 
 class Follow(models.Model):
@@ -124,3 +195,139 @@ class Follow(models.Model):
                 check=~models.Q(user=models.F("author")),
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
+
+
+class ThumbnailJob(models.Model):
+    """Задача очереди на генерацию миниатюры картинки поста."""
+
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    READY = 'ready'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Обрабатывается'),
+        (READY, 'Готова'),
+        (FAILED, 'Ошибка'),
+    )
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='thumbnail_job',
+        verbose_name='Пост',
+        help_text='Пост, для картинки которого нужна миниатюра'
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус',
+        help_text='Состояние задачи'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попытки',
+        help_text='Сколько раз задачу пытались выполнить'
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка',
+        help_text='Текст последней ошибки'
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Обновлена',
+        help_text='Время последнего изменения задачи'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'updated'],
+                name='thumbnail_job_status_idx'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+        help_text='Владелец счётчиков'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество постов',
+        help_text='Сколько постов написал пользователь'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков',
+        help_text='Сколько пользователей подписано на автора'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписок',
+        help_text='На скольких авторов подписан пользователь'
+    )
+
+    class Meta:
+        indexes = [
+            # Поиск «тяжёлых» авторов для ленты подписок.
+            models.Index(
+                fields=['followers_count'], name='stats_followers_count_idx'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: запись на каждого подписчика."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+        help_text='Владелец ленты'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+        help_text='Пост в ленте'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата Публикации',
+        help_text='Копия даты публикации поста для сортировки ленты'
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-id'],
+                name='timeline_user_feed_idx'
+            ),
+        ]
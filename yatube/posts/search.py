@@ -0,0 +1,151 @@
+"""Полнотекстовый поиск по постам.
+
+Индекс создаёт миграция ``0017_post_search``: на PostgreSQL это
+колонка ``search_vector`` с GIN-индексом, на SQLite — таблица FTS5.
+``search`` возвращает посты с аннотацией ``rank`` (больше — релевантнее),
+по которой результаты упорядочиваются и разбиваются курсорами; ``match``
+только отбирает посты — для админки, где ранг не нужен.
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, FloatField, Max, Q, Value
+from django.db.models.expressions import RawSQL
+
+from posts.models import Post
+
+WORD = re.compile(r'\w+')
+
+_backends = {}
+
+POSTGRES_MATCH = (
+    "posts_post.search_vector @@ plainto_tsquery('russian', %s)"
+)
+# ts_rank возвращает real: без приведения значение из курсора страницы
+# (double) не совпадает с вычисленным и строки на границе теряются.
+POSTGRES_RANK = (
+    "ts_rank(posts_post.search_vector, plainto_tsquery('russian', %s))"
+    '::double precision'
+)
+# Условие передаётся через extra(): RawSQL в ``id__in`` получает
+# двойные скобки, и SQLite считает подзапрос скалярным.
+SQLITE_MATCH = (
+    'posts_post.id IN (SELECT rowid FROM posts_post_fts'
+    ' WHERE posts_post_fts MATCH %s)'
+)
+# Для ранжирования таблица FTS5 соединяется с постами: MATCH выполняется
+# один раз на запрос, а ранг читается у найденной строки. Подзапрос по
+# rowid повторял бы MATCH для каждого поста. Скрытый столбец ``rank``
+# равен bm25(), но, в отличие от функции, допустим и в GROUP BY, который
+# Django добавляет в count().
+SQLITE_JOIN = (
+    'posts_post_fts.rowid = posts_post.id',
+    'posts_post_fts MATCH %s',
+)
+SQLITE_RANK = '-posts_post_fts.rank'
+# Триггер из миграции 0017: на время массовой вставки он снимается.
+SQLITE_INSERT_TRIGGER = (
+    'CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN'
+    ' INSERT INTO posts_post_fts (rowid, text) VALUES (new.id, new.text);'
+    ' END'
+)
+
+
+def backend():
+    """Какой индекс доступен в текущей базе."""
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    name = connection.settings_dict['NAME']
+    if name not in _backends:
+        _backends[name] = (
+            'sqlite' if connection.vendor == 'sqlite'
+            and 'posts_post_fts' in connection.introspection.table_names()
+            else 'like'
+        )
+    return _backends[name]
+
+
+def fts5_query(query):
+    """Каждое слово — отдельный префиксный термин, все обязательны.
+
+    Кавычки не дают спецсимволам FTS5 из пользовательского ввода
+    превратиться в синтаксис запроса.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query))
+
+
+def match(query, queryset=None):
+    """Посты, подходящие под запрос, без ранжирования."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    words = WORD.findall(query)
+    if not words:
+        return queryset.none()
+    kind = backend()
+    if kind == 'like':
+        condition = Q()
+        for word in words:
+            condition &= Q(text__icontains=word)
+        return queryset.filter(condition)
+    if kind == 'postgresql':
+        return queryset.annotate(
+            matched=RawSQL(POSTGRES_MATCH, (query,),
+                           output_field=BooleanField()),
+        ).filter(matched=True)
+    return queryset.extra(where=[SQLITE_MATCH], params=[fts5_query(query)])
+
+
+def search(query, queryset=None):
+    """Посты, подходящие под запрос, с аннотацией ``rank``."""
+    kind = backend()
+    if kind == 'sqlite' and WORD.search(query):
+        if queryset is None:
+            queryset = Post.objects.all()
+        return queryset.extra(
+            tables=['posts_post_fts'], where=list(SQLITE_JOIN),
+            params=[fts5_query(query)],
+        ).annotate(rank=RawSQL(SQLITE_RANK, (), output_field=FloatField()))
+    if kind == 'postgresql' and WORD.search(query):
+        rank = RawSQL(POSTGRES_RANK, (query,), output_field=FloatField())
+    else:
+        rank = Value(0.0, output_field=FloatField())
+    return match(query, queryset).annotate(rank=rank)
+
+
+@contextmanager
+def deferred_index():
+    """Индексирует посты, вставленные внутри блока, одним запросом.
+
+    Построчный триггер в разы замедляет массовую вставку, поэтому на
+    время блока он отключается, а новые посты (с id больше прежнего
+    максимума) затем попадают в индекс одним ``INSERT``/``UPDATE``.
+    Всё это одна транзакция: при ошибке откатываются и вставка, и
+    отключение триггера.
+    """
+    kind = backend()
+    with transaction.atomic(), connection.cursor() as cursor:
+        last = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        if kind == 'postgresql':
+            cursor.execute(
+                'ALTER TABLE posts_post'
+                ' DISABLE TRIGGER posts_post_search_update'
+            )
+        elif kind == 'sqlite':
+            cursor.execute('DROP TRIGGER posts_post_fts_insert')
+        yield
+        if kind == 'postgresql':
+            cursor.execute(
+                'ALTER TABLE posts_post'
+                ' ENABLE TRIGGER posts_post_search_update'
+            )
+            cursor.execute(
+                "UPDATE posts_post SET search_vector ="
+                " to_tsvector('russian', text) WHERE id > %s", [last]
+            )
+        elif kind == 'sqlite':
+            cursor.execute(SQLITE_INSERT_TRIGGER)
+            cursor.execute(
+                'INSERT INTO posts_post_fts (rowid, text)'
+                ' SELECT id, text FROM posts_post WHERE id > %s', [last]
+            )
@@ -0,0 +1,410 @@
+"""Синтетические наборы данных для профилирования и нагрузочных тестов.
+
+Данные детерминированы при одинаковом ``seed``: те же пользователи,
+тексты, даты и граф подписок. Популярность авторов подчиняется
+закону Ципфа — немногие авторы пишут много постов и собирают
+большую часть подписчиков, как в живой соцсети.
+
+Строки генерируются кортежами и пишутся пачками, в памяти держится
+одна пачка. Способ записи выбирается ``Writer``: ``bulk_create``,
+``executemany`` готовых кортежей или ``COPY`` на PostgreSQL.
+"""
+import argparse
+import datetime
+import io
+import itertools
+import random
+import time
+from bisect import bisect
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from posts import counters, search, timeline
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+DATASETS = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+USERNAME_PREFIX = 'seed-user-'
+GROUP_PREFIX = 'seed-group-'
+BATCH_SIZE = 5000
+CORPUS_SIZE = 1 << 16
+# Отрицательное значение — размер в килобайтах.
+SQLITE_CACHE_SIZE = -256 * 1024
+# Все даты отсчитываются от фиксированного момента, иначе данные
+# разных запусков отличались бы.
+EPOCH = datetime.datetime(2022, 12, 1, tzinfo=timezone.utc)
+PERIOD = datetime.timedelta(days=365)
+WORDS = (
+    'пост лента группа автор подписка комментарий фото новости город '
+    'погода утро вечер кофе книга музыка кино работа отпуск море горы '
+    'кошка собака друг семья праздник проект код релиз ошибка идея '
+    'вопрос ответ история дорога поезд самолёт лето зима весна осень'
+).split()
+
+USER_COLUMNS = (
+    'username', 'password', 'first_name', 'last_name', 'email',
+    'is_superuser', 'is_staff', 'is_active', 'date_joined',
+)
+GROUP_COLUMNS = ('title', 'slug', 'description', 'posts_count')
+POST_COLUMNS = (
+    'text', 'author_id', 'group_id', 'pub_date', 'image', 'comments_count',
+)
+COMMENT_COLUMNS = ('post_id', 'author_id', 'text', 'created', 'path')
+FOLLOW_COLUMNS = ('user_id', 'author_id')
+
+
+def dataset_size(value):
+    """Размер набора из командной строки: ``10k``/``1m``/``10m`` или число."""
+    if value.lower() in DATASETS:
+        return DATASETS[value.lower()]
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f'ожидается {", ".join(DATASETS)} или число постов'
+        )
+
+
+def scale(posts):
+    """Размеры таблиц для набора из ``posts`` постов."""
+    users = max(100, posts // 20)
+    return {
+        'users': users,
+        'groups': max(10, posts // 5000),
+        'posts': posts,
+        'comments': posts // 2,
+        'follows': users * 20,
+    }
+
+
+def batches(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключает ``auto_now_add``, чтобы сохранить сгенерированные даты."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Writer:
+    """Пишет кортежи ``rows`` в колонки ``columns`` таблицы ``model``."""
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def prepare(self, batch):
+        return batch
+
+    def write(self, model, columns, rows):
+        written = 0
+        for batch in batches(rows, self.batch_size):
+            self.write_batch(model, columns, self.prepare(batch))
+            written += len(batch)
+        return written
+
+
+class BulkCreateWriter(Writer):
+    """Через ORM: переносимо, но медленнее всего."""
+
+    def write(self, model, columns, rows):
+        dates = [
+            field for field in model._meta.concrete_fields
+            if getattr(field, 'auto_now_add', False)
+            and field.attname in columns
+        ]
+        with explicit_dates(*dates):
+            return super().write(model, columns, rows)
+
+    def write_batch(self, model, columns, batch):
+        # Размер вложенных INSERT выбирает Django: у SQLite есть предел
+        # числа параметров в одном запросе.
+        model.objects.bulk_create(
+            [model(**dict(zip(columns, row))) for row in batch]
+        )
+
+
+class InsertWriter(Writer):
+    """``executemany`` готовых кортежей без построения моделей."""
+
+    def write(self, model, columns, rows):
+        fields = [model._meta.get_field(name) for name in columns]
+        self.sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(
+                connection.ops.quote_name(field.column) for field in fields
+            ),
+            ', '.join(['%s'] * len(fields)),
+        )
+        self.dates = [
+            position for position, field in enumerate(fields)
+            if field.get_internal_type() == 'DateTimeField'
+        ]
+        if connection.vendor != 'sqlite':
+            return super().write(model, columns, rows)
+        # Страничный кэш SQLite по умолчанию — 2 МБ: индексы большой
+        # таблицы в него не влезают, и каждая вставка читает диск.
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            previous = cursor.fetchone()[0]
+            cursor.execute(f'PRAGMA cache_size = {SQLITE_CACHE_SIZE}')
+        try:
+            return super().write(model, columns, rows)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA cache_size = {previous}')
+
+    def prepare(self, batch):
+        if not self.dates:
+            return batch
+        adapt = connection.ops.adapt_datetimefield_value
+        batch = [list(row) for row in batch]
+        for row in batch:
+            for position in self.dates:
+                row[position] = adapt(row[position])
+        return batch
+
+    def write_batch(self, model, columns, batch):
+        with connection.cursor() as cursor:
+            cursor.executemany(self.sql, batch)
+
+
+class CopyWriter(Writer):
+    """``COPY ... FROM STDIN`` на PostgreSQL — быстрее любого INSERT."""
+
+    ESCAPES = str.maketrans({
+        '\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r',
+    })
+
+    def write(self, model, columns, rows):
+        fields = [model._meta.get_field(name) for name in columns]
+        self.sql = 'COPY {} ({}) FROM STDIN'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(
+                connection.ops.quote_name(field.column) for field in fields
+            ),
+        )
+        return super().write(model, columns, rows)
+
+    def format(self, value):
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        return str(value).translate(self.ESCAPES)
+
+    def write_batch(self, model, columns, batch):
+        buffer = io.StringIO()
+        for row in batch:
+            buffer.write('\t'.join(map(self.format, row)))
+            buffer.write('\n')
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(self.sql, buffer)
+
+
+WRITERS = {
+    'bulk': BulkCreateWriter,
+    'insert': InsertWriter,
+    'copy': CopyWriter,
+}
+
+
+def default_writer():
+    return 'copy' if connection.vendor == 'postgresql' else 'insert'
+
+
+class Zipf:
+    """Случайный выбор номера 0..n-1 с весом 1 / (номер + 1) ** s."""
+
+    def __init__(self, n, s=1.0):
+        self.cumulative = list(itertools.accumulate(
+            1 / (rank + 1) ** s for rank in range(n)
+        ))
+
+    def __call__(self, rng):
+        return bisect(self.cumulative, rng.random() * self.cumulative[-1])
+
+
+class Generator:
+    def __init__(self, posts, seed=0, log=None, writer=None, **sizes):
+        self.sizes = scale(posts)
+        self.sizes.update(
+            (name, size) for name, size in sizes.items() if size is not None
+        )
+        self.seed = seed
+        self.log = log or (lambda message: None)
+        self.writer = writer or WRITERS[default_writer()]()
+        self.rows = 0
+        self.corpus = self.rng('corpus').choices(WORDS, k=CORPUS_SIZE)
+
+    def rng(self, table):
+        # Отдельный генератор на таблицу: данные одной таблицы не
+        # зависят от того, сколько строк сгенерировано в другой.
+        return random.Random(f'{self.seed}:{table}')
+
+    def text(self, rng, low, high):
+        # Срез заранее перемешанного потока слов в разы дешевле, чем
+        # выбирать каждое слово отдельно, а тексты так же разнообразны.
+        start = rng.randrange(CORPUS_SIZE - high)
+        return ' '.join(self.corpus[start:start + rng.randint(low, high)])
+
+    def moments(self, rng, count):
+        """Возрастающие даты за ``PERIOD``, как у живой ленты.
+
+        Порядок вставки совпадает с порядком индексов по дате, поэтому
+        B-деревья растут с края, а не перестраиваются в случайных местах.
+        """
+        step = PERIOD / max(count, 1)
+        start = EPOCH - PERIOD
+        for number in range(count):
+            yield start + step * (number + rng.random())
+
+    def insert(self, model, columns, rows):
+        started = time.perf_counter()
+        with transaction.atomic():
+            written = self.writer.write(model, columns, rows)
+        elapsed = time.perf_counter() - started
+        self.rows += written
+        self.log(
+            f'{model.__name__}: {written} строк за {elapsed:.1f} с, '
+            f'{written / elapsed if elapsed else 0:.0f} строк/с'
+        )
+        return written
+
+    def users(self):
+        joined = EPOCH - PERIOD
+        for number in range(self.sizes['users']):
+            yield (
+                f'{USERNAME_PREFIX}{number:07d}', UNUSABLE_PASSWORD_PREFIX,
+                '', '', '', False, False, True, joined,
+            )
+
+    def groups(self):
+        rng = self.rng('groups')
+        for number in range(self.sizes['groups']):
+            yield (
+                f'Группа {number}', f'{GROUP_PREFIX}{number}',
+                self.text(rng, 5, 20), 0,
+            )
+
+    def posts(self, user_ids, group_ids):
+        rng = self.rng('posts')
+        authors = Zipf(len(user_ids), s=0.8)
+        for moment in self.moments(rng, self.sizes['posts']):
+            yield (
+                self.text(rng, 5, 60),
+                user_ids[authors(rng)],
+                rng.choice(group_ids) if rng.random() < 0.6 else None,
+                moment,
+                '',
+                0,
+            )
+
+    def comments(self, user_ids, first_post, last_post):
+        rng = self.rng('comments')
+        for moment in self.moments(rng, self.sizes['comments']):
+            yield (
+                rng.randint(first_post, last_post),
+                rng.choice(user_ids),
+                self.text(rng, 3, 30),
+                moment,
+                '',
+            )
+
+    def follows(self, user_ids):
+        """Подписки: число на пользователя и выбор авторов — степенные."""
+        rng = self.rng('follows')
+        authors = Zipf(len(user_ids))
+        average = self.sizes['follows'] / len(user_ids)
+        for user_id in user_ids:
+            wanted = min(
+                len(user_ids) - 1,
+                int(rng.paretovariate(2) * average / 2),
+            )
+            followed = set()
+            for _ in range(wanted * 3):
+                if len(followed) >= wanted:
+                    break
+                author_id = user_ids[authors(rng)]
+                if author_id != user_id:
+                    followed.add(author_id)
+            for author_id in sorted(followed):
+                yield user_id, author_id
+
+    def run(self, readers=50):
+        """Заполняет базу и возвращает id читателей с лентами подписок."""
+        started = time.perf_counter()
+        self.insert(User, USER_COLUMNS, self.users())
+        user_ids = list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        self.insert(Group, GROUP_COLUMNS, self.groups())
+        group_ids = list(
+            Group.objects.filter(slug__startswith=GROUP_PREFIX)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        previous = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        with search.deferred_index():
+            self.insert(Post, POST_COLUMNS, self.posts(user_ids, group_ids))
+            indexed = time.perf_counter()
+        self.log(f'Поисковый индекс: {time.perf_counter() - indexed:.1f} с')
+        # Новые посты идут подряд после прежнего максимума, но не
+        # обязательно с него: счётчик id не сбрасывается при удалении.
+        bounds = Post.objects.filter(pk__gt=previous).aggregate(
+            first=Min('pk'), last=Max('pk')
+        )
+        if self.sizes['comments'] and bounds['last']:
+            self.insert(Comment, COMMENT_COLUMNS, self.comments(
+                user_ids, bounds['first'], bounds['last']
+            ))
+        self.insert(Follow, FOLLOW_COLUMNS, self.follows(user_ids))
+        elapsed = time.perf_counter() - started
+        self.log(
+            f'Всего: {self.rows} строк за {elapsed:.1f} с, '
+            f'{self.rows / elapsed:.0f} строк/с'
+        )
+        self.log(f'Пересчитано счётчиков: {counters.reconcile()}')
+        cache.clear()
+        return self.build_timelines(user_ids, readers)
+
+    def build_timelines(self, user_ids, readers):
+        """Ленты подписок для ``readers`` случайных читателей.
+
+        Массовая вставка обходит сигналы, поэтому ленты не заполнены.
+        Строить их для всех пользователей большого набора слишком
+        долго, а нагрузочному тесту достаточно ограниченного круга
+        читателей, от имени которых открывается ``follow_index``.
+        """
+        rng = self.rng('readers')
+        chosen = sorted(rng.sample(user_ids, min(readers, len(user_ids))))
+        follows = Follow.objects.filter(user_id__in=chosen)
+        for user_id, author_id in follows.values_list('user_id', 'author_id'):
+            timeline.backfill(user_id, author_id)
+        self.log(f'Лент подписок построено: {len(chosen)}')
+        return chosen
@@ -0,0 +1,118 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.datadump import imported
+from posts import cache as fragments
+from posts import counters, thumbnails, timeline
+from posts.models import Comment, Follow, Group, Post
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.add_user(instance.author_id, posts_count=1)
+        counters.add_group(instance.group_id, 1)
+    elif instance.group_id != instance.initial_group_id:
+        counters.add_group(instance.initial_group_id, -1)
+        counters.add_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.add_user(instance.author_id, posts_count=-1)
+    counters.add_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.add_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.add_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.add_user(instance.author_id, followers_count=1)
+        counters.add_user(instance.user_id, following_count=1)
+        timeline.followers_changed(instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.add_user(instance.author_id, followers_count=-1)
+    counters.add_user(instance.user_id, following_count=-1)
+    timeline.followers_changed(instance.author_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_fragments(sender, instance, **kwargs):
+    fragments.bump(
+        'posts',
+        f'author:{instance.author_id}',
+        f'group:{instance.group_id}',
+        f'group:{instance.initial_group_id}',
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_fragments(sender, instance, **kwargs):
+    post = Post.objects.filter(pk=instance.post_id).values(
+        'author_id', 'group_id'
+    ).first()
+    scopes = ['posts']
+    if post:
+        scopes += [f'author:{post["author_id"]}', f'group:{post["group_id"]}']
+    fragments.bump(*scopes)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_fragments(sender, instance, **kwargs):
+    fragments.bump('posts', f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_fragments(sender, instance, **kwargs):
+    fragments.bump('follows', f'follow:{instance.user_id}')
+
+
+@receiver(post_save, sender=Post)
+def enqueue_thumbnail(sender, instance, created, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    if created or instance.image.name != instance.initial_image:
+        thumbnails.enqueue(instance)
+
+
+@receiver(imported)
+def rebuild_after_import(sender, **kwargs):
+    counters.reconcile()
+    timeline.rebuild()
+    fragments.bump(fragments.GENERATION)
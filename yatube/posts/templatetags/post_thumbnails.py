@@ -0,0 +1,20 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Готовая миниатюра картинки поста или ``None``."""
+    if hasattr(post, 'prefetched_thumbnail'):
+        return post.prefetched_thumbnail
+    return thumbnails.lookup(post.image)
+
+
+@register.simple_tag
+def prefetch_thumbnails(page_obj):
+    """Разрешает миниатюры всей страницы до цикла по постам."""
+    thumbnails.prefetch(page_obj)
+    return ''
@@ -0,0 +1,114 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='тестовое описание группы'
+        )
+        cls.other_group = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test-slug-2',
+            description='тестовое описание группы 2'
+        )
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Создание, перенос и удаление поста меняют счётчики."""
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Новый пост', 'group': self.group.pk},
+        )
+        post = Post.objects.get()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Новый пост', 'group': self.other_group.pk},
+        )
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+        post.refresh_from_db()
+        post.delete()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_comment_counter(self):
+        """Комментарий увеличивает счётчик поста."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        Comment.objects.get().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обоих пользователей."""
+        url_kwargs = {'username': self.author.username}
+        self.reader_client.get(
+            reverse('posts:profile_follow', kwargs=url_kwargs)
+        )
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', kwargs=url_kwargs)
+        )
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        """reconcile_counters чинит счётчики после bulk_create."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=self.author, group=self.group)
+            for number in range(3)
+        )
+        post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.reader, text='Комментарий')
+            for _ in range(2)
+        )
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)]
+        )
+        call_command('reconcile_counters', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 3)
+        self.assertEqual(
+            Post.objects.get(pk=post.pk).comments_count, 2
+        )
+        self.assertEqual(self.stats(self.author).posts_count, 3)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
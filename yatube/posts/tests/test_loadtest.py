@@ -0,0 +1,123 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TransactionTestCase
+
+from core.loadtest import compare, percentile
+from posts.models import Comment, Follow, Post, TimelineEntry, UserStats
+from posts.search import search
+from posts.seeding import Generator
+
+
+class SeedingTests(SimpleTestCase):
+    def test_generator_is_deterministic(self):
+        """Одинаковый seed даёт одинаковые посты и подписки."""
+        def rows(seed):
+            generator = Generator(200, seed=seed)
+            user_ids = list(range(1, generator.sizes['users'] + 1))
+            return (
+                list(generator.posts(user_ids, [1, 2, 3])),
+                list(generator.follows(user_ids)),
+            )
+
+        self.assertEqual(rows(1), rows(1))
+        self.assertNotEqual(rows(1), rows(2))
+
+    def test_follow_graph_is_skewed(self):
+        """Самый популярный автор собирает заметную долю подписчиков."""
+        generator = Generator(20000)
+        user_ids = list(range(generator.sizes['users']))
+        followers = {}
+        for _, author_id in generator.follows(user_ids):
+            followers[author_id] = followers.get(author_id, 0) + 1
+        ranked = sorted(followers.values(), reverse=True)
+        self.assertGreater(ranked[0], 20 * ranked[len(ranked) // 2])
+
+    def test_percentile(self):
+        """Перцентиль по методу ближайшего ранга."""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertIsNone(percentile([], 50))
+
+
+class LoadTestCommandTests(TransactionTestCase):
+    def test_build_and_run(self):
+        """Команда заполняет базу, гоняет страницы и пишет JSON."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        output = os.path.join(directory, 'result.json')
+        call_command(
+            'loadtest', '--build', '300', '--requests', '10',
+            '--concurrency', '2', '--warmup', '1', '--output', output,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertTrue(UserStats.objects.filter(posts_count__gt=0).exists())
+        with open(output, encoding='utf-8') as source:
+            result = json.load(source)
+        self.assertEqual(
+            set(result['endpoints']),
+            {'index', 'group_posts', 'profile', 'post_detail',
+             'follow_index'},
+        )
+        for name, summary in result['endpoints'].items():
+            with self.subTest(name=name):
+                self.assertEqual(summary['requests'], 10)
+                self.assertEqual(summary['errors'], 0)
+                self.assertGreater(summary['queries_max'], 0)
+        rows = compare(result, result)
+        self.assertTrue(all(change in (None, 0) for *_, change in rows))
+
+
+class SeedCommandTests(TransactionTestCase):
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('pk').values_list(
+                'text', 'author__username', 'group__slug', 'pub_date',
+                'comments_count',
+            )),
+            list(Comment.objects.order_by('pk').values_list(
+                'post__text', 'text', 'created'
+            )),
+            list(Follow.objects.order_by('pk').values_list(
+                'user__username', 'author__username'
+            )),
+        )
+
+    def test_methods_write_identical_data(self):
+        """bulk_create и executemany пишут одни и те же строки."""
+        snapshots = []
+        for method in ('bulk', 'insert'):
+            call_command(
+                'seed', '300', '--method', method, '--readers', '5',
+                stdout=StringIO(),
+            )
+            snapshots.append(self.snapshot())
+            call_command('flush', interactive=False, verbosity=0)
+        self.assertEqual(snapshots[0], snapshots[1])
+        posts, comments, follows = snapshots[0]
+        self.assertEqual(len(posts), 300)
+        self.assertEqual(len(comments), 150)
+        self.assertTrue(follows)
+
+    def test_seeded_posts_are_searchable(self):
+        """Посты, вставленные в обход триггера, попадают в индекс."""
+        call_command('seed', '300', '--readers', '5', stdout=StringIO())
+        self.assertTrue(search('кофе').exists())
+        self.assertEqual(
+            search('кофе').count(),
+            Post.objects.filter(text__contains='кофе').count(),
+        )
+
+    def test_refuses_to_seed_twice(self):
+        """Повторный запуск не смешивает наборы данных."""
+        call_command('seed', '100', '--readers', '1', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('seed', '100', stdout=StringIO())
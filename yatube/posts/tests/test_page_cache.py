@@ -0,0 +1,129 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='тестовое описание группы'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+
+    def test_hit_without_queries(self):
+        """Проверка, что повторный запрос не обращается к БД."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.guest_client.get(url)
+                self.assertEqual(first.content, second.content)
+                self.assertEqual(first['ETag'], second['ETag'])
+                self.assertNotIn('sessionid', second.cookies)
+
+    def test_conditional_get(self):
+        """Проверка ответа 304 на If-None-Match и If-Modified-Since."""
+        url = reverse('posts:index')
+        response = self.guest_client.get(url)
+        for header, value in (
+            ('HTTP_IF_NONE_MATCH', response['ETag']),
+            ('HTTP_IF_MODIFIED_SINCE', response['Last-Modified']),
+        ):
+            with self.subTest(header=header):
+                response = self.guest_client.get(url, **{header: value})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_invalidated_by_writes(self):
+        """Проверка, что посты, комментарии, группы и подписки сбрасывают
+        кэш страниц."""
+        reader = User.objects.create_user(username='reader')
+        writes = (
+            lambda: Post.objects.create(
+                text='Новый пост', author=self.user, group=self.group
+            ),
+            lambda: Comment.objects.create(
+                post=self.post, author=self.user, text='Новый комментарий'
+            ),
+            lambda: Group.objects.filter(pk=self.group.pk).first().save(),
+            lambda: Follow.objects.create(user=reader, author=self.user),
+        )
+        for write in writes:
+            for url in self.urls:
+                self.guest_client.get(url)
+            write()
+            for url in self.urls:
+                with self.subTest(url=url):
+                    response = self.guest_client.get(url)
+                    self.assertIsNotNone(response.context)
+
+    def test_shared_page_personal_holes(self):
+        """Проверка, что общая страница получает личные фрагменты
+        каждого пользователя."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        author_client = Client()
+        author_client.force_login(self.user)
+        reader_client = Client(enforce_csrf_checks=True)
+        reader_client.force_login(reader)
+        profile = reverse('posts:profile',
+                          kwargs={'username': self.user.username})
+        detail = reverse('posts:post_detail',
+                         kwargs={'post_id': self.post.id})
+        edit = reverse('posts:post_edit', kwargs={'post_id': self.post.id})
+        unfollow = reverse('posts:profile_unfollow',
+                           kwargs={'username': self.user.username})
+
+        self.guest_client.get(profile)
+        self.guest_client.get(detail)
+        # Страницы уже в кэше: представления не вызываются.
+        response = author_client.get(profile)
+        self.assertTemplateNotUsed(response, 'posts/profile.html')
+        self.assertContains(response, 'Пользователь: auth')
+        self.assertNotContains(response, unfollow)
+        self.assertNotIn('ETag', response)
+        response = author_client.get(detail)
+        self.assertContains(response, edit)
+
+        response = reader_client.get(profile)
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertContains(response, unfollow)
+        response = reader_client.get(detail)
+        self.assertNotContains(response, edit)
+        self.assertNotContains(response, '<!--hole:')
+
+        token = response.cookies['csrftoken'].value
+        response = reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Через закэшированную форму',
+                  'csrfmiddlewaretoken': token},
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_anonymous_holes(self):
+        """Проверка, что анонимы получают заполненные метки."""
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, reverse('users:login'))
+        self.assertNotContains(response, '<!--hole:')
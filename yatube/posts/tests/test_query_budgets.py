@@ -0,0 +1,129 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.testing import Budget, assert_budget, record_queries, url_names
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+# Бюджет каждой страницы при холодном кэше фрагментов. Число запросов
+# не должно зависеть от количества постов и комментариев на странице.
+BUDGETS = {
+    'posts:index': Budget(5),
+    'posts:group_list': Budget(6),
+    'posts:profile': Budget(7),
+    'posts:post_detail': Budget(6),
+    'posts:post_comments': Budget(4),
+    'posts:comment_replies': Budget(4),
+    'posts:post_create': Budget(5),
+    'posts:post_edit': Budget(6),
+    'posts:add_comment': Budget(5),
+    'posts:follow_index': Budget(6),
+    'posts:search': Budget(5),
+    'posts:profile_follow': Budget(6),
+    # Включая проверку, не опустился ли автор под TIMELINE_FANOUT_LIMIT.
+    'posts:profile_unfollow': Budget(11),
+    'users:login': Budget(2),
+    'users:logout': Budget(4),
+    'users:signup': Budget(2),
+    'about:author': Budget(2),
+    'about:tech': Budget(2),
+}
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTests(TestCase):
+    """Каждая страница укладывается в заявленный бюджет запросов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='тестовое описание группы'
+        )
+        for number in range(15):
+            Post.objects.create(
+                text=f'Тестовый пост {number}',
+                author=cls.author if number % 2 else cls.user,
+                group=cls.group,
+                image=SimpleUploadedFile(
+                    name=f'small{number}.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif'
+                ),
+            )
+        cls.post = Post.objects.filter(author=cls.user).first()
+        parent = None
+        for number in range(5):
+            # Корни вперемешку с ответами: ветки грузятся одним запросом.
+            parent = Comment.objects.create(
+                post=cls.post,
+                author=cls.author,
+                text=f'Комментарий {number}',
+                parent=parent if number % 2 else None,
+            )
+        cls.root = Comment.objects.filter(post=cls.post, path='').first()
+        Follow.objects.create(user=cls.user, author=cls.author)
+        call_command('process_thumbnails', stdout=StringIO())
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def kwargs(self, name):
+        return {
+            'posts:group_list': {'slug': self.group.slug},
+            'posts:profile': {'username': self.author.username},
+            'posts:post_detail': {'post_id': self.post.pk},
+            'posts:post_comments': {'post_id': self.post.pk},
+            'posts:comment_replies': {
+                'post_id': self.post.pk, 'comment_id': self.root.pk,
+            },
+            'posts:post_edit': {'post_id': self.post.pk},
+            'posts:add_comment': {'post_id': self.post.pk},
+            'posts:profile_follow': {'username': self.author.username},
+            'posts:profile_unfollow': {'username': self.author.username},
+        }.get(name, {})
+
+    def test_every_url_has_budget(self):
+        """Для каждого маршрута posts, users и about заявлен бюджет."""
+        self.assertEqual(set(BUDGETS), url_names('posts', 'users', 'about'))
+
+    def test_pages_within_budget(self):
+        """Страницы не превышают бюджет запросов и времени в БД."""
+        for name, budget in BUDGETS.items():
+            client = Client()
+            client.force_login(self.user)
+            url = reverse(name, kwargs=self.kwargs(name))
+            if name == 'posts:search':
+                url += '?q=Тестовый'
+            cache.clear()
+            with self.subTest(name=name):
+                with record_queries() as log:
+                    client.get(url)
+                assert_budget(log, budget, name)
@@ -0,0 +1,211 @@
+import re
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Таблицы, за планами запросов к которым следит набор.
+WATCHED_TABLES = re.compile(r'\bposts_\w+')
+# Запросы, где сортировка неизбежна и ограничена по объёму.
+ALLOWED_SORTS = {
+    # Лента подписок с популярными авторами: материализованная лента
+    # объединяется с их постами и сортируется. Обычная лента листается
+    # по индексу timeline_user_feed_idx без сортировки.
+    'follow': re.compile(r'"posts_timelineentry" U0 WHERE U0."user_id"'),
+    # Поиск: порядок по рангу известен только после вычисления
+    # совпадений, сортируются лишь найденные посты.
+    'search': re.compile(r'\bposts_post_fts MATCH\b|ts_rank'),
+    # Ветки ответов: ключ обхода (путь и сегмент id) вычисляется, так
+    # что сортируются ответы корней одной страницы, а в ответ попадает
+    # лишь REPLIES_ON_PAGE из каждой ветки.
+    'threads': re.compile(r"substr\('0123456789abcdefghijklmnopqrstuvwxyz'"),
+}
+
+
+def explain(sql, params):
+    # SET LOCAL действует до конца транзакции, а TestCase держит одну
+    # транзакцию на весь тест. Отменяет настройки только откат к точке
+    # сохранения, поэтому она откатывается и после удачного EXPLAIN.
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # На маленьких данных PostgreSQL и так выбрал бы Seq Scan;
+            # запрет показывает, есть ли у запроса индексный план.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+        else:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        plan = [' '.join(map(str, row)) for row in cursor.fetchall()]
+        transaction.set_rollback(True)
+    return plan
+
+
+def plan_problems(plan, allow_sort=False):
+    """Строки плана с полным перебором таблицы или сортировкой."""
+    problems = []
+    for line in plan:
+        if connection.vendor == 'postgresql':
+            if 'Seq Scan on posts_' in line:
+                problems.append(line)
+            if re.search(r'\bSort\b', line) and not allow_sort:
+                problems.append(line)
+            continue
+        scan = re.search(r'\bSCAN (posts_\w+)(.*)', line)
+        # Таблица FTS5 обращается к своему индексу, только когда её
+        # ведёт MATCH (``:M`` в плане); иначе она перебирается целиком.
+        if scan and (
+            'VIRTUAL TABLE' in scan.group(2) and ':M' not in scan.group(2)
+            or 'INDEX' not in scan.group(2)
+        ):
+            problems.append(line)
+        if 'TEMP B-TREE' in line and not allow_sort:
+            problems.append(line)
+    return problems
+
+
+@unittest.skipUnless(
+    connection.vendor in ('sqlite', 'postgresql'),
+    'Разбор планов написан для SQLite и PostgreSQL',
+)
+class QueryPlanTests(TestCase):
+    """EXPLAIN каждого запроса страниц лент на засеянных данных."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(3)
+        ]
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='тестовое описание группы'
+        )
+        for number in range(30):
+            Post.objects.create(
+                text=f'Пост номер {number}',
+                author=cls.authors[number % 3],
+                group=cls.group if number % 2 else None,
+            )
+        cls.post = Post.objects.first()
+        parent = None
+        for number in range(5):
+            parent = Comment.objects.create(
+                post=cls.post, author=cls.reader,
+                text=f'Комментарий {number}',
+                parent=parent if number % 2 else None,
+            )
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.root = Comment.objects.filter(post=cls.post, path='').first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.authors[0].username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            reverse('posts:comment_replies', kwargs={
+                'post_id': self.post.pk, 'comment_id': self.root.pk,
+            }),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=Пост',
+        )
+
+    def assert_plans_use_indexes(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not WATCHED_TABLES.search(sql):
+                continue
+            # captured_queries хранит SQL с подставленными параметрами.
+            plan = explain(sql, None)
+            allow_sort = any(
+                pattern.search(sql) for pattern in ALLOWED_SORTS.values()
+            )
+            with self.subTest(url=url, sql=sql):
+                self.assertEqual(
+                    plan_problems(plan, allow_sort), [], '\n'.join(plan)
+                )
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы страниц не перебирают таблицы и не сортируют."""
+        for url in self.urls():
+            self.assert_plans_use_indexes(url)
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_cursor_feed_queries_use_indexes(self):
+        """То же для keyset-пагинации, включая глубокие страницы."""
+        for url in self.urls():
+            self.assert_plans_use_indexes(url)
+            page_obj = self.client.get(url).context.get('page_obj')
+            if page_obj is not None and page_obj.has_next():
+                separator = '&' if '?' in url else '?'
+                self.assert_plans_use_indexes(
+                    f'{url}{separator}after={page_obj.next_cursor}'
+                )
+
+    def test_search_matches_once(self):
+        """Ранжированный поиск выполняет MATCH один раз на запрос, без
+        подзапроса для каждой найденной строки."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:search') + '?q=Пост')
+        searched = [
+            query['sql'] for query in queries.captured_queries
+            if ALLOWED_SORTS['search'].search(query['sql'])
+        ]
+        self.assertTrue(searched)
+        for sql in searched:
+            plan = '\n'.join(explain(sql, None))
+            with self.subTest(sql=sql):
+                if connection.vendor == 'postgresql':
+                    self.assertNotIn('SubPlan', plan)
+                    continue
+                self.assertNotIn('CORRELATED', plan)
+                self.assertEqual(plan.count('posts_post_fts'), 1, plan)
+                self.assertIn(
+                    'SEARCH posts_post USING INTEGER PRIMARY KEY', plan
+                )
+
+    def test_admin_search_uses_index(self):
+        """Поиск в списке постов админки идёт по полнотекстовому индексу,
+        без подзапроса, перебирающего таблицу для каждой строки."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        url = reverse('admin:posts_post_changelist') + '?q=Пост'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        searched = [
+            query['sql'] for query in queries.captured_queries
+            if ALLOWED_SORTS['search'].search(query['sql'])
+            or 'LIKE' in query['sql']
+        ]
+        self.assertTrue(searched)
+        for sql in searched:
+            plan = explain(sql, None)
+            with self.subTest(sql=sql):
+                self.assertEqual(
+                    plan_problems(plan, allow_sort=True), [], '\n'.join(plan)
+                )
+                self.assertNotIn('CORRELATED', ' '.join(plan))
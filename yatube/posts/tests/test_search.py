@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post
+from posts.search import deferred_index, search
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth', is_staff=True,
+                                            is_superuser=True)
+        cls.best = Post.objects.create(
+            text='Котики, котики и ещё раз котики', author=cls.user
+        )
+        cls.other = Post.objects.create(
+            text='Один котик среди собак и длинного текста про собак',
+            author=cls.user,
+        )
+        cls.unrelated = Post.objects.create(
+            text='Пост про собак', author=cls.user
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_search_is_ranked(self):
+        """Релевантные посты идут первыми, лишние не попадают."""
+        response = self.client.get(reverse('posts:search'), {'q': 'котик'})
+        self.assertEqual(
+            list(response.context['page_obj']), [self.best, self.other]
+        )
+
+    def test_updates_and_deletes_reach_index(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        self.unrelated.text = 'Теперь и тут котики'
+        self.unrelated.save()
+        self.assertIn(self.unrelated, search('котик'))
+        self.best.delete()
+        self.assertNotIn(self.best, search('котик'))
+
+    def test_special_characters_are_safe(self):
+        """Синтаксис FTS5 в запросе не ломает поиск."""
+        for query in ('"котик', 'котик OR', 'NEAR(', '*', '-'):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    reverse('posts:search'), {'q': query}
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_results_are_cursor_paginated(self):
+        """Результаты поиска листаются курсором без потерь."""
+        Post.objects.bulk_create(
+            Post(text=f'котик номер {number}', author=self.user)
+            for number in range(settings.POSTS_ON_PAGE + 3)
+        )
+        expected = list(search('котик').order_by('-rank', '-id'))
+        first = self.client.get(
+            reverse('posts:search'), {'q': 'котик'}
+        ).context['page_obj']
+        self.assertContains(
+            self.client.get(reverse('posts:search'), {'q': 'котик'}),
+            'q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA&amp;after='
+        )
+        second = self.client.get(
+            reverse('posts:search'),
+            {'q': 'котик', 'after': first.next_cursor},
+        ).context['page_obj']
+        self.assertEqual(list(first) + list(second), expected)
+
+    def test_admin_uses_search_index(self):
+        """Поиск в админке идёт через полнотекстовый индекс."""
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'котик'}
+        )
+        self.assertEqual(
+            set(response.context['cl'].result_list), {self.best, self.other}
+        )
+
+    def test_deferred_index(self):
+        """Посты, вставленные без триггера, индексируются после блока;
+        при ошибке вставка откатывается, а триггер остаётся."""
+        with deferred_index():
+            inserted = Post.objects.create(
+                text='Котик оптом', author=self.user
+            )
+        self.assertIn(inserted, search('котик'))
+        with self.assertRaises(ValueError), deferred_index():
+            Post.objects.create(text='Котик из отката', author=self.user)
+            raise ValueError
+        self.assertFalse(Post.objects.filter(text='Котик из отката').exists())
+        created = Post.objects.create(text='Котик потом', author=self.user)
+        self.assertIn(created, search('котик'))
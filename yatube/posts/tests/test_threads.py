@@ -0,0 +1,145 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import threads
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class ThreadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def reply(self, parent, text):
+        return Comment.objects.create(
+            post=self.post, author=self.user, text=text, parent=parent
+        )
+
+    def test_path_order_matches_id_order(self):
+        """Проверка, что сегменты пути сравниваются как числа."""
+        segments = [threads.encode(pk) for pk in (1, 35, 36, 1295, 10 ** 9)]
+        self.assertEqual(segments, sorted(segments))
+        self.assertEqual(threads.decode(''.join(segments)),
+                         [1, 35, 36, 1295, 10 ** 9])
+
+    @override_settings(COMMENTS_MAX_DEPTH=2)
+    def test_depth_limit(self):
+        """Проверка, что ответы глубже предела встают на предельный уровень."""
+        root = self.reply(None, 'корень')
+        first = self.reply(root, 'ответ')
+        second = self.reply(first, 'ответ на ответ')
+        third = self.reply(second, 'слишком глубоко')
+        self.assertEqual(
+            [comment.depth for comment in (root, first, second, third)],
+            [0, 1, 2, 2]
+        )
+        self.assertEqual(third.parent_id, first.id)
+
+    def test_thread_loads_in_one_query(self):
+        """Проверка, что ветки страницы загружаются одним запросом."""
+        roots = [self.reply(None, f'корень {number}') for number in range(2)]
+        first = self.reply(roots[0], 'первый ответ')
+        nested = self.reply(first, 'ответ на первый')
+        second = self.reply(roots[0], 'второй ответ')
+        other = self.reply(roots[1], 'ответ второму корню')
+        roots = list(Comment.objects.filter(pk__in=[r.pk for r in roots])
+                     .order_by('pk'))
+        with self.assertNumQueries(1):
+            threads.attach_replies(roots)
+        self.assertEqual(roots[0].thread, [first, nested, second])
+        self.assertEqual(roots[1].thread, [other])
+
+    def test_reply_via_form(self):
+        """Проверка, что ответ из формы попадает в ветку под комментарием."""
+        root = self.reply(None, 'корень')
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'ответ из формы', 'parent': root.id},
+        )
+        reply = Comment.objects.get(text='ответ из формы')
+        self.assertEqual(reply.parent, root)
+        self.assertEqual(reply.path, threads.encode(root.id))
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        self.assertEqual(list(response.context['comments']), [root])
+        self.assertEqual(response.context['comments'][0].thread, [reply])
+        self.assertContains(response, 'ms-1')
+
+    def test_reply_to_other_post_rejected(self):
+        """Проверка, что нельзя ответить на комментарий другого поста."""
+        other = Post.objects.create(text='Другой пост', author=self.user)
+        foreign = Comment.objects.create(
+            post=other, author=self.user, text='чужой'
+        )
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'ответ не туда', 'parent': foreign.id},
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(
+            Comment.objects.filter(text='ответ не туда').exists()
+        )
+
+    @override_settings(REPLIES_ON_PAGE=4)
+    def test_huge_thread_is_bounded(self):
+        """Проверка, что большая ветка выводится частями, а продолжение
+        идёт с места остановки в порядке обхода."""
+        root = self.reply(None, 'корень')
+        expected = []
+        for number in range(5):
+            branch = self.reply(root, f'ветка {number}')
+            expected.append(branch)
+            for inner in range(2):
+                expected.append(self.reply(branch, f'ответ {number}.{inner}'))
+        self.assertEqual(
+            sorted(expected, key=threads.key), expected
+        )
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        thread = response.context['comments'][0].thread
+        self.assertEqual(thread, expected[:4])
+        self.assertContains(response, 'media mb-4 ms-1"', count=2)
+        self.assertContains(response, 'media mb-4 ms-2"', count=2)
+        url = reverse('posts:comment_replies', kwargs={
+            'post_id': self.post.id, 'comment_id': root.id,
+        })
+        self.assertContains(response, f'{url}?after=')
+        shown = list(thread)
+        after = response.context['comments'][0].replies_after
+        while after:
+            response = self.authorized_client.get(url, {'after': after})
+            self.assertLessEqual(len(response.context['replies']), 4)
+            shown += response.context['replies']
+            after = response.context['replies_after']
+        self.assertEqual(shown, expected)
+
+    def test_replies_of_reply_not_found(self):
+        """Проверка, что продолжение есть только у корней своего поста,
+        а неверный ключ открывает ветку с начала."""
+        root = self.reply(None, 'корень')
+        reply = self.reply(root, 'ответ')
+        for comment_id in (reply.id, root.id + 100):
+            response = self.authorized_client.get(
+                reverse('posts:comment_replies', kwargs={
+                    'post_id': self.post.id, 'comment_id': comment_id,
+                })
+            )
+            self.assertEqual(response.status_code, 404)
+        response = self.authorized_client.get(
+            reverse('posts:comment_replies', kwargs={
+                'post_id': self.post.id, 'comment_id': root.id,
+            }),
+            {'after': "x' OR 1"},
+        )
+        self.assertEqual(response.context['replies'], [reply])
@@ -0,0 +1,125 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import thumbnails
+from posts.models import Post, ThumbnailJob
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailQueueTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self, name='small.gif'):
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile(
+                    name=name, content=SMALL_GIF, content_type='image/gif'
+                ),
+            },
+        )
+        return Post.objects.latest('pk')
+
+    def test_post_create_enqueues_and_renders_placeholder(self):
+        """Новая картинка ставится в очередь, страница рисует заглушку."""
+        post = self.create_post()
+        self.assertEqual(post.thumbnail_job.status, ThumbnailJob.PENDING)
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, 'Изображение обрабатывается')
+        self.assertIsNone(thumbnails.lookup(post.image))
+
+    def test_worker_generates_thumbnail(self):
+        """Воркер готовит миниатюру, и страница выводит картинку."""
+        post = self.create_post()
+        self.authorized_client.get(reverse('posts:index'))
+        call_command('process_thumbnails', stdout=StringIO())
+        post.thumbnail_job.refresh_from_db()
+        self.assertEqual(post.thumbnail_job.status, ThumbnailJob.READY)
+        thumbnail = thumbnails.lookup(post.image)
+        self.assertIsNotNone(thumbnail)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, 'Изображение обрабатывается')
+
+    def test_edit_without_new_image_keeps_job(self):
+        """Правка текста не ставит картинку в очередь повторно."""
+        post = self.create_post()
+        call_command('process_thumbnails', stdout=StringIO())
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Новый текст'},
+        )
+        post.thumbnail_job.refresh_from_db()
+        self.assertEqual(post.thumbnail_job.status, ThumbnailJob.READY)
+
+    def test_claimed_old_job_not_requeued(self):
+        """Задача, долго ждавшая в очереди, после захвата не считается
+        брошенной."""
+        post = self.create_post()
+        ThumbnailJob.objects.filter(post=post).update(
+            updated=timezone.now() - thumbnails.PROCESSING_TIMEOUT * 2
+        )
+        self.assertEqual(thumbnails.claim(1), [post.thumbnail_job.pk])
+        self.assertEqual(thumbnails.requeue_stale(), 0)
+        post.thumbnail_job.refresh_from_db()
+        self.assertEqual(post.thumbnail_job.status, ThumbnailJob.PROCESSING)
+        self.assertEqual(post.thumbnail_job.attempts, 1)
+
+    def test_feed_prefetches_thumbnails_in_one_query(self):
+        """Лента разрешает миниатюры всей страницы одним запросом."""
+        posts = [self.create_post(f'small{number}.gif') for number in range(3)]
+        call_command('process_thumbnails', stdout=StringIO())
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        for post in posts:
+            with self.subTest(post=post.pk):
+                self.assertContains(
+                    response, thumbnails.lookup(post.image).url
+                )
@@ -0,0 +1,123 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.old_post = Post.objects.create(
+            text='пост до подписки',
+            author=cls.author,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def follow_feed(self):
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка заполняет ленту, отписка очищает её."""
+        self.follower_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author.username})
+        )
+        self.assertEqual(self.follow_feed(), [self.old_post])
+        self.follower_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author.username})
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower).exists()
+        )
+        self.assertEqual(self.follow_feed(), [])
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост записывается в ленты подписчиков."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='новый пост', author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.follower, post=post
+            ).exists()
+        )
+        self.assertEqual(self.follow_feed(), [post, self.old_post])
+
+    @override_settings(TIMELINE_SIZE=2)
+    def test_timeline_is_capped(self):
+        """trim_timelines оставляет в лентах TIMELINE_SIZE последних
+        постов."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        posts = [
+            Post.objects.create(text=f'пост {number}', author=self.author)
+            for number in range(3)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            call_command('trim_timelines', stdout=StringIO())
+        self.assertEqual(len(queries), 1)
+        for user in (self.follower, other):
+            self.assertEqual(
+                list(
+                    TimelineEntry.objects.filter(user=user)
+                    .order_by('-pub_date').values_list('post', flat=True)
+                ),
+                [posts[2].pk, posts[1].pk],
+            )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_heavy_author_is_merged_on_read(self):
+        """Посты популярного автора подмешиваются при чтении."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='новый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_feed(), [post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_becoming_heavy(self):
+        """Автор, перешедший границу, сразу подмешивается при чтении."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertEqual(timeline.heavy_authors(), set())
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(text='новый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.follow_feed(), [post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_leaving_heavy_set_is_materialized(self):
+        """Посты, написанные автором, пока он был популярным, остаются в
+        лентах, когда подписчиков становится меньше границы."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(text='новый пост', author=self.author)
+        Follow.objects.filter(user=other).delete()
+        self.assertNotIn(self.author.pk, timeline.heavy_authors())
+        self.assertEqual(self.follow_feed(), [post, self.old_post])
+        self.assertEqual(
+            set(
+                TimelineEntry.objects.filter(user=self.follower)
+                .values_list('post', flat=True)
+            ),
+            {post.pk, self.old_post.pk},
+        )
@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase, Client
 from django.urls import reverse
 
@@ -26,6 +27,8 @@ class PostURLTests(TestCase):
         )
 
     def setUp(self):
+        # Закэшированные страницы не рендерят шаблоны заново.
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client_post_author = Client()
         self.authorized_client_post_author.force_login(self.user_author)
@@ -1,11 +1,12 @@
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 
-from posts.models import Group, Post, Follow
+from core.paginator import CursorPaginator
+from posts.models import Comment, Group, Post, Follow
 from posts.forms import PostForm
 
 User = get_user_model()
@@ -52,6 +53,8 @@ class PostPagesTests(TestCase):
         )
 
     def setUp(self):
+        # Закэшированные страницы не рендерят шаблоны заново.
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -148,20 +151,38 @@ class PostPagesTests(TestCase):
         self.assertNotIn(self.post, response.context['page_obj'])
 
     def test_cache_index(self):
-        """Проверка хранения и очищения кэша для index."""
+        """Проверка хранения и инвалидации кэша для index."""
         response = self.authorized_client.get(reverse('posts:index'))
-        content_before_post_create = response.content
+        content_before_update = response.content
+        # update() не посылает сигналов: фрагмент остаётся в кэше.
+        Post.objects.filter(pk=self.post.pk).update(text='изменённый текст')
+        second_response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(content_before_update, second_response.content)
         Post.objects.create(
             text='test_new_post',
             author=self.user,
         )
-        second_response = self.authorized_client.get(reverse('posts:index'))
-        content_after_post_create = second_response.content
-        self.assertEqual(content_before_post_create, content_after_post_create)
-        cache.clear()
         third_response = self.authorized_client.get(reverse('posts:index'))
-        content_cache_cleared = third_response.content
-        self.assertNotEqual(content_after_post_create, content_cache_cleared)
+        self.assertIn('test_new_post', third_response.content.decode())
+        self.assertIn('изменённый текст', third_response.content.decode())
+
+    def test_fragments_invalidated_by_comment(self):
+        """Новый комментарий инвалидирует фрагменты группы и профиля."""
+        url_list = (
+            reverse('posts:group_list',
+                    kwargs={'slug': self.group_with_post.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username}),
+        )
+        for url in url_list:
+            self.authorized_client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='комментарий'
+        )
+        for url in url_list:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertIn('Комментариев: 1', response.content.decode())
 
     def test_follow(self):
         """Проверка подписки на пользователя."""
@@ -297,3 +318,160 @@ class PaginatorViewsTest(TestCase):
             ),
             get_n_page_posts_number(self.POSTS_NUMBER)
         )
+
+
+@override_settings(CURSOR_PAGINATION=True)
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='тестовое описание группы'
+        )
+        cls.POSTS_NUMBER = 23
+        Post.objects.bulk_create(
+            [
+                Post(
+                    text=f'Тестовые посты номер {post}',
+                    author=cls.user,
+                    group=cls.group
+                )
+                for post in range(cls.POSTS_NUMBER)
+            ]
+        )
+        cls.expected_ids = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_cursor_walks_forward_and_back(self):
+        """Курсоры обходят ленту без пропусков в обе стороны."""
+        url_list = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.user.username},
+            ),
+        )
+        for url in url_list:
+            with self.subTest(url=url):
+                pages = []
+                query = ''
+                while True:
+                    page_obj = self.guest_client.get(
+                        url + query
+                    ).context['page_obj']
+                    pages.append([post.id for post in page_obj])
+                    if not page_obj.has_next():
+                        break
+                    query = f'?after={page_obj.next_cursor}'
+                self.assertEqual(sum(pages, []), self.expected_ids)
+                self.assertEqual(
+                    [len(page) for page in pages],
+                    [settings.POSTS_ON_PAGE, settings.POSTS_ON_PAGE, 3]
+                )
+                self.assertTrue(page_obj.has_previous())
+                previous = self.guest_client.get(
+                    f'{url}?before={page_obj.previous_cursor}'
+                ).context['page_obj']
+                self.assertEqual([post.id for post in previous], pages[1])
+
+    def test_empty_boundary_page(self):
+        """Пустая страница за краем ленты не ссылается на курсор None."""
+        paginator = CursorPaginator(Post.objects.all(), settings.POSTS_ON_PAGE)
+        newest = Post.objects.get(pk=self.expected_ids[0])
+        oldest = Post.objects.get(pk=self.expected_ids[-1])
+        for query in (
+            f'?before={paginator.encode_cursor(newest)}',
+            f'?after={paginator.encode_cursor(oldest)}',
+        ):
+            with self.subTest(query=query):
+                response = self.guest_client.get(
+                    reverse('posts:index') + query
+                )
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), 0)
+                self.assertFalse(page_obj.has_next())
+                self.assertFalse(page_obj.has_previous())
+                self.assertNotContains(response, '=None')
+
+    def test_invalid_cursor_opens_first_page(self):
+        """Битый курсор открывает первую страницу."""
+        response = self.guest_client.get(
+            reverse('posts:index') + '?after=not-a-cursor'
+        )
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            self.expected_ids[:settings.POSTS_ON_PAGE]
+        )
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Пост с обсуждением',
+                                       author=cls.user)
+        cls.COMMENTS_NUMBER = 45
+        Comment.objects.bulk_create(
+            [
+                Comment(post=cls.post, author=cls.user,
+                        text=f'Комментарий номер {number}')
+                for number in range(cls.COMMENTS_NUMBER)
+            ]
+        )
+        cls.expected_ids = list(
+            cls.post.comments.order_by('-created', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_post_detail_shows_first_page(self):
+        """Проверка, что пост показывает только первую страницу."""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.id for comment in comments],
+            self.expected_ids[:settings.COMMENTS_ON_PAGE]
+        )
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, comments.next_cursor)
+
+    def test_fragment_walks_all_comments(self):
+        """Проверка, что фрагменты отдают остальные комментарии без поста."""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        pages = []
+        query = ''
+        while True:
+            response = self.guest_client.get(url + query)
+            self.assertNotContains(response, self.post.text)
+            comments = response.context['comments']
+            pages.append([comment.id for comment in comments])
+            if not comments.has_next():
+                break
+            query = f'?after={comments.next_cursor}'
+        self.assertEqual(sum(pages, []), self.expected_ids)
+        self.assertEqual(
+            [len(page) for page in pages],
+            [settings.COMMENTS_ON_PAGE, settings.COMMENTS_ON_PAGE, 5]
+        )
+
+    def test_fragment_of_missing_post(self):
+        """Проверка, что фрагмент несуществующего поста отдаёт 404."""
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
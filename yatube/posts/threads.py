@@ -0,0 +1,146 @@
+"""Ветки ответов на комментарии.
+
+У ответа хранится ``path`` — идентификаторы всех предков от корневого
+комментария, каждый base36 фиксированной ширины. У корневых
+комментариев путь пустой. Все ответы ветки начинаются с сегмента
+корня, поэтому её выбирает один диапазонный запрос по индексу
+``(post, path)``, без рекурсивных запросов по узлам.
+
+Порядок обхода ветки задаёт ключ ``path + encode(pk)``: потомки идут
+сразу за предком, ответы на один комментарий — по порядку создания.
+Ключ считается и в SQL, поэтому странице достаются только первые
+``REPLIES_ON_PAGE`` ответов каждой ветки, а остальные догружаются
+кусками с продолжением после ключа последнего показанного ответа.
+"""
+import re
+
+from django.conf import settings
+from django.db.models import Q
+
+SEGMENT = 8
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+# Символ после всех цифр base36: верхняя граница диапазона ветки.
+PATH_END = '~'
+MAX_PATH_LENGTH = 255
+KEY = re.compile(r'(?:[0-9a-z]{%d})+' % SEGMENT)
+
+
+def _key_sql(table):
+    """Ключ обхода в SQL: сегмент id собирается из цифр base36."""
+    digits = ' || '.join(
+        f"substr('{DIGITS}', ({table}.id / {36 ** power}) %% 36 + 1, 1)"
+        for power in range(SEGMENT - 1, -1, -1)
+    )
+    return f'{table}.path || {digits}'
+
+
+# Первые ``limit`` + 1 ответов каждой ветки: лишний показывает, что
+# ветка продолжается.
+FIRST_REPLIES_SQL = (
+    '{table}.id IN ('
+    ' SELECT id FROM ('
+    '  SELECT {table}.id, ROW_NUMBER() OVER ('
+    '   PARTITION BY substr({table}.path, 1, {segment}) ORDER BY {key}'
+    '  ) AS position FROM {table}'
+    '  WHERE {table}.post_id = %s AND ({ranges})'
+    ' ) ranked WHERE position <= %s'
+    ')'
+)
+
+
+def encode(pk):
+    digits = ''
+    while pk:
+        pk, digit = divmod(pk, 36)
+        digits = DIGITS[digit] + digits
+    return digits.rjust(SEGMENT, '0')
+
+
+def decode(path):
+    return [
+        int(path[start:start + SEGMENT], 36)
+        for start in range(0, len(path), SEGMENT)
+    ]
+
+
+def depth(path):
+    return len(path) // SEGMENT
+
+
+def reply_path(parent):
+    """Путь ответа на ``parent`` и его фактический родитель.
+
+    Ответы глубже ``COMMENTS_MAX_DEPTH`` становятся ответами на предка
+    на предельной глубине, так что ветка не растёт вглубь бесконечно.
+    """
+    ancestors = decode(parent.path) + [parent.pk]
+    ancestors = ancestors[:settings.COMMENTS_MAX_DEPTH]
+    return ''.join(map(encode, ancestors)), ancestors[-1]
+
+
+def key(comment):
+    return comment.path + encode(comment.pk)
+
+
+def subtree(node):
+    """Условие «все потомки ``node``» диапазоном строк."""
+    prefix = key(node)
+    return Q(path__gte=prefix, path__lt=prefix + PATH_END)
+
+
+def attach_replies(roots, limit=None):
+    """Одним запросом загружает начало веток ``roots``.
+
+    Каждому корню проставляется ``thread`` — до ``limit`` ответов в
+    порядке обхода и ``replies_after`` — ключ последнего из них, если
+    ветка продолжается, иначе None.
+    """
+    limit = limit or settings.REPLIES_ON_PAGE
+    roots = list(roots)
+    by_segment = {}
+    for root in roots:
+        root.thread, root.replies_after = [], None
+        by_segment[encode(root.pk)] = root
+    if not roots:
+        return roots
+    model = type(roots[0])
+    table = model._meta.db_table
+    ranges = []
+    params = [roots[0].post_id]
+    for segment in by_segment:
+        ranges.append(f'({table}.path >= %s AND {table}.path < %s)')
+        params += [segment, segment + PATH_END]
+    replies = model._default_manager.select_related('author').extra(
+        where=[FIRST_REPLIES_SQL.format(
+            table=table, segment=SEGMENT, key=_key_sql(table),
+            ranges=' OR '.join(ranges),
+        )],
+        params=params + [limit + 1],
+    ).order_by()
+    for reply in sorted(replies, key=key):
+        by_segment[reply.path[:SEGMENT]].thread.append(reply)
+    for root in roots:
+        if len(root.thread) > limit:
+            del root.thread[limit:]
+            root.replies_after = key(root.thread[-1])
+    return roots
+
+
+def replies(root, after='', limit=None):
+    """Следующие ответы ветки ``root`` после ключа ``after``.
+
+    Возвращает ответы и ключ для продолжения или None.
+    """
+    limit = limit or settings.REPLIES_ON_PAGE
+    table = type(root)._meta.db_table
+    queryset = type(root)._default_manager.filter(
+        subtree(root), post_id=root.post_id
+    ).select_related('author').extra(select={'thread_key': _key_sql(table)})
+    if after:
+        queryset = queryset.extra(
+            where=[f'{_key_sql(table)} > %s'], params=[after]
+        )
+    page = list(queryset.order_by('thread_key')[:limit + 1])
+    if len(page) > limit:
+        return page[:limit], key(page[limit - 1])
+    return page, None
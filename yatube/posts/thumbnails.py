@@ -0,0 +1,176 @@
+"""Миниатюры картинок постов, которые готовит фоновый воркер.
+
+Шаблоны только ищут готовую миниатюру в KVStore sorl-thumbnail и
+никогда не запускают Pillow внутри запроса: пока миниатюры нет,
+выводится заглушка. Генерацией занимается ``manage.py
+process_thumbnails`` по очереди ``ThumbnailJob``.
+"""
+import datetime
+import time
+
+from django.db.models import F
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from core import metrics, timing
+from posts import cache as fragments
+from posts.models import ThumbnailJob
+
+GEOMETRY = '960x339'
+OPTIONS = {'crop': 'center', 'upscale': True}
+MAX_ATTEMPTS = 3
+# Задача, которую воркер держит дольше, считается брошенной.
+PROCESSING_TIMEOUT = datetime.timedelta(minutes=10)
+
+
+def thumbnail_file(image):
+    """ImageFile миниатюры с тем же именем, что даст ``get_thumbnail``."""
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(OPTIONS)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, GEOMETRY, options)
+    return ImageFile(name, default.storage)
+
+
+def _fetch(keys):
+    """Значения KVStore по ключам: один get_many и один запрос к БД."""
+    kvstore = default.kvstore
+    kv_cache = getattr(kvstore, 'cache', None)
+    found = {}
+    if kv_cache is not None:
+        found = {
+            key: value for key, value in kv_cache.get_many(keys).items()
+            if value is not None and value != EMPTY_VALUE
+        }
+    # Отрицательный ответ из кэша sorl не считаем окончательным:
+    # миниатюру мог записать воркер в другом процессе.
+    missing = [key for key in keys if key not in found]
+    if missing:
+        stored = dict(
+            KVStore.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        if stored and kv_cache is not None:
+            kv_cache.set_many(
+                stored, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+        found.update(stored)
+    return found
+
+
+@timing.measure('thumb')
+def prefetch(posts):
+    """Находит миниатюры всех постов страницы разом.
+
+    Результат кладётся в ``post.prefetched_thumbnail``, откуда его
+    берёт тег ``post_thumbnail``, не обращаясь к KVStore по одному.
+    """
+    keys = {}
+    for post in posts:
+        post.prefetched_thumbnail = None
+        if post.image:
+            keys[post] = add_prefix(thumbnail_file(post.image).key)
+    if not keys:
+        return
+    found = _fetch(list(set(keys.values())))
+    for post, key in keys.items():
+        if found.get(key):
+            post.prefetched_thumbnail = deserialize_image_file(found[key])
+
+
+@timing.measure('thumb')
+def lookup(image):
+    """Готовая миниатюра или ``None``; картинку не обрабатывает."""
+    if not image:
+        return None
+    key = add_prefix(thumbnail_file(image).key)
+    value = _fetch([key]).get(key)
+    if not value:
+        return None
+    return deserialize_image_file(value)
+
+
+def enqueue(post):
+    """Ставит картинку поста в очередь в той же транзакции, что и пост."""
+    ThumbnailJob.objects.update_or_create(
+        post=post,
+        defaults={'status': ThumbnailJob.PENDING, 'attempts': 0, 'error': ''},
+    )
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи упавших воркеров."""
+    return ThumbnailJob.objects.filter(
+        status=ThumbnailJob.PROCESSING,
+        updated__lt=timezone.now() - PROCESSING_TIMEOUT,
+    ).update(status=ThumbnailJob.PENDING)
+
+
+def claim(limit):
+    """Забирает до ``limit`` задач; безопасно для нескольких воркеров."""
+    claimed = []
+    pending = ThumbnailJob.objects.filter(
+        status=ThumbnailJob.PENDING
+    ).order_by('updated').values_list('pk', flat=True)[:limit]
+    for pk in list(pending):
+        # UPDATE с условием на статус — атомарный захват задачи даже
+        # на SQLite, где нет SELECT ... FOR UPDATE SKIP LOCKED.
+        if ThumbnailJob.objects.filter(
+            pk=pk, status=ThumbnailJob.PENDING
+        ).update(
+            status=ThumbnailJob.PROCESSING,
+            attempts=F('attempts') + 1,
+            # update() не трогает auto_now, а по updated requeue_stale
+            # отличает брошенную задачу от взятой только что.
+            updated=timezone.now(),
+        ):
+            claimed.append(pk)
+    return claimed
+
+
+def process(job_pk):
+    """Генерирует миниатюру для задачи; возвращает итоговый статус."""
+    job = ThumbnailJob.objects.select_related('post').get(pk=job_pk)
+    started = time.perf_counter()
+    try:
+        if job.post.image:
+            default.backend.get_thumbnail(job.post.image, GEOMETRY, **OPTIONS)
+            metrics.THUMBNAIL_GENERATION.observe(
+                time.perf_counter() - started
+            )
+            metrics.schedule_flush()
+    except Exception as error:
+        status = (
+            ThumbnailJob.FAILED if job.attempts >= MAX_ATTEMPTS
+            else ThumbnailJob.PENDING
+        )
+        ThumbnailJob.objects.filter(pk=job_pk).update(
+            status=status, error=str(error), updated=timezone.now()
+        )
+        return status
+    ThumbnailJob.objects.filter(
+        pk=job_pk, status=ThumbnailJob.PROCESSING
+    ).update(
+        status=ThumbnailJob.READY, error='', updated=timezone.now()
+    )
+    # В закэшированных фрагментах лент вместо картинки стоит заглушка.
+    fragments.bump(
+        'posts',
+        f'author:{job.post.author_id}',
+        f'group:{job.post.group_id}',
+    )
+    return ThumbnailJob.READY
@@ -0,0 +1,207 @@
+"""Лента подписок с разветвлением при записи (fan-out-on-write).
+
+Новый пост копируется в ``TimelineEntry`` каждого подписчика автора,
+поэтому ``follow_index`` листает готовую ленту по индексу
+``(user, -pub_date, -id)`` вместо соединения ``Post`` с ``Follow``.
+Ленты длиннее ``TIMELINE_SIZE`` записей обрезает периодическая команда
+``trim_timelines``.
+
+Посты авторов, у которых больше ``TIMELINE_FANOUT_LIMIT`` подписчиков,
+не размножаются, а подмешиваются в ленту при чтении. Кто из авторов
+такой, решает только счётчик ``UserStats.followers_count``: запись
+читает его напрямую, чтение — из кэша ``heavy_authors()``, который
+сбрасывается, когда счётчик переходит границу. Автору, вернувшемуся
+под границу, ленты подписчиков достраиваются: его посты, написанные
+после перехода вверх, никуда не копировались.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, Q
+
+from posts.models import Follow, Post, TimelineEntry, UserStats
+
+HEAVY_AUTHORS_CACHE_KEY = 'timeline:heavy_authors'
+HEAVY_AUTHORS_CACHE_TIMEOUT = 60 * 5
+# Порядок ленты по полям TimelineEntry, которые покрывает индекс.
+ORDERING = ('-feed_date', '-feed_entry')
+
+TRIM_SQL = (
+    'DELETE FROM {table} WHERE id IN ('
+    ' SELECT id FROM ('
+    '  SELECT id, ROW_NUMBER() OVER ('
+    '   PARTITION BY user_id ORDER BY pub_date DESC, id DESC'
+    '  ) AS position FROM {table}{where}'
+    ' ) ranked WHERE position > %s'
+    ')'
+)
+MATERIALIZE_SQL = (
+    'INSERT INTO {timeline} (user_id, post_id, pub_date)'
+    ' SELECT follow.user_id, recent.id, recent.pub_date'
+    ' FROM {follow} follow, ('
+    '  SELECT id, pub_date FROM {post} WHERE author_id = %s'
+    '  ORDER BY pub_date DESC, id DESC LIMIT %s'
+    ' ) recent'
+    ' WHERE follow.author_id = %s AND NOT EXISTS ('
+    '  SELECT 1 FROM {timeline} entry'
+    '  WHERE entry.user_id = follow.user_id AND entry.post_id = recent.id'
+    ' )'
+)
+
+
+def heavy_authors():
+    """Авторы, чьи посты подмешиваются в ленты при чтении."""
+    authors = cache.get(HEAVY_AUTHORS_CACHE_KEY)
+    if authors is None:
+        authors = set(
+            UserStats.objects.filter(
+                followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+            ).values_list('user_id', flat=True)
+        )
+        cache.set(
+            HEAVY_AUTHORS_CACHE_KEY, authors, HEAVY_AUTHORS_CACHE_TIMEOUT
+        )
+    return authors
+
+
+def is_heavy(author_id):
+    """То же по текущему счётчику, без кэша: для записи в ленты."""
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def trim(user_ids=None):
+    """Удаляет из лент всё, что не входит в последние TIMELINE_SIZE.
+
+    Один DELETE с оконной функцией; без ``user_ids`` — по всем лентам.
+    """
+    user_ids = None if user_ids is None else list(user_ids)
+    if user_ids == []:
+        return 0
+    where = ''
+    params = []
+    if user_ids is not None:
+        where = ' WHERE user_id IN ({})'.format(
+            ', '.join(['%s'] * len(user_ids))
+        )
+        params = user_ids
+    with connection.cursor() as cursor:
+        cursor.execute(
+            TRIM_SQL.format(table=TimelineEntry._meta.db_table, where=where),
+            params + [settings.TIMELINE_SIZE],
+        )
+        return cursor.rowcount
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_heavy(post.author_id):
+        return
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in Follow.objects.filter(
+                author_id=post.author_id
+            ).values_list('user_id', flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def materialize(author_id):
+    """Копирует последние посты автора в ленты всех его подписчиков."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            MATERIALIZE_SQL.format(
+                timeline=TimelineEntry._meta.db_table,
+                follow=Follow._meta.db_table,
+                post=Post._meta.db_table,
+            ),
+            [author_id, settings.TIMELINE_SIZE, author_id],
+        )
+
+
+def rebuild():
+    """Достраивает ленты всех подписчиков и обрезает их.
+
+    Нужна после загрузки данных в обход сигналов; счётчики подписчиков
+    к этому моменту должны быть пересчитаны.
+    """
+    cache.delete(HEAVY_AUTHORS_CACHE_KEY)
+    authors = Follow.objects.exclude(
+        author__stats__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).values_list('author_id', flat=True).distinct()
+    for author_id in authors.order_by():
+        materialize(author_id)
+    return trim()
+
+
+def followers_changed(author_id, delta):
+    """Следит за переходом счётчика подписчиков через границу.
+
+    Счётчик уже изменён атомарным UPDATE, поэтому точное равенство
+    границе видит ровно один запрос — тот, что её перешёл.
+    """
+    count = UserStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    if delta > 0 and count == limit + 1:
+        cache.delete(HEAVY_AUTHORS_CACHE_KEY)
+    elif delta < 0 and count == limit:
+        cache.delete(HEAVY_AUTHORS_CACHE_KEY)
+        materialize(author_id)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты нового автора."""
+    if is_heavy(author_id):
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date')
+        .values_list('id', 'pub_date')[:settings.TIMELINE_SIZE]
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ],
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора, от которого отписались."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def feed(user):
+    """Посты ленты подписок пользователя в порядке ``ORDERING``.
+
+    Без популярных авторов страница берётся прямо из индекса ленты;
+    с ними — объединением ленты и постов этих авторов с сортировкой.
+    """
+    heavy = heavy_authors()
+    followed_heavy = []
+    if heavy:
+        followed_heavy = list(
+            Follow.objects.filter(user=user, author__in=heavy)
+            .values_list('author_id', flat=True)
+        )
+    if not followed_heavy:
+        return Post.objects.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_entry=F('timeline_entries__id'),
+        ).order_by(*ORDERING)
+    condition = Q(
+        id__in=TimelineEntry.objects.filter(user=user).values('post_id')
+    ) | Q(author__in=followed_heavy)
+    return Post.objects.filter(condition).annotate(
+        feed_date=F('pub_date'), feed_entry=F('id'),
+    ).order_by(*ORDERING)
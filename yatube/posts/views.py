@@ -1,76 +1,155 @@
 from django.core.paginator import Paginator
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
-
-from posts.models import Post, Group, Follow
+from django.db import transaction
+from django.utils.http import urlencode
+
+from core.paginator import CursorPaginator
+from posts import threads, timeline
+from posts.search import search as search_posts
+from posts.cache import cache_shared_page, fragment_context
+from posts.models import Comment, Post, Group, Follow
 from posts.forms import PostForm, CommentForm
 
 
-def paginator(page_number, posts):
+def paginator(request, posts, ordering=('-pub_date', '-id')):
+    if settings.CURSOR_PAGINATION:
+        return CursorPaginator(
+            posts, settings.POSTS_ON_PAGE, ordering=ordering
+        ).get_page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
     paginator = Paginator(posts, settings.POSTS_ON_PAGE)
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    return page_obj
+
+
+def comments_page(request, post_id):
+    """Страница корневых комментариев с ветками ответов."""
+    comments = Comment.objects.filter(
+        post_id=post_id, path=''
+    ).select_related('author')
+    page_obj = CursorPaginator(
+        comments, settings.COMMENTS_ON_PAGE, ordering=('-created', '-id')
+    ).get_page(after=request.GET.get('after'))
+    threads.attach_replies(page_obj)
     return page_obj
 
 
+@cache_shared_page
 def index(request):
     template = 'posts/index.html'
     posts = Post.objects.select_related('author', 'group')
-    page_number = request.GET.get('page')
-    page_obj = paginator(page_number, posts)
+    page_obj = paginator(request, posts)
     context = {
         'page_obj': page_obj,
+        **fragment_context('posts'),
     }
     return render(request, template, context)
 
 
+@cache_shared_page
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
-    page_number = request.GET.get('page')
-    page_obj = paginator(page_number, posts)
+    page_obj = paginator(request, posts)
     context = {
         'group': group,
         'page_obj': page_obj,
+        **fragment_context(f'group:{group.pk}'),
     }
     return render(request, template, context)
 
 
+@cache_shared_page
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related('group')
-    page_number = request.GET.get('page')
-    page_obj = paginator(page_number, posts)
-    following = (
-        request.user.is_authenticated
-        and author.following.filter(user=request.user).exists()
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username,
     )
+    posts = author.posts.select_related('group')
+    page_obj = paginator(request, posts)
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following,
+        **fragment_context(f'author:{author.pk}'),
     }
     return render(request, template, context)
 
 
+@cache_shared_page
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
     post = get_object_or_404(
-        Post.objects.select_related('group', 'author'),
+        Post.objects.select_related('group', 'author__stats'),
         id=post_id,
     )
     context = {
         'post': post,
         'form': CommentForm(),
-        'comments': post.comments.select_related('author'),
+        'comments': comments_page(request, post.pk),
+    }
+    return render(request, template, context)
+
+
+def post_comments(request, post_id):
+    """Следующая страница комментариев без самого поста."""
+    template = 'posts/includes/comment_list.html'
+    comments = comments_page(request, post_id)
+    if not comments and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, template, context)
+
+
+def comment_replies(request, post_id, comment_id):
+    """Продолжение ветки ответов после ключа ``?after``."""
+    template = 'posts/includes/reply_list.html'
+    root = get_object_or_404(
+        Comment, pk=comment_id, post_id=post_id, path=''
+    )
+    after = request.GET.get('after', '')
+    if not threads.KEY.fullmatch(after):
+        after = ''
+    replies, replies_after = threads.replies(root, after)
+    context = {
+        'post_id': post_id,
+        'root': root,
+        'replies': replies,
+        'replies_after': replies_after,
+    }
+    return render(request, template, context)
+
+
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    posts = search_posts(query).select_related('author', 'group')
+    page_obj = CursorPaginator(
+        posts, settings.POSTS_ON_PAGE, ordering=('-rank', '-id')
+    ).get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
     }
     return render(request, template, context)
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     template = 'posts/create_post.html'
     form = PostForm(request.POST or None,
@@ -87,6 +166,7 @@ def post_create(request):
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     template = 'posts/create_post.html'
     post = get_object_or_404(
@@ -110,13 +190,20 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = Post.objects.get(pk=post_id)
     form = CommentForm(request.POST or None)
+    parent = request.POST.get('parent', '')
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        if parent:
+            # Ответ только на комментарий этого же поста.
+            comment.parent = get_object_or_404(
+                post.comments, pk=parent if parent.isdigit() else None
+            )
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
@@ -124,17 +211,17 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    posts = Post.objects.select_related('author', 'group').filter(
-        author__following__user=request.user)
-    page_number = request.GET.get('page')
-    page_obj = paginator(page_number, posts)
+    posts = timeline.feed(request.user).select_related('author', 'group')
+    page_obj = paginator(request, posts, ordering=timeline.ORDERING)
     context = {
         'page_obj': page_obj,
+        **fragment_context('posts', f'follow:{request.user.pk}'),
     }
     return render(request, template, context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -143,6 +230,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -1,4 +1,5 @@
 import os
+import sys
 
 from dotenv import load_dotenv
 import sentry_sdk
@@ -53,12 +54,20 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.memory.MemoryRecycleMiddleware',
+    'core.timing.TimingMiddleware',
+    'core.slowlog.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.degraded.DegradedModeMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.holes.HoleMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
@@ -72,7 +81,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.timing.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -104,6 +113,23 @@ DATABASES = {
     }
 } 
 
+# Реплики только для чтения: через запятую хосты PostgreSQL или, для
+# локальной проверки, файлы SQLite рядом с основной базой.
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(',')), 1
+):
+    key = 'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3') else 'HOST'
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        key: replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд после записи пользователь читает с основной базы.
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+READ_YOUR_WRITES_COOKIE = 'primary_until'
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -144,6 +170,24 @@ STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static/') # папка, в которой будет лежать статика
 
 POSTS_ON_PAGE = 10
+# Комментарии под постом: первая страница в самой странице поста,
+# следующие подгружаются фрагментом по курсору (created, id).
+COMMENTS_ON_PAGE = 20
+# Ответов каждой ветки на странице; остальные догружаются кнопкой
+# под веткой кусками того же размера.
+REPLIES_ON_PAGE = 10
+# Наибольшая глубина ответов: более глубокие ответы попадают
+# на этот уровень. Не больше 31 — столько сегментов вмещает path.
+COMMENTS_MAX_DEPTH = 5
+# Keyset-пагинация лент по (pub_date, id) с курсорами ?after=/?before=
+# вместо номеров страниц: глубокие страницы не требуют COUNT и OFFSET.
+CURSOR_PAGINATION = os.getenv('CURSOR_PAGINATION', '') == '1'
+
+# Материализованная лента подписок: сколько последних постов хранится
+# у каждого пользователя и с какого числа подписчиков автор перестаёт
+# рассылать посты по лентам и подмешивается при чтении.
+TIMELINE_SIZE = 800
+TIMELINE_FANOUT_LIMIT = 1000
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -157,11 +201,131 @@ SYMBOLS_IN_STR = 15
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
+# Защита от лавины пересчётов (core/singleflight.py): сколько держится
+# блокировка пересчёта, сколько после истечения или смены версии
+# фрагмент ещё можно отдавать, пока его пересчитывают, и насколько
+# охотно пересчитывать заранее (0 — не пересчитывать).
+CACHE_STAMPEDE_PROTECTION = True
+CACHE_LOCK_TIMEOUT = 10
+CACHE_STALE_SECONDS = 60 * 5
+CACHE_EARLY_REFRESH_BETA = 1.0
+# Работа без БД (core/degraded.py): сколько хранится последняя удачная
+# копия страницы и когда размыкается автомат — после DB_BREAKER_THRESHOLD
+# сбоев за DB_BREAKER_WINDOW секунд, на DB_BREAKER_COOLDOWN секунд.
+STALE_PAGE_TIMEOUT = 60 * 60 * 24
+DB_BREAKER_THRESHOLD = 5
+DB_BREAKER_WINDOW = 10
+DB_BREAKER_COOLDOWN = 15
+
+# Общий для всех воркеров кэш в файле (core/cache.py): только в нём
+# инвалидация сигналами доходит до каждого процесса. CACHE_BACKEND=file —
+# штатный файловый кэш Django, locmem — кэш в памяти процесса для
+# разработки; тесты используют его по умолчанию, чтобы не делить файл
+# кэша между запусками.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem' if TESTING else 'sqlite')
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'sqlite': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache', 'cache.sqlite3')
+        ),
+        'OPTIONS': {
+            'MAX_BYTES': int(os.getenv('CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+        },
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache', 'files')
+        ),
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[CACHE_BACKEND],
 }
 
+# Фрагменты лент инвалидируются сигналами (posts/cache.py), поэтому
+# в общем кэше их можно держать долго. Страницы лент для анонимов
+# инвалидируются теми же версиями, таймаут лишь ограничивает
+# устаревание полей вне сигналов. В кэше процесса смена версии видна
+# только воркеру, обработавшему запись, поэтому сроки там короткие.
+SHARED_CACHE = not CACHES['default']['BACKEND'].endswith('LocMemCache')
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 6 if SHARED_CACHE else 20
+PAGE_CACHE_TIMEOUT = 60 * 10 if SHARED_CACHE else 20
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# SERVER_TIMING=1 включает core/timing.py: заголовок Server-Timing и
+# строку JSON в лог core.timing на каждый запрос.
+SERVER_TIMING = os.getenv('SERVER_TIMING', '') == '1'
+
+# Метрики Prometheus на /metrics (core/metrics.py). При нескольких
+# воркерах gunicorn METRICS_DIR указывает на общий для них каталог,
+# очищаемый при развёртывании. Prometheus передаёт METRICS_TOKEN
+# в заголовке Authorization: Bearer; без токена /metrics видят только
+# сотрудники.
+METRICS = os.getenv('METRICS', '1') == '1'
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 1
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Профилирование запросов сотрудников (core/profiling.py).
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILE_SAMPLE_INTERVAL = 0.001
+PROFILE_TOKEN_MAX_AGE = 60 * 60 * 12
+
+# Запросы к БД дольше SLOW_QUERY_THRESHOLD_MS пишутся в SLOW_QUERY_LOG
+# (core/slowlog.py); сводка — manage.py slow_queries. Файл общий для
+# воркеров, ротирует его logrotate без copytruncate.
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '100'))
+SLOW_QUERY_LOG = os.getenv(
+    'SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'logs', 'slow_queries.log')
+)
+
+# Диагностика роста памяти воркеров (core/memory.py): MEMORY_TRACING=1
+# включает tracemalloc при старте, снимки (POST action=save) пишутся в
+# MEMORY_DIR. MEMORY_RECYCLE_MB — рост RSS в мегабайтах, после
+# которого воркер gunicorn перезапускается.
+MEMORY_TRACING = os.getenv('MEMORY_TRACING', '') == '1'
+MEMORY_TRACE_FRAMES = int(os.getenv('MEMORY_TRACE_FRAMES', '10'))
+MEMORY_DIR = os.getenv('MEMORY_DIR', os.path.join(BASE_DIR, 'memory'))
+MEMORY_RECYCLE_MB = (
+    float(os.environ['MEMORY_RECYCLE_MB'])
+    if os.getenv('MEMORY_RECYCLE_MB') else None
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'slow_queries': {
+            'class': 'core.slowlog.WatchedFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'core.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core.memory': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'core.slowlog': {
+            'handlers': ['slow_queries'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
 
+from core import memory, metrics
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
@@ -9,6 +10,8 @@ urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics', metrics.view, name='metrics'),
+    path('debug/memory', memory.view, name='memory'),
 ]
 
 handler404 = 'core.views.page_not_found'